@@ -2,20 +2,52 @@
 TODO
 '''
 
+import mydfs.striping
+import mydfs.copying
+import mydfs.stats
+import mydfs.sharedcache
+import mydfs.mapping
+import mydfs.direct
+import mydfs.scheduler
 import fuse
 import boltons.funcutils
 import os
 import stat
 import threading
 import collections
+import concurrent.futures
+import contextlib
+import itertools as it
+import logging
+import random
+import reprlib
+import time
 
 ospath = os.path
 
+log = logging.getLogger(__name__)
+
+STATE_NAME = '.mydfs'  # name of directory in each root reserved for internal state
+VIRTUAL_PATH = '/' + STATE_NAME  # path of directory in mount with virtual files, see Mydfs.getattr
+VIRTUAL_FILE_HANDLE = 2**48  # first file handle of virtual files
+ROOTS_PATH = VIRTUAL_PATH + '/roots'  # path of directory in mount with a directory per root, see Mydfs._parse_root_view
+CONTROL_PATH = VIRTUAL_PATH + '/control'  # path of writable virtual file, see `mydfs.control`
+
+# operations changing attributes of paths, see Mydfs._invalidate_shared
+ATTRIBUTE_OPS = {'chmod', 'chown', 'truncate', 'utimens', 'write'}
+# operations changing entries of directories, and their number of path arguments
+NAMESPACE_OPS = {'create': 1, 'link': 2, 'mkdir': 1, 'mknod': 1, 'rename': 2, 'rmdir': 1, 'symlink': 1, 'unlink': 1}
+
+_NO_SLOT = contextlib.nullcontext()  # see Mydfs._slot
+PARALLEL_WRITE_SIZE = 2**16  # minimum size of writes to multiple replicas which are written in parallel
+
 
 def fuse_errors(f):
     '''
     Decorator to replace `OSError` by `fuse.FuseOSError`.
 
+    `Mydfs.__call__` calls the decorated function directly, see `Mydfs._get_operations`.
+
     @param f function
     @return function
     '''
@@ -30,16 +62,90 @@ def fuse_errors(f):
     return _fuse_errors
 
 
-class Mydfs(fuse.LoggingMixIn, fuse.Operations):
+class FUSE(fuse.FUSE):
+    '''
+    `fuse.FUSE` which opens virtual files, see `Mydfs.open`, with direct I/O.
+
+    Virtual files are rendered again on open, so their size may differ from the size reported by `Mydfs.getattr`
+    before, which would otherwise limit reads.
+    '''
+
+    def open(self, path, fip):
+        r = super().open(path, fip)
+
+        fi = fip.contents
+        if not self.raw_fi and VIRTUAL_FILE_HANDLE <= fi.fh:
+            fi.direct_io = 1
+
+        return r
+
+
+class Mydfs(fuse.Operations):
     '''
-    Main class for use with `fuse.FUSE`.
+    Main class for use with `FUSE`.
     '''
 
-    def __init__(self, roots):
+    def __init__(self, roots, tiering=None, stripeChunkSize=2**20, stripeThreshold=None, dirty=None, scrubber=None,
+                 contentIndex=None, recorder=None, logSampling=None, inodes=None, sharedCache=None,
+                 mapThreshold=None, direct=None, scheduler=None, replicator=None,
+                 placement=None, listingCache=None, warmup=None, prefetcher=None,
+                 controller=None):
         '''
-        @param roots iter((str, str)); iterable of (character, path to root)
+        @param roots           iter((str, str)); iterable of (character, path to root)
+        @param tiering         None or `mydfs.tiering.Tiering`
+        @param stripeChunkSize int; chunk size of new striped files
+        @param stripeThreshold None or int; minimum size for which files are striped, on truncation or on the first
+                               write past it, see `._stripe`
+        @param dirty           None or `mydfs.dirty.DirtyJournal`; if given, failing replicas don't fail writes
+        @param scrubber        None or `mydfs.scrub.Scrubber`
+        @param contentIndex    None or `mydfs.contenthash.ContentIndex`; if given, replicas with equal content are
+                               merged in `.readdir`
+        @param recorder        None or `mydfs.trace.Recorder`; if given, all operations are recorded
+        @param logSampling     None or float; fraction of operations to log at level debug
+        @param inodes          None or `mydfs.inodes.InodeMap`; if given, inode numbers are synthetic instead of
+                               those of the replicas
+        @param sharedCache     None or `mydfs.sharedcache.SharedCache`; if given, attributes of replicas are cached
+                               for all mounts on the host
+        @param mapThreshold    None or int; minimum size of files opened read-only to read from memory mappings, see
+                               `mydfs.mapping`
+        @param direct          None or `mydfs.direct.DirectPolicy`; if given, matching files are opened with
+                               `os.O_DIRECT`
+        @param scheduler       None or `mydfs.scheduler.Scheduler`; if given, I/O on roots is limited per root, see
+                               `._slot`
+        @param replicator      None or `mydfs.replication.Replicator`; if given, renames which change the mask of files
+                               copy and remove replicas, see `.rename`
+        @param placement       None or `mydfs.placement.PlacementPolicy`; if given, decides roots of new files and
+                               directories by path prefix
+        @param listingCache    None or `mydfs.listing.ListingCache`; if given, scans of directories are cached, see
+                               `._scan`
+        @param warmup          None or `mydfs.warmup.Warmup`; if given, caches are filled in the background after
+                               mount
+        @param prefetcher      None or `mydfs.prefetch.Prefetcher`; if given, listings of subdirectories are
+                               prefetched into the listing cache, see `.readdir`
+        @param controller      None or `mydfs.control.Controller`; if given, settings can be changed at runtime by
+                               writing to `CONTROL_PATH`
         '''
         self.Roots = roots
+        self.Tiering = tiering
+        self.StripeChunkSize = stripeChunkSize
+        self.StripeThreshold = stripeThreshold
+        self.Dirty = dirty
+        self.Scrubber = scrubber
+        self.ContentIndex = contentIndex
+        self.Recorder = recorder
+        self.LogSampling = logSampling
+        self.Inodes = inodes
+        self.SharedCache = sharedCache
+        self.MapThreshold = mapThreshold
+        self.Direct = direct
+        self.Scheduler = scheduler
+        self.Replicator = replicator
+        self.Placement = placement
+        self.ListingCache = listingCache
+        self.Warmup = warmup
+        self.Prefetcher = prefetcher
+        self.Controller = controller
+        self.Statistics = mydfs.stats.Statistics()
 
         _roots = []
         for c, root in roots:
@@ -48,32 +154,255 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
 
             _roots.append((c, ospath.realpath(root)))
 
+        if placement is not None:
+            placement.check(c for c, _ in _roots)
+
         self._Roots = _roots  # {character: real path}
+        self._Characters = {root: c for c, root in _roots}  # {real path: character}
+        self._RootPaths = dict(_roots)  # {character: real path}
         self._OpenFileHandles = {}  # {file handle: [file handle]}
+        self._OpenFilePaths = {}  # {file handle: (path without mask, is writable, [real path of root])}
+        self._Writers = collections.Counter()  # {path without mask: number of file handles}, see self._open_paths
+        self._Stripes = {}  # {file handle: mydfs.striping.Stripe}
+        self._Mappings = {}  # {file handle: mydfs.mapping.Mapping}
+        self._DirectFileHandles = set()  # {file handle of replica}, see `mydfs.direct`
+
+        # for I/O on multiple roots in parallel
+        self._Executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(_roots), thread_name_prefix='mydfs')
 
         # see self._get_file_handle_lock
         self._FileHandleLock = threading.Lock()
         self._FileHandleLocks = {}  # {file handle: Lock}
+        self._StripeChecked = set()  # {file handle}, tried to convert on write, see `._stripe_on_write`
+        self._StripedPaths = set()  # {path without mask}, converted while mounted, see `._resolve`
+
+        self._VirtualFiles = {
+            VIRTUAL_PATH + '/stats': lambda: self.Statistics.to_json(self._get_stats_sources()),
+            VIRTUAL_PATH + '/stats.prom': lambda: self.Statistics.to_prometheus(self._get_stats_sources()),
+        }  # {path: function() -> bytes}
+        if controller is not None:
+            self._VirtualFiles[CONTROL_PATH] = lambda: self.Controller.render()
+
+        self._VirtualFileHandles = {}  # {file handle: bytes}
+        self._NextVirtualFileHandle = it.count(VIRTUAL_FILE_HANDLE)
+
+        self._Operations = self._get_operations()  # {op: function}, see self.__call__
+        self._InvalidationListeners = []  # [function(str)], see self.invalidate
+
+    def __call__(self, op, *args):
+        '''
+        Dispatches operation.
+
+        - calls function from operation table
+        - if error
+          - replaces `OSError` by `fuse.FuseOSError`
+        - adds operation to statistics
+        - if recorder is given
+          - records operation
+        - if sampled
+          - logs operation
+        - if shared cache is given and operation changes attributes
+          - invalidates entries, see `._invalidate_shared`
+        - if listing cache is given and operation changes attributes
+          - invalidates entries, see `._invalidate_listings`
+        - if operation changes attributes in root view
+          - notifies listeners, see `._invalidate_root_view`
+        '''
+        function = self._Operations.get(op, None)
+        if function is None:
+            raise fuse.FuseOSError(fuse.EFAULT)
+
+        errno = 0
+        r = None
+        start = time.perf_counter_ns()
+        try:
+            r = function(*args)
+
+        except fuse.FuseOSError as e:
+            errno = e.errno or -1
+            raise
+
+        except OSError as e:
+            errno = e.errno or -1
+            raise fuse.FuseOSError(e.errno) from e
+
+        except Exception:
+            errno = -1
+            raise
+
+        finally:
+            duration = time.perf_counter_ns() - start
+            self.Statistics.record(op, duration, errno, r)
+
+            if self.Recorder is not None:
+                self.Recorder.record(op, args, start, duration, errno, r)
+
+            if self.LogSampling is not None and random.random() < self.LogSampling:
+                log.debug('%s%s -> %s in %d µs', op, reprlib.repr(args), 'errno {}'.format(errno) if errno != 0 else
+                          reprlib.repr(r), duration // 1000)
+
+            if self.SharedCache is not None:
+                self._invalidate_shared(op, args)
+
+            if self.ListingCache is not None:
+                self._invalidate_listings(op, args)
+
+            if (op in NAMESPACE_OPS or (op in ATTRIBUTE_OPS and op != 'write')) and args[0].startswith(ROOTS_PATH):
+                self._invalidate_root_view(op, args)
+
+        return r
+
+    def _get_operations(self):
+        '''
+        Builds operation table.
+
+        Functions decorated with `fuse_errors` are replaced by the undecorated functions, see `.__call__`.
+
+        @return {str: function}
+        '''
+        r = {}
+
+        for op in dir(fuse.Operations):
+            if op.startswith('_'):
+                continue
+
+            function = getattr(self, op, None)
+            if function is None:
+                continue
+
+            wrapped = getattr(function, '__wrapped__', None)
+            if wrapped is not None:
+                function = wrapped.__get__(self, type(self))
+
+            r[op] = function
+
+        return r
+
+    def add_invalidation_listener(self, function):
+        '''
+        @param function function(str); called with path without mask, see `.invalidate`
+        '''
+        self._InvalidationListeners.append(function)
+
+    def invalidate(self, realPath):
+        '''
+        Notifies listeners that replicas changed outside of operations, e.g. by `mydfs.tiering`.
+
+        @param realPath str; path without mask
+        '''
+        if self.SharedCache is not None:
+            self._invalidate_shared_paths(realPath, True)
+
+        if self.ListingCache is not None:
+            self.ListingCache.invalidate(ospath.dirname(realPath))
+            self.ListingCache.invalidate_tree(realPath)
+
+        for function in self._InvalidationListeners:
+            try:
+                function(realPath)
+
+            except Exception:
+                log.exception('invalidation of %s failed', repr(realPath))
 
-    # def __call__(self, op, *args):  # residual from fusepy loopback example
+    def init(self, path):
+        '''
+        Starts background work.
+        '''
+        if self.Scheduler is not None:
+            self.Scheduler.start(self)
+
+        if self.Controller is not None:
+            self.Controller.start(self)
+
+        if self.Tiering is not None:
+            self.Tiering.start(self)
+
+        if self.Dirty is not None:
+            self.Dirty.start(self)
+
+        if self.Scrubber is not None:
+            self.Scrubber.start(self)
+
+        if self.ContentIndex is not None:
+            self.ContentIndex.start(self)
+
+        if self.Inodes is not None:
+            self.Inodes.start(self)
+
+        if self.SharedCache is not None:
+            self.SharedCache.start(self)
+
+        if self.ListingCache is not None:
+            self.ListingCache.start(self)
+
+        if self.Warmup is not None:
+            self.Warmup.start(self)
+
+        if self.Prefetcher is not None:
+            self.Prefetcher.start(self)
+
+        if self.Replicator is not None:
+            self.Replicator.start(self)
+
+    def destroy(self, path):
+        '''
+        Stops background work.
+        '''
+        if self.Controller is not None:
+            self.Controller.stop()
+
+        if self.Warmup is not None:
+            self.Warmup.stop()
+
+        if self.Prefetcher is not None:
+            self.Prefetcher.stop()
+
+        if self.Replicator is not None:
+            self.Replicator.stop()
+
+        if self.Tiering is not None:
+            self.Tiering.stop()
+
+        if self.Dirty is not None:
+            self.Dirty.stop()
+
+        if self.Scrubber is not None:
+            self.Scrubber.stop()
+
+        if self.ContentIndex is not None:
+            self.ContentIndex.stop()
+
+        if self.Inodes is not None:
+            self.Inodes.stop()
+
+        if self.SharedCache is not None:
+            self.SharedCache.stop()
+
+        if self.ListingCache is not None:
+            self.ListingCache.stop()
 
     @fuse_errors
     def access(self, path, amode):
-        for _, p in self._resolve(path):
-            if not os.access(p, amode):
+        for root, p in self._resolve(path):
+            with self._slot(root):
+                access = os.access(p, amode)
+
+            if not access:
                 raise fuse.FuseOSError(fuse.EACCES)
 
     @fuse_errors
     def chmod(self, path, mode):
-        for _, p in reversed(self._resolve(path)):
-            r = os.chmod(p, mode)
+        for root, p in reversed(self._resolve(path)):
+            with self._slot(root):
+                r = os.chmod(p, mode)
 
         return r
 
     @fuse_errors
     def chown(self, path, uid, gid):
-        for _, p in reversed(self._resolve(path)):
-            r = os.chown(p, uid, gid)
+        for root, p in reversed(self._resolve(path)):
+            with self._slot(root):
+                r = os.chown(p, uid, gid)
 
         return r
 
@@ -82,45 +411,30 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
         '''
         Creates and opens file.
 
-        - for all paths
-          - creates parent directories as needed
-          - creates and opens file
-        - if any error
-          - for all files opened in reversed order
-            - closes file
-          - raises error
+        For details see `._open_paths`.
         '''
-        fileHandles = []
-        try:
-            for _, p in reversed(self._resolve(path, orBestInexistent=True)):
-                self._ensure_directory(p)
-                fileHandle = os.open(p, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
-                fileHandles.append(fileHandle)
-
-        except Exception:
-            for fileHandle in reversed(fileHandles):
-                os.close(fileHandle)
-
-            raise
-
-        r = fileHandles[-1]
-        self._OpenFileHandles[r] = fileHandles
-        return r
-
-    # def destroy(self, path):  # residual from FUSE doc
+        return self._open_paths(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
 
     @fuse_errors
     def flush(self, path, fileHandle):
-        for fileHandle in self._OpenFileHandles[fileHandle]:
-            r = os.fsync(fileHandle)
+        if fileHandle in self._VirtualFileHandles:
+            return 0
+
+        for fh, root in zip(self._OpenFileHandles[fileHandle], self._get_roots(fileHandle)):
+            with self._slot(root):
+                r = os.fsync(fh)
 
         return r
 
     @fuse_errors
     def fsync(self, path, datasync, fileHandle):
+        if fileHandle in self._VirtualFileHandles:
+            return 0
+
         sync = os.fdatasync if datasync != 0 else os.fsync  # from fusepy loopback example
-        for fileHandle in self._OpenFileHandles[fileHandle]:
-            r = sync(fileHandle)
+        for fh, root in zip(self._OpenFileHandles[fileHandle], self._get_roots(fileHandle)):
+            with self._slot(root):
+                r = sync(fh)
 
         return r
 
@@ -132,16 +446,60 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
         This function is used to test for existence.
         Therefore `os.lstat` is called for all paths.
         This might not be necessary.
+        If shared cache is given, see `._lstat`, results may be cached.
+
+        Virtual files, see `._VirtualFiles`, are read-only files owned by the mounting user, except the control file,
+        see `mydfs.control`, which is writable by the mounting user only.
+        Root views, see `._parse_root_view`, are attributes of the replica in the single root.
+
+        If inode map is given, inode numbers are stable per file, see `mydfs.inodes` and `._get_inode_key`.
         '''
-        for _, p in reversed(self._resolve(path)):
-            stat_ = os.lstat(p)
+        if path == VIRTUAL_PATH or path == ROOTS_PATH:
+            return self._get_virtual_attributes(path, stat.S_IFDIR | 0o555, 0)
 
-        return {
+        render = self._VirtualFiles.get(path, None)
+        if render is not None:
+            return self._get_virtual_attributes(path, stat.S_IFREG | (0o600 if path == CONTROL_PATH else 0o444),
+                                                len(render()))
+
+        paths = self._resolve(path)
+        for root, p in reversed(paths):
+            with self._slot(root):
+                stat_ = self._lstat(p)
+
+        r = {
             key: getattr(stat_, key)
             for key in ('st_mode', 'st_ino', 'st_dev', 'st_nlink', 'st_uid', 'st_gid', 'st_size', 'st_atime',
                         'st_mtime', 'st_ctime', 'st_atime_ns', 'st_mtime_ns', 'st_ctime_ns')
         }
 
+        if self._is_striped(paths):
+            with self._slots(root for root, _ in paths):
+                r['st_size'] = mydfs.striping.get_stat_size([p for _, p in paths])
+
+        if self.Inodes is not None:
+            r['st_ino'] = self.Inodes.get(self._get_inode_key(path))
+
+        return r
+
+    def _get_virtual_attributes(self, path, mode, size):
+        t = time.time()
+        r = {
+            'st_mode': mode,
+            'st_nlink': 2 if stat.S_ISDIR(mode) else 1,
+            'st_uid': os.getuid(),
+            'st_gid': os.getgid(),
+            'st_size': size,
+            'st_atime': t,
+            'st_mtime': t,
+            'st_ctime': t,
+        }
+
+        if self.Inodes is not None:
+            r['st_ino'] = self.Inodes.get(path)
+
+        return r
+
     getxattr = None  # TODO could be a useful feature to add
 
     # TODO stopped here
@@ -166,17 +524,19 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
           - creates parent directories as needed
           - creates directory
         '''
-        for _, p in reversed(self._resolve(path, orBestInexistent=True)):
-            self._ensure_directory(p)
-            r = os.mkdir(p, mode)
+        for root, p in reversed(self._resolve(path, orBestInexistent=True)):
+            with self._slot(root):
+                self._ensure_directory(p)
+                r = os.mkdir(p, mode)
 
         return r
 
     @fuse_errors
     def mknod(self, path, mode, dev):
-        for _, p in reversed(self._resolve(path), orBestInexistent=True):
-            self._ensure_directory(p)
-            r = os.mknod(p, mode, dev)
+        for root, p in reversed(self._resolve(path), orBestInexistent=True):
+            with self._slot(root):
+                self._ensure_directory(p)
+                r = os.mknod(p, mode, dev)
 
         return r
 
@@ -185,30 +545,137 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
         '''
         Opens file.
 
-        - for all paths
+        Virtual files are rendered once and read from memory, see `.read`.
+        The control file may be opened for writing, see `.write`.
+
+        For details see `._open_paths`.
+        '''
+        render = self._VirtualFiles.get(path, None)
+        if render is not None:
+            writable = flags & os.O_ACCMODE != os.O_RDONLY
+            if writable and path != CONTROL_PATH:
+                raise fuse.FuseOSError(fuse.EACCES)
+
+            r = next(self._NextVirtualFileHandle)
+            self._VirtualFileHandles[r] = render()
+            if writable:
+                self.Controller.open(r)
+
+            return r
+
+        return self._open_paths(path, flags)
+
+    def _open_paths(self, path, flags, mode=0o777):
+        '''
+        - if writable
+          - registers writer
+        - if striped
+          - opens member files, see `mydfs.striping.open_stripe`
+        - else for all paths, fast replica first
+          - if creating
+            - creates parent directories as needed
           - opens file
+          - if direct I/O policy matches
+            - enables direct I/O, see `mydfs.direct`
         - if error
           - for all files opened in reverse order
             - closes file
+          - unregisters writer
           - raises error
+        - if read-only, not striped and large enough
+          - creates memory mapping, see `mydfs.mapping`
+        - records access
+
+        Writers are registered before paths are resolved, see `mydfs.tiering.Tiering._promote`.
         '''
+        realPath = self._get_real_path(path)
+        writable = (flags & os.O_ACCMODE) != os.O_RDONLY
+
+        if writable:
+            with self._FileHandleLock:
+                self._Writers[realPath] += 1
 
+        if flags & os.O_TRUNC and len(self._Mappings) != 0:
+            self._close_mappings(realPath)
+
+        stripe = None
         fileHandles = []
         try:
-            for _, p in reversed(self._resolve(path, orBestInexistent=True)):
-                fileHandle = os.open(p, flags)
-                fileHandles.append(fileHandle)
+            paths = self._resolve(path, orBestInexistent=True)
+
+            if self._is_striped(paths):
+                with self._slots(root for root, _ in paths):
+                    if flags & os.O_CREAT:
+                        for _, p in paths:
+                            self._ensure_directory(p)
+
+                    fileHandles, stripe = mydfs.striping.open_stripe([p for _, p in paths], flags, mode,
+                                                                     self.StripeChunkSize)
+
+            else:
+                if self.Tiering is not None:
+                    paths = self.Tiering.order(paths)
+
+                with self._slot(paths[0][0]):
+                    direct = self.Direct is not None and self.Direct.matches(realPath, paths[0][1])
+
+                openFlags = flags
+                if direct and flags & os.O_ACCMODE == os.O_WRONLY:  # unaligned writes read whole blocks
+                    openFlags = flags & ~os.O_ACCMODE | os.O_RDWR
+
+                for root, p in reversed(paths):
+                    with self._slot(root):
+                        if flags & os.O_CREAT:
+                            self._ensure_directory(p)
+
+                        fileHandle = os.open(p, openFlags, mode)
+                        fileHandles.append(fileHandle)
+
+                        if direct and mydfs.direct.enable(fileHandle):
+                            self._DirectFileHandles.add(fileHandle)
 
         except Exception:
             for fileHandle in reversed(fileHandles):
+                self._DirectFileHandles.discard(fileHandle)
                 os.close(fileHandle)
 
+            if writable:
+                self._unregister_writer(realPath)
+
             raise
 
         r = fileHandles[-1]
         self._OpenFileHandles[r] = fileHandles
+        roots = [root for root, _ in paths]
+        if stripe is None:  # opened in reversed order
+            roots.reverse()
+
+        self._OpenFilePaths[r] = (realPath, writable, roots)
+        if stripe is not None:
+            self._Stripes[r] = stripe
+
+        elif not writable and self.MapThreshold is not None and r not in self._DirectFileHandles:
+            with self._slot(roots[-1]):
+                size = os.fstat(r).st_size
+
+            if self.MapThreshold <= size:
+                self._Mappings[r] = mydfs.mapping.Mapping(r)
+
+        if self.Tiering is not None:
+            self.Tiering.touch(realPath)
+
         return r
 
+    def _close_mappings(self, realPath):
+        '''
+        Closes memory mappings of path before truncation, see `mydfs.mapping.Mapping`.
+
+        @param realPath str; path without mask
+        '''
+        for fileHandle, mapping in list(self._Mappings.items()):
+            if self._OpenFilePaths.get(fileHandle, (None, ))[0] == realPath:
+                mapping.close()
+
     # def opendir(self, path):  # residual from FUSE doc
 
     @fuse_errors
@@ -216,101 +683,416 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
         '''
         Read from file.
 
-        - acquires lock
-        - sets position in file
-        - reads from file
-        - gets position in file
-        - for all files opened
+        - if virtual
+          - reads from content rendered on open
+        - if striped
+          - reads from members, see `mydfs.striping.Stripe.read`
+        - else if memory mapped and clean
+          - reads from mapping, see `mydfs.mapping.Mapping.read`
+        - else
+          - acquires lock
           - sets position in file
+          - reads from file, or from a clean file if dirty, see `mydfs.dirty`
+          - gets position in file
+          - for all files opened
+            - sets position in file
         '''
+        content = self._VirtualFileHandles.get(fileHandle, None)
+        if content is not None:
+            return content[offset:(offset + size)]
+
+        stripe = self._Stripes.get(fileHandle, None)
+        if stripe is not None:
+            r = stripe.read(size, offset, self._Executor, slot=self._get_stripe_slot(fileHandle, stripe))
+
+        else:
+            r = None
+            mapping = self._Mappings.get(fileHandle, None)
+            if mapping is not None:
+                r = self._read_mapped(mapping, size, offset, fileHandle)
+
+            if r is None:
+                r = self._read(size, offset, fileHandle)
+
+        if self.Tiering is not None:
+            self.Tiering.touch(self._OpenFilePaths[fileHandle][0])
+
+        return r
+
+    def _read(self, size, offset, fileHandle):
+        readHandle = fileHandle
+        if self.Dirty is not None and len(self.Dirty) != 0:
+            readHandle = self._get_clean_file_handle(fileHandle)
+
+        root = self._get_roots(fileHandle)[self._OpenFileHandles[fileHandle].index(readHandle)]
 
         with self._get_file_handle_lock(fileHandle):
-            os.lseek(fileHandle, offset, 0)  # from fusepy loopback example
-            r = os.read(fileHandle, size)
+            with self._slot(root):
+                r = None
+                if readHandle in self._DirectFileHandles:
+                    r = self._call_direct(readHandle, mydfs.direct.read, readHandle, size, offset)
+
+                if r is None:
+                    os.lseek(readHandle, offset, 0)  # from fusepy loopback example
+                    r = os.read(readHandle, size)
+
+                    # TODO could be very wrong
+                    nOffset = os.lseek(readHandle, 0, os.SEEK_CUR)
+                    for nFileHandle in self._OpenFileHandles[fileHandle]:
+                        os.lseek(nFileHandle, nOffset, 0)
+
+        character = self._Characters[root]
+        self.Statistics.add(character, 'reads')
+        self.Statistics.add(character, 'readBytes', len(r))
+        return r
+
+    def _read_mapped(self, mapping, size, offset, fileHandle):
+        '''
+        @return None or bytes; None if primary replica is dirty or mapping unavailable
+        '''
+        if self.Dirty is not None and len(self.Dirty) != 0 and self._get_clean_file_handle(fileHandle) != fileHandle:
+            return None
+
+        _, _, roots = self._OpenFilePaths[fileHandle]
+        root = roots[self._OpenFileHandles[fileHandle].index(fileHandle)]
+
+        with self._slot(root):  # page faults read from root
+            r = mapping.read(size, offset)
 
-            # TODO could be very wrong
-            nOffset = os.lseek(fileHandle, 0, os.SEEK_CUR)
-            for nFileHandle in self._OpenFileHandles[fileHandle]:
-                os.lseek(nFileHandle, nOffset, 0)
+        if r is None:
+            return None
 
+        character = self._Characters[root]
+        self.Statistics.add(character, 'reads')
+        self.Statistics.add(character, 'mappedReads')
+        self.Statistics.add(character, 'readBytes', len(r))
         return r
 
+    def _get_clean_file_handle(self, fileHandle):
+        '''
+        @param fileHandle int
+        @return int; file handle of first replica, in order of preference, without dirty ranges
+        '''
+        realPath, _, roots = self._OpenFilePaths[fileHandle]
+
+        for fh, root in zip(reversed(self._OpenFileHandles[fileHandle]), reversed(roots)):
+            if not self.Dirty.is_dirty(self._Characters[root], realPath):
+                return fh
+
+        return fileHandle
+
     @fuse_errors
     def readdir(self, path, fh):
         '''
         List directory.
 
-        - for all directories
+        - scans directories, see `._scan`
+        - if prefetcher is given
+          - schedules prefetch of subdirectories, see `mydfs.prefetch`
+        - adds names of directories to result
+        - merges files, see `._merge`
+        - for all files
+          - builds and adds name with mask to result
+
+        Root views, see `._parse_root_view`, list the directory of the single root without merge.
+        '''
+        if path == VIRTUAL_PATH or path.startswith(VIRTUAL_PATH + '/'):
+            return self._read_virtual_directory(path)
+
+        if self.Prefetcher is not None:
+            self.Prefetcher.use(path)
+
+        dirNames, fileIds, stripes = self._scan(path)
+
+        if self.Prefetcher is not None:
+            self.Prefetcher.schedule(path, dirNames)
+
+        r = list(dirNames)
+
+        for mask, separator, name, _ in self._merge(path, fileIds, stripes):
+            r.append(''.join([mask, separator, name]))
+
+        return r
+
+    def _read_virtual_directory(self, path):
+        '''
+        @param path str; path below `VIRTUAL_PATH`
+        @return [str]
+        '''
+        if path == VIRTUAL_PATH:
+            return ['.', '..', ospath.basename(ROOTS_PATH)] + [ospath.basename(p) for p in self._VirtualFiles]
+
+        if path == ROOTS_PATH:
+            return ['.', '..'] + [character for character, _ in self._Roots]
+
+        (root, p), = self._resolve(path)
+        isRoot = self._get_real_path(path) == '/'
+
+        with self._slot(root):
+            names = os.listdir(p)
+
+        r = [
+            name for name in names
+            if not ((isRoot and name == STATE_NAME) or name.startswith(mydfs.striping.MEMBER_PREFIX))
+        ]
+        return r
+
+    def _scan(self, path, executor=None, fill=False):
+        '''
+        Scans directory in all roots.
+
+        - if listing cache is given and has scan
+          - returns scan
+        - for all directories, in parallel if executor is given
           - lists directory
           - for all names
             - if is directory
-              - adds name to result
+              - remembers name
+            - else if is member of striped file
+              - remembers root
             - else
               - remembers file id
-        - for all file ids
-          - builds mask
-          - builds and adds name to result
+        - if filling and shared cache is given
+          - caches attributes, and inexistence in other roots, of all entries
+        - caches scan
 
         file id = (name, modification time, size)
+
+        The result is shared with the listing cache and must not be modified.
+
+        @param path     str; path of directory
+        @param executor None or `concurrent.futures.Executor`
+        @param fill     bool; fill shared cache, see `mydfs.warmup`
+        @return set(str), [{file id: os.stat_result}], {str: set(int)}; names of directories, file ids per root and
+                indices of roots per striped file
         '''
+        cache = self.ListingCache
+        if cache is not None:
+            r = cache.get(path)
+            if r is not None:
+                return r
 
-        # TODO check performance
+            token = cache.begin(path)
 
-        r = set()
-        fileIds = []
-        allFileIds = set()
+        r = None
+        try:
+            fillTime = time.monotonic_ns() if fill and self.SharedCache is not None else None
+            roots = [root for _, root in self._Roots]
+            if executor is None:
+                scans = [self._scan_root(path, root, fillTime) for root in roots]
 
-        for _, root in self._Roots:
-            p = root + path
+            else:
+                scans = list(executor.map(lambda root: self._scan_root(path, root, fillTime), roots))
+
+            r = self._join_scans(scans)
+
+            if fillTime is not None:
+                self._fill_inexistent(path, scans, r, fillTime)
+
+        finally:
+            if cache is not None:
+                cache.end(token, r)
+
+        return r
 
+    def _scan_root(self, path, root, fillTime=None):
+        '''
+        Scans directory in a single root, see `._scan`.
+
+        @param path     str; path of directory
+        @param root     str; real path of root
+        @param fillTime None or int; if given, attributes are put into the shared cache, see
+                        `mydfs.sharedcache.SharedCache.put`
+        @return set(str), {file id: os.stat_result}, set(str); names of directories, file ids and names of striped files
+        '''
+        p = root + path
+
+        with self._slot(root):
             try:
                 names = os.listdir(p)
 
             except FileNotFoundError:
                 names = []
 
-            fIds = set()
-            for name in names:
-                stat_ = os.lstat(ospath.join(p, name))
+            stats = [(name, os.lstat(ospath.join(p, name))) for name in names
+                     if not (path == '/' and name == STATE_NAME)]
 
-                if stat.S_ISDIR(stat_.st_mode):
-                    r.add(name)
-                    continue
+        if fillTime is not None:
+            for name, stat_ in stats:
+                self.SharedCache.put(ospath.join(p, name), stat_, fillTime)
+
+        dirNames = set()
+        fileIds = {}
+        stripeNames = set()
+        for name, stat_ in stats:
+            if stat.S_ISDIR(stat_.st_mode):
+                dirNames.add(name)
+                continue
+
+            if name.startswith(mydfs.striping.MEMBER_PREFIX):
+                stripeNames.add(name[len(mydfs.striping.MEMBER_PREFIX):])
+                continue
+
+            fileIds[(name, stat_.st_mtime_ns, stat_.st_size)] = stat_
 
-                fIds.add((name, stat_.st_mtime_ns, stat_.st_size))
+        return dirNames, fileIds, stripeNames
 
+    def _join_scans(self, scans):
+        '''
+        @param scans [(set(str), {file id: os.stat_result}, set(str))]; per root, see `._scan_root`
+        @return see `._scan`
+        '''
+        dirNames = set()
+        fileIds = []
+        stripes = {}  # {name: {index of root}}
+
+        for index, (dNames, fIds, stripeNames) in enumerate(scans):
+            dirNames.update(dNames)
             fileIds.append(fIds)
-            allFileIds.update(fIds)
+            for name in stripeNames:
+                stripes.setdefault(name, set()).add(index)
+
+        return dirNames, fileIds, stripes
+
+    def _fill_inexistent(self, path, scans, scan, fillTime):
+        '''
+        Puts inexistence of entries into the shared cache for roots without them, which speeds up `._resolve`.
+
+        @param path     str; path of directory
+        @param scans    [(set(str), {file id: os.stat_result}, set(str))]; per root, see `._scan_root`
+        @param scan     see `._scan`
+        @param fillTime int
+        '''
+        dirNames, fileIds, _ = scan
+        names = set(dirNames)
+        for fIds in fileIds:
+            names.update(name for name, _, _ in fIds)
+
+        for (_, root), (dNames, fIds, _) in zip(self._Roots, scans):
+            missing = names - dNames - {name for name, _, _ in fIds}
+            for name in missing:
+                self.SharedCache.put(ospath.join(root + path, name), None, fillTime)
+
+    def _merge(self, path, fileIds, stripes):
+        '''
+        Merges files of all roots, see `.readdir`.
+
+        - if content index is given
+          - merges file ids of equal content, see `._merge_equal_content`
+        - for all file ids
+          - builds mask
+        - for all striped files
+          - builds mask, with separator `mydfs.striping.MASK_SEPARATOR`
 
-        r = list(r)
+        @param path    str; path of directory
+        @param fileIds [{file id: os.stat_result}]; see `._scan`
+        @param stripes {str: set(int)}; see `._scan`
+        @return iter((str, str, str, None or file id)); mask, separator, name and file id unless striped
+        '''
+        if self.ContentIndex is not None:
+            fileIds = self._merge_equal_content(path, fileIds)
+
+        allFileIds = set()
+        for fIds in fileIds:
+            allFileIds.update(fIds)
 
         for fileId in allFileIds:
             name, _, _ = fileId
 
             mask = ''.join(character if fileId in fIds else '.' for (character, _), fIds in zip(self._Roots, fileIds))
-            name = ''.join([mask, '_', name])
-            r.append(name)
+            yield (mask, '_', name, fileId)
+
+        for name, indices in stripes.items():
+            mask = ''.join(character if index in indices else '.' for index, (character, _) in enumerate(self._Roots))
+            yield (mask, mydfs.striping.MASK_SEPARATOR, name, None)
+
+    def _merge_equal_content(self, path, fileIds):
+        '''
+        Replaces file ids by a common file id where content is equal.
+
+        - for all names with different file ids
+          - gets hashes, see `mydfs.contenthash.ContentIndex.get`
+          - for all file ids with known hash
+            - replaces file id by greatest file id with same hash
+
+        @param path    str; path of directory
+        @param fileIds [{file id: os.stat_result}]; see `._scan`
+        @return [set(file id)]
+        '''
+        allFileIds = {}  # {name: {file id: [index of root]}}
+        for index, fIds in enumerate(fileIds):
+            for fileId in fIds:
+                name, _, _ = fileId
+                allFileIds.setdefault(name, {}).setdefault(fileId, []).append(index)
+
+        r = [set(fIds) for fIds in fileIds]
+
+        for name, fIds in allFileIds.items():
+            if len(fIds) < 2:
+                continue
+
+            digests = {}  # {digest: [file id]}
+            for fileId, indices in fIds.items():
+                _, root = self._Roots[indices[0]]
+                digest = self.ContentIndex.get(ospath.join(root + path, name), fileIds[indices[0]][fileId])
+                if digest is not None:
+                    digests.setdefault(digest, []).append(fileId)
+
+            for equalIds in digests.values():
+                commonId = max(equalIds)
+                for fileId in equalIds:
+                    for index in fIds[fileId]:
+                        r[index].discard(fileId)
+                        r[index].add(commonId)
 
         return r
 
     @fuse_errors
     def readlink(self, path):
         paths = self._resolve(path)
-        _, p = paths[0]
-        return os.readlink(p)
+        root, p = paths[0]
+        with self._slot(root):
+            return os.readlink(p)
 
     @fuse_errors
     def release(self, path, fileHandle):
-        for fh in self._OpenFileHandles[fileHandle]:
-            r = os.close(fh)
+        if self._VirtualFileHandles.pop(fileHandle, None) is not None:
+            if self.Controller is not None:
+                self.Controller.release(fileHandle)
 
-        del self._OpenFileHandles[fileHandle]
+            return 0
 
-        return r
+        mapping = self._Mappings.pop(fileHandle, None)
+        if mapping is not None:
+            mapping.close()
 
-    # def releasedir(self, path, fh):  # residual from FUSE doc
+        for fh, root in zip(self._OpenFileHandles[fileHandle], self._get_roots(fileHandle)):
+            self._DirectFileHandles.discard(fh)
+            with self._slot(root):
+                r = os.close(fh)
 
-    removexattr = None  # TODO see getxattr
+        del self._OpenFileHandles[fileHandle]
+        self._Stripes.pop(fileHandle, None)
+        self._StripeChecked.discard(fileHandle)
+
+        realPath, writable, _ = self._OpenFilePaths.pop(fileHandle)
+        if writable:
+            self._unregister_writer(realPath)
+
+            if path.startswith(ROOTS_PATH):  # writes in root views are invalidated once
+                self._invalidate_root_view('release', (path, ))
+
+        return r
+
+    def _unregister_writer(self, realPath):
+        with self._FileHandleLock:
+            self._Writers[realPath] -= 1
+            if self._Writers[realPath] == 0:
+                del self._Writers[realPath]
+
+    # def releasedir(self, path, fh):  # residual from FUSE doc
+
+    removexattr = None  # TODO see getxattr
 
     @fuse_errors
     def rename(self, old, new):
@@ -319,39 +1101,127 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
 
         Similar to `.link`.
 
+        - if mask of new changes roots, see `._plan_replication`
+          - renames in roots with replica and schedules copies and removals
         - if new without old
           - raises file not found error
         - for all news
           - creates parent directories as needed
           - rename corresponding old to new
+        - if dirty tracking is enabled
+          - moves dirty ranges of renamed replicas, see `mydfs.dirty.DirtyJournal.move`
+
+        Striped files are renamed member by member and can't be renamed to replicated files or vice versa.
         '''
         olds = collections.OrderedDict(self._resolve(old))
+        oldKey = None if self.Inodes is None else self._get_inode_key(old)
 
-        try:
-            news = self._resolve(new)
+        if self._is_striped(list(olds.items())):
+            memberPath = mydfs.striping.get_member_path(self._get_real_path(new))
+            news = ((root, root + memberPath) for root in olds)
+
+        else:
+            try:
+                news = self._resolve(new)
 
-        except fuse.FuseOSError:  # news not specified and don't exist
-            news = ((root, root + new) for root in olds)
+            except fuse.FuseOSError:  # news not specified and don't exist
+                news = ((root, root + new) for root in olds)
 
         news = collections.OrderedDict(news)
 
+        if self._is_striped(list(news.items())) != self._is_striped(list(olds.items())):
+            raise fuse.FuseOSError(fuse.EINVAL)
+
         # len(news) != 0
 
+        plan = self._plan_replication(old, new, olds, news)
+        if plan is not None:
+            news, targets, drops = plan
+
         if len(news.keys() - olds.keys()) != 0:  # new without old
-            raise fuse.FuseOSError(fuse.ENOENT)
+            raise fuse.FuseOSError(fuse.EXDEV if new.startswith(ROOTS_PATH + '/') else fuse.ENOENT)
 
         # news is subset of olds
 
         for root, newPath in reversed(news.items()):
-            self._ensure_directory(newPath)
-            r = os.rename(olds[root], newPath)
+            with self._slot(root):
+                self._ensure_directory(newPath)
+                r = os.rename(olds[root], newPath)
+
+        self._forget_striped(self._get_real_path(old))
+        self._forget_striped(self._get_real_path(new))
+
+        if self.Inodes is not None:
+            self.Inodes.rename(oldKey, self._get_inode_key(new), self._is_directory(root, newPath))
+
+        if self.Dirty is not None:
+            self.Dirty.move(self._get_real_path(old), self._get_real_path(new),
+                            [self._Characters[root] for root in news])
+
+        if self.Replicator is not None:
+            realPath = self._get_real_path(new)
+            self.Replicator.move(self._get_real_path(old), realPath)
+            if plan is not None:
+                self.Replicator.schedule(realPath, targets, drops)
 
         return r
 
+    def _plan_replication(self, old, new, olds, news):
+        '''
+        Renames to a mask with roots without replica replicate the file, renames to the same path with a mask without
+        roots with replica remove those replicas.
+
+        - if new contains mask, and old is a regular file
+          - renames in roots of mask with replica or, if there are none, in all roots of old
+          - copies to roots of mask without replica
+          - if path without mask is unchanged
+            - removes from roots of old not in mask
+
+        @param old  str
+        @param new  str
+        @param olds OrderedDict; {real path of root: path}, see `._resolve`
+        @param news OrderedDict; {real path of root: path}
+        @return None or (OrderedDict, [str], [str]); None if not applicable, else paths to rename to by root and real
+                paths of roots to copy to and to remove from
+        '''
+        if self.Replicator is None or new.startswith(ROOTS_PATH + '/') or self._parse_mask(new) is None:
+            return None
+
+        if self._is_striped(list(olds.items())):
+            return None
+
+        realPath = self._get_real_path(new)
+        samePath = self._get_real_path(old) == realPath
+
+        targets = [root for root in news if root not in olds]
+        if len(targets) == 0 and not samePath:
+            return None
+
+        root, p = next(iter(olds.items()))
+        with self._slot(root):
+            if not stat.S_ISREG(os.lstat(p).st_mode):
+                return None
+
+        renames = collections.OrderedDict((root, p) for root, p in news.items() if root in olds)
+        if len(renames) == 0:  # kept until copies land
+            renames = collections.OrderedDict((root, root + realPath) for root in olds)
+
+        drops = [root for root in (olds if samePath else renames) if root not in news]
+        if len(targets) == 0 and len(drops) == 0:
+            return None
+
+        r = (renames, targets, drops)
+        return r
+
     @fuse_errors
     def rmdir(self, path):
-        for _, p in reversed(self._resolve(path)):
-            r = os.rmdir(p)
+        key = None if self.Inodes is None else self._get_inode_key(path)
+        for root, p in reversed(self._resolve(path)):
+            with self._slot(root):
+                r = os.rmdir(p)
+
+        if self.Inodes is not None:
+            self._remove_inode(path, key)
 
         return r
 
@@ -360,8 +1230,9 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
     @fuse_errors
     def statfs(self, path):
         paths = self._resolve(path, orBestInexistent=True)
-        _, p = paths[0]
-        stat_ = os.statvfs(p)  # from fusepy loopback example
+        root, p = paths[0]
+        with self._slot(root):
+            stat_ = os.statvfs(p)  # from fusepy loopback example
 
         return {
             key: getattr(stat_, key)
@@ -401,63 +1272,439 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
         # len(targets) != 0
 
         if len(targets.keys() - sources.keys()) != 0:  # target without source
-            raise fuse.FuseOSError(fuse.ENOENT)
+            raise fuse.FuseOSError(fuse.EXDEV if target.startswith(ROOTS_PATH + '/') else fuse.ENOENT)
 
         # targets is subset of sources
 
-        for _, path in targets:
-            if ospath.exists(path):
+        for root, path in targets.items():
+            with self._slot(root):
+                exists = ospath.exists(path)
+
+            if exists:
                 raise fuse.FuseOSError(fuse.EEXIST)
 
         # no target exists
 
         for root, targetPath in reversed(targets.items()):
-            self._ensure_directory(targetPath)
-            r = linkFunc(sources[root], targetPath)
+            with self._slot(root):
+                self._ensure_directory(targetPath)
+                r = linkFunc(sources[root], targetPath)
 
         return r
 
     @fuse_errors
     def truncate(self, path, length, fh=None):
-        for _, p in reversed(self._resolve(path)):
+        '''
+        Truncate file.
+
+        - if not striped, striping is enabled and length reaches threshold
+          - tries to convert to striped file, see `._stripe`
+        - if striped
+          - truncates members, see `mydfs.striping.truncate`
+          - drops cached sizes of open stripes, see `mydfs.striping.Stripe`
+        - else
+          - for all paths
+            - truncates file
+          - if tracking dirty ranges and some failed, see `._apply_tracked`
+            - marks failed as dirty
+
+        Memory mappings of the file are closed before, see `mydfs.mapping`.
+
+        The control file, see `mydfs.control`, is always empty for writing.
+        '''
+        if path == CONTROL_PATH and self.Controller is not None:
+            return 0
+
+        paths = self._resolve(path)
+
+        if len(self._Mappings) != 0:
+            self._close_mappings(self._get_real_path(path))
+
+        if not self._is_striped(paths) and self.StripeThreshold is not None and self.StripeThreshold <= length:
+            if self._stripe(self._get_real_path(path), paths):
+                paths = self._resolve(path)
+
+        if self._is_striped(paths):
+            try:
+                with self._slots(root for root, _ in paths):
+                    return mydfs.striping.truncate([p for _, p in paths], length)
+
+            finally:
+                self._invalidate_stripes(self._get_real_path(path))
+
+        def _truncate(root, p):
             # from fusepy loopack example
-            with open(p, 'r+') as f:
-                r = f.truncate(length)
+            with self._slot(root), open(p, 'r+') as f:
+                return f.truncate(length)
+
+        if self.Dirty is not None:
+            return self._apply_tracked(self._get_real_path(path), [(root, (root, p)) for root, p in reversed(paths)],
+                                       lambda target: _truncate(*target), None, None)
+
+        for root, p in reversed(paths):
+            r = _truncate(root, p)
 
         return r
 
+    def _invalidate_stripes(self, realPath):
+        '''
+        @param realPath str; path without mask
+        '''
+        for fileHandle, stripe in list(self._Stripes.items()):
+            if self._OpenFilePaths.get(fileHandle, (None, ))[0] == realPath:
+                stripe.invalidate()
+
+    def _stripe(self, realPath, paths):
+        '''
+        Converts file to striped file across all roots.
+
+        - if single root, any replica isn't a regular file or `paths` aren't all replicas
+          - returns False
+        - if not empty and other writers or no clean replica, see `mydfs.dirty`
+          - returns False
+        - creates member files in all roots
+        - copies content from clean replica
+        - acquires lock
+        - if source changed meanwhile
+          - removes member files and returns False
+        - for all file handles open for file
+          - opens member files
+        - removes replicas
+
+        @param realPath str; path without mask
+        @param paths    [(str, str)]; see `._resolve`
+        @return bool; True if converted
+        '''
+        if len(self._Roots) < 2:
+            return False
+
+        if {root for root, _ in paths} != {root for root, _ in self._resolve(realPath)}:  # subset of replicas
+            return False
+
+        with self._slots(root for root, _ in paths):
+            stats = [os.lstat(p) for _, p in paths]
+
+        if any(not stat.S_ISREG(stat_.st_mode) for stat_ in stats):
+            return False
+
+        clean = [index for index, (root, _) in enumerate(paths)
+                 if self.Dirty is None or not self.Dirty.is_dirty(self._Characters[root], realPath)]
+        if len(clean) == 0:
+            return False
+
+        sourceRoot, sourcePath = paths[clean[0]]
+        sourceStat = stats[clean[0]]
+        if sourceStat.st_size != 0 and 1 < self._Writers.get(realPath, 0):
+            return False
+
+        memberPath = mydfs.striping.get_member_path(realPath)
+        memberPaths = [root + memberPath for _, root in self._Roots]
+        allRoots = [root for _, root in self._Roots]
+        with self._slots(allRoots):
+            for p in memberPaths:
+                self._ensure_directory(p)
+
+            fileHandles, stripe = mydfs.striping.open_stripe(memberPaths, os.O_RDWR | os.O_CREAT | os.O_EXCL,
+                                                             stat.S_IMODE(sourceStat.st_mode), self.StripeChunkSize)
+
+        try:
+            if sourceStat.st_size != 0:
+                slot = None if self.Scheduler is None else lambda index: self._slot(allRoots[index])
+                self._copy_to_stripe(sourceRoot, sourcePath, sourceStat.st_size, stripe, slot)
+
+        finally:
+            for fileHandle in fileHandles:
+                os.close(fileHandle)
+
+        with self._FileHandleLock, self._slots(allRoots):
+            nStat = os.lstat(sourcePath)
+            if (nStat.st_mtime_ns, nStat.st_size) != (sourceStat.st_mtime_ns, sourceStat.st_size):
+                for p in memberPaths:
+                    os.unlink(p)
+
+                return False
+
+            for fileHandle, (p, writable, _) in self._OpenFilePaths.items():
+                if p != realPath or fileHandle in self._Stripes:
+                    continue
+
+                fileHandles, stripe = mydfs.striping.open_stripe(memberPaths, os.O_RDWR if writable else os.O_RDONLY,
+                                                                 0o777, self.StripeChunkSize)
+                self._OpenFileHandles[fileHandle].extend(fileHandles)  # closed on release
+                self._Stripes[fileHandle] = stripe
+
+            for _, p in paths:
+                os.unlink(p)
+
+            self._StripedPaths.add(realPath)
+
+        return True
+
+    def _forget_striped(self, realPath):
+        '''
+        Forgets conversions of file or files in directory, see `._resolve`.
+
+        @param realPath str; path without mask
+        '''
+        if len(self._StripedPaths) == 0:
+            return
+
+        prefix = realPath.rstrip('/') + '/'
+        self._StripedPaths = {p for p in self._StripedPaths if p != realPath and not p.startswith(prefix)}
+
+    def _copy_to_stripe(self, root, path, size, stripe, slot):
+        '''
+        @param root   str; real path of root
+        @param path   str; real path of replica
+        @param size   int
+        @param stripe `mydfs.striping.Stripe`
+        @param slot   see `mydfs.striping.Stripe.write`
+        '''
+        fileHandle = os.open(path, os.O_RDONLY)
+        try:
+            offset = 0
+            while offset < size:
+                with self._slot(root):
+                    data = os.pread(fileHandle, min(mydfs.copying.BLOCK_SIZE, size - offset), offset)
+
+                if len(data) == 0:  # shrunk, see `._stripe`
+                    break
+
+                stripe.write(data, offset, self._Executor, slot=slot)
+                offset += len(data)
+
+        finally:
+            os.close(fileHandle)
+
+    def _stripe_on_write(self, fileHandle):
+        '''
+        Converts file on the first write past the stripe threshold, if opened on all replicas, see `._stripe`.
+
+        @param fileHandle int
+        @return None or `mydfs.striping.Stripe`; of file handle if converted
+        '''
+        if fileHandle in self._StripeChecked:
+            return None
+
+        self._StripeChecked.add(fileHandle)
+
+        realPath, _, roots = self._OpenFilePaths[fileHandle]
+        if len(self._Mappings) != 0:
+            self._close_mappings(realPath)
+
+        if not self._stripe(realPath, [(root, root + realPath) for root in roots]):
+            return None
+
+        return self._Stripes.get(fileHandle, None)
+
     @fuse_errors
     def unlink(self, path):
-        for _, p in reversed(self._resolve(path)):
-            r = os.unlink(p)
+        key = None if self.Inodes is None else self._get_inode_key(path)
+        for root, p in reversed(self._resolve(path)):
+            with self._slot(root):
+                r = os.unlink(p)
+
+        self._forget_striped(self._get_real_path(path))
+
+        if self.Inodes is not None:
+            self._remove_inode(path, key)
 
         return r
 
     @fuse_errors
     def utimens(self, path, times=None):
-        for _, p in reversed(self._resolve(path)):
-            r = os.utime(p, times=times)
+        for root, p in reversed(self._resolve(path)):
+            with self._slot(root):
+                r = os.utime(p, times=times)
 
         return r
 
     @fuse_errors
     def write(self, path, data, offset, fileHandle):
+        '''
+        Writes to all replicas.
+
+        The first write past the stripe threshold converts the file to a striped file, see `._stripe_on_write`.
+
+        Writes to the control file execute commands, see `mydfs.control`; failing commands fail with `EINVAL`.
+        '''
+        if fileHandle in self._VirtualFileHandles:
+            try:
+                return self.Controller.write(fileHandle, data)
+
+            except KeyError:  # not opened for writing
+                raise fuse.FuseOSError(fuse.EBADF)
+
+            except ValueError:
+                raise fuse.FuseOSError(fuse.EINVAL)
+
+        stripe = self._Stripes.get(fileHandle, None)
+        if stripe is None and self.StripeThreshold is not None and self.StripeThreshold <= offset + len(data):
+            stripe = self._stripe_on_write(fileHandle)
+
+        if stripe is not None:
+            return stripe.write(data, offset, self._Executor, slot=self._get_stripe_slot(fileHandle, stripe))
+
         with self._get_file_handle_lock(fileHandle):
-            for fh in self._OpenFileHandles[fileHandle]:
-                os.lseek(fh, offset, 0)  # from fusepy loopack example
-                r = os.write(fh, data)
+            if self.Dirty is not None:
+                realPath, _, roots = self._OpenFilePaths[fileHandle]
+                return self._apply_tracked(realPath, list(zip(roots, zip(roots, self._OpenFileHandles[fileHandle]))),
+                                           lambda target: self._write(*target, data, offset), offset, len(data))
+
+            _, _, roots = self._OpenFilePaths[fileHandle]
+            results = self._apply_all(lambda target: self._write(*target, data, offset),
+                                      list(zip(roots, self._OpenFileHandles[fileHandle])), len(data))
+            for root, (r, e) in zip(roots, results):
+                if e is not None:
+                    raise e
+
+                character = self._Characters[root]
+                self.Statistics.add(character, 'writes')
+                self.Statistics.add(character, 'writtenBytes', r)
+
+        return r
+
+    def _write(self, root, fileHandle, data, offset):
+        with self._slot(root):
+            if fileHandle in self._DirectFileHandles:
+                r = self._call_direct(fileHandle, mydfs.direct.write, fileHandle, data, offset)
+                if r is not None:
+                    return r
+
+            os.lseek(fileHandle, offset, 0)  # from fusepy loopack example
+            return os.write(fileHandle, data)
+
+    def _call_direct(self, fileHandle, function, *args):
+        '''
+        Calls function of `mydfs.direct` and falls back to buffered I/O if the device rejects the alignment.
+
+        @return None or any; None if direct I/O was disabled
+        '''
+        try:
+            return function(*args)
+
+        except OSError as e:
+            if e.errno != fuse.EINVAL:
+                raise
+
+        log.warning('direct I/O failed, falling back to buffered I/O')
+        mydfs.direct.disable(fileHandle)
+        self._DirectFileHandles.discard(fileHandle)
+        return None
+
+    def _apply_tracked(self, realPath, targets, function, offset, length):
+        '''
+        Applies a modification to all replicas and marks replicas which failed as dirty.
+
+        - for all targets, in parallel if large, see `._apply_all`
+          - applies function
+          - if error
+            - remembers target
+          - else if fewer bytes written
+            - marks remaining range as dirty
+        - if all failed
+          - raises first error
+        - for all failed
+          - marks range or, if not given, all as dirty
+
+        @param realPath str; path without mask
+        @param targets  [(str, any)]; real path of root and argument to `function`
+        @param function function(any); returns int
+        @param offset   None or int
+        @param length   None or int
+        @return any; result for last target which didn't fail
+        '''
+        errors = []
+        r = None
+        results = self._apply_all(function, [target for _, target in targets], length)
+        for (root, _), (result, e) in zip(targets, results):
+            if e is not None:
+                errors.append((root, e))
+                self.Statistics.add(self._Characters[root], 'errors')
+                continue
+
+            r = result
+
+            if length is None:
+                continue
+
+            self.Statistics.add(self._Characters[root], 'writes')
+            self.Statistics.add(self._Characters[root], 'writtenBytes', r)
+
+            if r < length:
+                self.Dirty.mark(self._Characters[root], realPath, offset + r, length - r)
+
+        if len(errors) == len(targets):
+            _, e = errors[0]
+            raise e
+
+        for root, _ in errors:
+            if length is None:
+                self.Dirty.mark_all(self._Characters[root], realPath)
+
+            else:
+                self.Dirty.mark(self._Characters[root], realPath, offset, length)
+
+        return r
+
+    def _apply_all(self, function, arguments, size):
+        '''
+        Calls function for all arguments, in parallel if there are multiple and `size` is at least
+        `PARALLEL_WRITE_SIZE`.
+
+        @param function  function(any) -> any
+        @param arguments [any]
+        @param size      None or int; number of bytes written
+        @return [(any, None or OSError)]; result or error per argument
+        '''
+
+        def _call(argument):
+            try:
+                return (function(argument), None)
+
+            except OSError as e:
+                return (None, e)
+
+        if len(arguments) == 1 or size is None or size < PARALLEL_WRITE_SIZE:
+            return [_call(argument) for argument in arguments]
+
+        futures = [self._Executor.submit(_call, argument) for argument in arguments]
+        r = [future.result() for future in futures]
+        return r
+
+    def _get_stats_sources(self):
+        '''
+        @return {str: {str: int}}; stats of background work, see `mydfs.stats.Statistics.get`
+        '''
+        r = {}
+
+        for name, source in (('tiering', self.Tiering), ('dirty', self.Dirty), ('scrub', self.Scrubber),
+                             ('contentIndex', self.ContentIndex), ('inodes', self.Inodes),
+                             ('sharedCache', self.SharedCache), ('scheduler', self.Scheduler),
+                             ('replication', self.Replicator), ('listingCache', self.ListingCache),
+                             ('warmup', self.Warmup), ('prefetch', self.Prefetcher),
+                             ('control', self.Controller)):
+            if source is not None:
+                r[name] = source.Stats
 
         return r
 
     def _resolve(self, path, orBestInexistent=False):
         '''
+        - if root view, see `._parse_root_view`
+          - returns path in single root
         - if base name contains valid mask
-          - returns corresponding paths
+          - if converted to striped file while mounted
+            - continues with path without mask
+          - returns corresponding paths or paths of member files
         - tests all paths for existence
         - if any
           - returns paths
+        - tests all paths of member files for existence
+        - if any
+          - returns paths of member files
         - if `orBestInexistent`
-          - returns best inexistent path
+          - returns paths by placement policy or best inexistent path, see `._get_new_paths`
         - raises not found error
 
         Warning:
@@ -465,42 +1712,320 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
           - `path` is absolute path. TODO check
         '''
 
-        r = []
-
-        dirPath, name = ospath.split(path)
+        if path == VIRTUAL_PATH or path.startswith(VIRTUAL_PATH + '/'):
+            view = self._parse_root_view(path)
+            if view is not None:
+                root, realPath = view
+                return [(root, root + realPath)]
 
-        nRoots = len(self._Roots)
-        if nRoots < len(name) and name[nRoots] == '_':  # could contain mask
-            realPath = ospath.join(dirPath, name[(nRoots + 1):])
+            raise fuse.FuseOSError(fuse.EACCES if path in (VIRTUAL_PATH, ROOTS_PATH) or path in self._VirtualFiles else
+                                   fuse.ENOENT)
 
-            for maskCharacter, (rootCharacter, root) in zip(name, self._Roots):
-                if maskCharacter == '.':  # not there
-                    continue
-                if maskCharacter != rootCharacter:  # invalid mask
-                    break
+        masked = self._parse_mask(path)
+        if masked is not None:
+            realPath, roots, striped = masked
+            if not striped and realPath in self._StripedPaths:  # name from before conversion, see `._stripe`
+                return self._resolve(realPath)
 
-                r.append((root, root + realPath))
+            if striped:
+                realPath = mydfs.striping.get_member_path(realPath)
 
-            else:
-                if len(r) != 0:  # valid mask
-                    return r
+            return [(root, root + realPath) for root in roots]
 
         # test all paths for existence
-        r.clear()
+        r = []
         for _, root in self._Roots:
             p = root + path
-            if ospath.exists(p):
+            if self._exists(root, p):
+                r.append((root, p))
+
+        if len(r) != 0:  # found any
+            return r
+
+        memberPath = mydfs.striping.get_member_path(path)
+        for _, root in self._Roots:
+            p = root + memberPath
+            if self._exists(root, p):
                 r.append((root, p))
 
         if len(r) != 0:  # found any
             return r
 
         if orBestInexistent:
-            r.append(self._get_best_inexistent(path))
+            r = self._get_new_paths(path)
             return r
 
         raise fuse.FuseOSError(fuse.ENOENT)
 
+    def _invalidate_root_view(self, op, args):
+        '''
+        Notifies listeners of changes in root views, see `.invalidate`, which aren't visible to the kernel in the
+        merged namespace.
+
+        @param op   str
+        @param args tuple
+        '''
+        for path in args[:NAMESPACE_OPS.get(op, 1)]:
+            if self._parse_root_view(path) is not None:
+                self.invalidate(self._get_real_path(path))
+
+    def _lstat(self, path):
+        '''
+        @param path str; real path of replica
+        @return `os.stat_result`; see `mydfs.sharedcache.lstat`
+        '''
+        if self.SharedCache is None:
+            return os.lstat(path)
+
+        return mydfs.sharedcache.lstat(self.SharedCache, path)
+
+    def _exists(self, root, path):
+        '''
+        @param root str; real path of root
+        @param path str; real path of replica
+        @return bool; see `mydfs.sharedcache.exists`
+        '''
+        with self._slot(root):
+            if self.SharedCache is None:
+                return ospath.exists(path)
+
+            return mydfs.sharedcache.exists(self.SharedCache, path)
+
+    def _invalidate_shared(self, op, args):
+        '''
+        - if operation changes attributes
+          - invalidates entries of path on all roots
+        - if operation changes entries of directories
+          - invalidates entries of paths and their parent directories on all roots
+          - if directory was renamed
+            - invalidates all entries
+
+        @param op   str
+        @param args tuple
+        '''
+        if op in ATTRIBUTE_OPS or (op == 'open' and args[1] & (os.O_CREAT | os.O_TRUNC) != 0):
+            self._invalidate_shared_paths(self._get_real_path(args[0]), False)
+            return
+
+        nPaths = NAMESPACE_OPS.get(op, None)
+        if nPaths is None:
+            return
+
+        realPaths = [self._get_real_path(path) for path in args[:nPaths]]
+        for realPath in realPaths:
+            self._invalidate_shared_paths(realPath, True)
+
+        if op == 'rename' and any(self._is_directory(root, root + realPaths[1]) for _, root in self._Roots):
+            self.SharedCache.flush()
+
+    def _invalidate_listings(self, op, args):
+        '''
+        - if operation changes attributes
+          - invalidates scan of parent directory
+        - if operation changes entries of directories
+          - invalidates scans of parent directories and, for directories, of all directories below
+
+        @param op   str
+        @param args tuple
+        '''
+        if op in ATTRIBUTE_OPS or (op == 'open' and args[1] & (os.O_CREAT | os.O_TRUNC) != 0):
+            self.ListingCache.invalidate(ospath.dirname(self._get_real_path(args[0])))
+            return
+
+        nPaths = NAMESPACE_OPS.get(op, None)
+        if nPaths is None:
+            return
+
+        for path in args[:nPaths]:
+            realPath = self._get_real_path(path)
+            self.ListingCache.invalidate(ospath.dirname(realPath))
+            if op in ('rename', 'rmdir'):
+                self.ListingCache.invalidate_tree(realPath)
+
+    def _invalidate_shared_paths(self, realPath, withParents):
+        '''
+        Invalidates entries of replicas, member files and, optionally, parent directories on all roots.
+
+        @param realPath    str; path without mask
+        @param withParents bool
+        '''
+        realPaths = [realPath, mydfs.striping.get_member_path(realPath)]
+        if withParents:
+            dirPath = ospath.dirname(realPath)
+            while dirPath != '/':
+                realPaths.append(dirPath)
+                dirPath = ospath.dirname(dirPath)
+
+            realPaths.append('/')
+
+        for _, root in self._Roots:
+            for p in realPaths:
+                self.SharedCache.invalidate(root + p)
+
+    def _parse_mask(self, path):
+        '''
+        - if base name contains valid mask
+          - returns path without mask, roots and whether the separator denotes a striped file
+        - returns None
+
+        @param path str
+        @return None or (str, [str], bool); path without mask, real paths of roots and whether striped
+        '''
+        dirPath, name = ospath.split(path)
+
+        nRoots = len(self._Roots)
+        if not (nRoots < len(name) and name[nRoots] in ('_', mydfs.striping.MASK_SEPARATOR)):  # doesn't contain mask
+            return None
+
+        roots = []
+        for maskCharacter, (rootCharacter, root) in zip(name, self._Roots):
+            if maskCharacter == '.':  # not there
+                continue
+            if maskCharacter != rootCharacter:  # invalid mask
+                return None
+
+            roots.append(root)
+
+        if len(roots) == 0:
+            return None
+
+        r = (ospath.join(dirPath, name[(nRoots + 1):]), roots, name[nRoots] == mydfs.striping.MASK_SEPARATOR)
+        return r
+
+    def _parse_root_view(self, path):
+        '''
+        Root views are directories `ROOTS_PATH/{character}` which map directly to a single root, without masks, merge
+        or tests for existence in other roots.
+        The state directory and member files of striped files are hidden.
+
+        @param path str
+        @return None or (str, str); real path of root and path in root
+        '''
+        if not path.startswith(ROOTS_PATH + '/'):
+            return None
+
+        character, _, realPath = path[(len(ROOTS_PATH) + 1):].partition('/')
+        root = self._RootPaths.get(character, None)
+        if root is None:
+            return None
+
+        realPath = '/' + realPath
+        if (realPath == VIRTUAL_PATH or realPath.startswith(VIRTUAL_PATH + '/')
+                or mydfs.striping.is_member_path(realPath)):
+            return None
+
+        r = (root, realPath)
+        return r
+
+    def _get_inode_key(self, path):
+        '''
+        Names which denote the same file share the key, names of different files, e.g. diverged replicas listed as
+        `a._x` and `.b_x`, don't.
+
+        - if virtual, e.g. root view
+          - returns path
+        - if mask doesn't denote all replicas, or replicas differ by file id, see `.readdir`
+          - returns path with mask
+        - returns path without mask
+
+        @param path str
+        @return str; see `mydfs.inodes`
+        '''
+        if path == VIRTUAL_PATH or path.startswith(VIRTUAL_PATH + '/'):
+            return path
+
+        masked = self._parse_mask(path)
+        if masked is None:
+            return path
+
+        realPath, roots, striped = masked
+        if striped:
+            return realPath
+
+        fileIds = self._get_file_ids(realPath)
+        if set(roots) != fileIds.keys() or len(set(fileIds.values())) != 1:
+            return path
+
+        return realPath
+
+    def _get_file_ids(self, realPath):
+        '''
+        @param realPath str; path without mask
+        @return {str: any}; {real path of root: file id or, if known, hash of content}, see `._merge_equal_content`;
+                None for directories
+        '''
+        r = {}
+        for _, root in self._Roots:
+            p = root + realPath
+            try:
+                with self._slot(root):
+                    stat_ = self._lstat(p)
+
+            except FileNotFoundError:
+                continue
+
+            r[root] = None if stat.S_ISDIR(stat_.st_mode) else (stat_.st_mtime_ns, stat_.st_size)
+
+            if self.ContentIndex is not None and r[root] is not None:
+                digest = self.ContentIndex.get(p, stat_)
+                if digest is not None:
+                    r[root] = digest
+
+        return r
+
+    def _remove_inode(self, path, key):
+        '''
+        Removes inode number unless replicas are left, e.g. after unlink of some replicas.
+
+        @param path str
+        @param key  str; see `._get_inode_key`, before removal
+        '''
+        realPath = self._get_real_path(path)
+        if key != realPath:  # root view or mask
+            self.Inodes.remove(key)
+
+        if not any(ospath.lexists(root + realPath) for _, root in self._Roots):
+            self.Inodes.remove(realPath)
+
+    def _get_real_path(self, path):
+        '''
+        @param path str
+        @return str; path without mask, or path in root if root view
+        '''
+        if path.startswith(ROOTS_PATH):
+            view = self._parse_root_view(path)
+            if view is not None:
+                _, realPath = view
+                return realPath
+
+        masked = self._parse_mask(path)
+        if masked is None:
+            return path
+
+        realPath, _, _ = masked
+        return realPath
+
+    def _is_striped(self, paths):
+        '''
+        @param paths [(str, str)]; see `._resolve`
+        @return bool
+        '''
+        _, p = paths[0]
+        return mydfs.striping.is_member_path(p)
+
+    def _get_new_paths(self, path):
+        '''
+        @param path str; path without mask
+        @return [(str, str)]; paths by placement policy, see `mydfs.placement`, or best inexistent path
+        '''
+        if self.Placement is not None:
+            roots = self.Placement.get_roots(path, self._Roots)
+            if roots is not None:
+                return [(root, root + path) for root in roots]
+
+        r = [self._get_best_inexistent(path)]
+        return r
+
     def _get_best_inexistent(self, path):
         # find paths which match longest
         names = path.split('/')
@@ -509,7 +2034,11 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
         paths = [(root, root) for _, root in self._Roots]
         for name in iNames:
             paths = [(root, ospath.join(path, name)) for root, path in paths]
-            nPaths = [pair for pair in paths if ospath.exists(pair[1])]
+            nPaths = []
+            for root, path in paths:
+                with self._slot(root):
+                    if ospath.exists(path):
+                        nPaths.append((root, path))
 
             if len(nPaths) == 0:
                 break
@@ -532,3 +2061,50 @@ class Mydfs(fuse.LoggingMixIn, fuse.Operations):
 
     def _ensure_directory(self, path):
         os.makedirs(ospath.dirname(path), exist_ok=True)
+
+    def _is_directory(self, root, path):
+        with self._slot(root):
+            return ospath.isdir(path)
+
+    def _slot(self, root):
+        '''
+        Every system call on a root should hold a slot of the root, see `mydfs.scheduler`.
+
+        @param root str; real path of root
+        @return context manager
+        '''
+        if self.Scheduler is None:
+            return _NO_SLOT
+
+        return self.Scheduler.slot(root)
+
+    def _slots(self, roots):
+        '''
+        @param roots iter(str); real paths of roots
+        @return context manager; see `mydfs.scheduler.Scheduler.slots`
+        '''
+        if self.Scheduler is None:
+            return _NO_SLOT
+
+        return self.Scheduler.slots(roots)
+
+    def _get_stripe_slot(self, fileHandle, stripe):
+        '''
+        @return None or function(int) -> context manager; slot by index of member, see `mydfs.striping.Stripe.read`
+        '''
+        if self.Scheduler is None:
+            return None
+
+        roots = self._get_roots(fileHandle)[-len(stripe.FileHandles):]
+        return lambda index: self._slot(roots[index])
+
+    def _get_roots(self, fileHandle):
+        '''
+        @param fileHandle int
+        @return [str]; real paths of roots corresponding to `._OpenFileHandles[fileHandle]`
+        '''
+        _, _, roots = self._OpenFilePaths[fileHandle]
+        if len(roots) < len(self._OpenFileHandles[fileHandle]):  # converted to striped file, see `._stripe`
+            roots = roots + [root for _, root in self._Roots]
+
+        return roots
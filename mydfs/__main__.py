@@ -1,34 +1,227 @@
 import mydfs
-import fuse
+import mydfs.cli
+import mydfs.tiering
+import mydfs.dirty
+import mydfs.scrub
+import mydfs.contenthash
+import mydfs.inodes
+import mydfs.sharedcache
+import mydfs.direct
+import mydfs.scheduler
+import mydfs.replication
+import mydfs.placement
+import mydfs.listing
+import mydfs.warmup
+import mydfs.prefetch
+import mydfs.control
+import mydfs.trace
 import os
+import sys
 import argparse
+import importlib
 import logging
 ospath = os.path
 
+COMMANDS = {
+    'ingest': 'mydfs.ingest',
+    'query': 'mydfs.query',
+    'replay': 'mydfs.trace',
+    'resync': 'mydfs.resync',
+    'scrub': 'mydfs.scrub',
+}  # {name: module with function `main(arguments)`}
+
+if 1 < len(sys.argv) and sys.argv[1] in COMMANDS:
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(importlib.import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:]))
+
 # parse arguments
-parser = argparse.ArgumentParser()
+parser = argparse.ArgumentParser(epilog='Commands: {}; see \'{{command}} --help\''.format(', '.join(COMMANDS)))
 
 parser.add_argument('-d', '--debug', action='store_true', default=False, help='Debug mode')
-parser.add_argument(metavar='root', nargs='+', dest='roots', help='Path of root directory as \'{character}={path}\'')
+parser.add_argument('--backend', choices=['fusepy', 'pyfuse3'], default='fusepy',
+                    help='FUSE binding; pyfuse3 is inode-based and asynchronous, requires pyfuse3 and pyfuse3_asyncio')
+parser.add_argument('--fast', metavar='character', default=None, help='Character of root to use as fast tier')
+parser.add_argument('--promote-heat', type=float, default=8., help='Minimum heat for promotion to the fast tier')
+parser.add_argument('--evict-heat', type=float, default=1., help='Heat below which promoted files are evicted')
+parser.add_argument('--tier-interval', type=float, default=10., help='Seconds between tiering runs')
+parser.add_argument('--tier-rate', type=float, default=None, help='Maximum MB/s copied by tiering')
+parser.add_argument('--stripe-threshold', type=float, default=None,
+                    help='Minimum size in MB from which files are striped across all roots, on truncation or on the '
+                         'first write past it')
+parser.add_argument('--stripe-chunk-size', type=float, default=1., help='Chunk size in MB of striped files')
+parser.add_argument('--dirty-tracking', action='store_true', default=False,
+                    help='Let writes succeed if some replicas fail, and resync those in the background')
+parser.add_argument('--dirty-journal', metavar='path', default=None,
+                    help='Path of journal of replicas which missed writes, default in state directory of first root; '
+                         'implies --dirty-tracking')
+parser.add_argument('--resync-rate', type=float, default=None, help='Maximum MB/s copied to resync dirty ranges')
+parser.add_argument('--scrub-interval', type=float, default=None, help='Hours between background scrubs')
+parser.add_argument('--scrub-rate', type=float, default=None, help='Maximum MB/s read by background scrubs')
+parser.add_argument('--content-index', action='store_true', default=False,
+                    help='Merge replicas with equal content but different modification time or size')
+parser.add_argument('--trace', metavar='path', default=None,
+                    help='Path to record all operations to, see \'replay --help\'')
+parser.add_argument('--log-sampling', type=float, default=None, metavar='fraction',
+                    help='Fraction of operations to log')
+parser.add_argument('--stable-inodes', action='store_true', default=False,
+                    help='Report inode numbers which are stable per path across replicas and restarts; implied by '
+                         '--backend pyfuse3')
+parser.add_argument('--inode-map', metavar='path', default=None,
+                    help='Path of database with inode numbers, default in state directory of first root; implies '
+                         '--stable-inodes')
+parser.add_argument('--map-threshold', type=float, default=None,
+                    help='Minimum size in MB of files opened read-only to read through memory mappings; only safe if '
+                         'roots aren\'t truncated outside the mount')
+parser.add_argument('--direct-prefix', metavar='path', action='append', default=[],
+                    help='Path in mount below which files are opened with O_DIRECT, bypassing the page cache of roots')
+parser.add_argument('--direct-min-size', type=float, default=None,
+                    help='Minimum size in MB of existing files opened with O_DIRECT')
+parser.add_argument('--io-scheduler', action='store_true', default=False,
+                    help='Limit concurrent I/O per root by device type, with priority of requests over background work')
+parser.add_argument('--io-concurrency', type=int, default=None,
+                    help='Concurrent I/O per root of unknown device type, e.g. tmpfs or network file systems; '
+                         'unlimited by default')
+parser.add_argument('--io-concurrency-rotational', type=int, default=2, help='Concurrent I/O per rotational disk')
+parser.add_argument('--io-concurrency-ssd', type=int, default=32, help='Concurrent I/O per solid state drive')
+parser.add_argument('--placement', metavar='path', default=None,
+                    help='Path of policy file with number of replicas and preferred roots of new files by path prefix')
+parser.add_argument('--replication', action='store_true', default=False,
+                    help='Let renames which change the mask of files copy them to added roots and remove them from '
+                         'dropped roots, in the background')
+parser.add_argument('--replication-rate', type=float, default=None,
+                    help='Maximum MB/s copied to roots added to the mask of files by renames; implies --replication')
+parser.add_argument('--shared-cache', metavar='name', default=None,
+                    help='Name of shared memory with attributes cached for all mounts on the host, e.g. mydfs; '
+                         'pays off if roots are slow to stat, e.g. network filesystems')
+parser.add_argument('--shared-cache-slots', type=int, default=2**18,
+                    help='Number of entries of shared cache, if created')
+parser.add_argument('--shared-cache-ttl', type=float, default=10.,
+                    help='Seconds an entry of shared cache stays valid')
+parser.add_argument('--listing-cache', type=int, default=None, metavar='n',
+                    help='Number of directory listings cached in memory')
+parser.add_argument('--listing-cache-ttl', type=float, default=10.,
+                    help='Seconds a cached directory listing stays valid')
+parser.add_argument('--prefetch', type=int, default=None, metavar='jobs',
+                    help='Number of threads prefetching listings of subdirectories of listed directories; implies '
+                         '--listing-cache')
+parser.add_argument('--control', action='store_true', default=False,
+                    help='Change settings, drop caches and trigger background work at runtime by writing commands to '
+                         '/.mydfs/control')
+parser.add_argument('--warmup', action='store_true', default=False,
+                    help='Crawl all directories in the background after mount to fill caches')
+parser.add_argument('--warmup-path', metavar='path', action='append', default=[],
+                    help='Path in mount of hot directory crawled first; implies --warmup')
+parser.add_argument('--warmup-seconds', type=float, default=None, help='Time budget of warm-up')
+parser.add_argument('--warmup-entries', type=int, default=None, help='Budget of directory entries of warm-up')
+parser.add_argument('--warmup-jobs', type=int, default=4, help='Number of directories crawled in parallel')
+mydfs.cli.add_mount_arguments(parser)
+mydfs.cli.add_roots_argument(parser)
 parser.add_argument('dir', help='Path of directory to attach to')
 
 args = parser.parse_args()
 #
 
-roots = []
-for root in args.roots:
-    i = root.find('=')
-    if i == -1:
-        raise argparse.ArgumentError('root', 'Invalid root {}'.format(repr(root)))
+roots = mydfs.cli.parse_roots(args.roots)
+
+tiering = None
+if args.fast is not None:
+    tiering = mydfs.tiering.Tiering(args.fast, promoteHeat=args.promote_heat, evictHeat=args.evict_heat,
+                                    interval=args.tier_interval,
+                                    rate=None if args.tier_rate is None else args.tier_rate * 2**20)
+
+dirty = None
+if args.dirty_tracking or args.dirty_journal is not None:
+    dirtyJournalPath = args.dirty_journal
+    if dirtyJournalPath is None:
+        _, path = roots[0]
+        dirtyJournalPath = ospath.join(path, mydfs.STATE_NAME, 'dirty.journal')
+
+    dirty = mydfs.dirty.DirtyJournal(dirtyJournalPath,
+                                     rate=None if args.resync_rate is None else args.resync_rate * 2**20)
+
+scrubber = None
+if args.scrub_interval is not None:
+    _, path = roots[0]
+    scrubber = mydfs.scrub.Scrubber(ospath.join(path, mydfs.STATE_NAME, 'scrub.sqlite'),
+                                    rate=None if args.scrub_rate is None else args.scrub_rate * 2**20,
+                                    interval=args.scrub_interval * 3600)
+
+contentIndex = None
+if args.content_index:
+    _, path = roots[0]
+    contentIndex = mydfs.contenthash.ContentIndex(ospath.join(path, mydfs.STATE_NAME, 'content.sqlite'))
+
+inodes = None
+if args.stable_inodes or args.inode_map is not None or args.backend == 'pyfuse3':
+    inodeMapPath = args.inode_map
+    if inodeMapPath is None:
+        _, path = roots[0]
+        inodeMapPath = ospath.join(path, mydfs.STATE_NAME, 'inodes.sqlite')
+
+    inodes = mydfs.inodes.InodeMap(inodeMapPath)
+
+sharedCache = None
+if args.shared_cache is not None:
+    sharedCache = mydfs.sharedcache.SharedCache(args.shared_cache, nSlots=args.shared_cache_slots,
+                                                ttl=args.shared_cache_ttl)
 
-    character = root[:i]
-    path = root[(i + 1):]
+direct = None
+if len(args.direct_prefix) != 0 or args.direct_min_size is not None:
+    minSize = None if args.direct_min_size is None else int(args.direct_min_size * 2**20)
+    direct = mydfs.direct.DirectPolicy(prefixes=args.direct_prefix, minSize=minSize)
 
-    if not ospath.isdir(path):
-        raise FileNotFoundError(path)
+scheduler = None
+if args.io_scheduler:
+    scheduler = mydfs.scheduler.Scheduler(concurrency=args.io_concurrency,
+                                          rotationalConcurrency=args.io_concurrency_rotational,
+                                          nonRotationalConcurrency=args.io_concurrency_ssd)
 
-    roots.append((character, path))
+replicator = None
+if args.replication or args.replication_rate is not None:
+    replicator = mydfs.replication.Replicator(
+        rate=None if args.replication_rate is None else args.replication_rate * 2**20)
+
+placement = None if args.placement is None else mydfs.placement.load(args.placement)
+
+listingCache = None
+if args.listing_cache is not None or args.prefetch is not None:
+    listingCache = mydfs.listing.ListingCache(ttl=args.listing_cache_ttl)
+    if args.listing_cache is not None:
+        listingCache.MaxEntries = args.listing_cache
+
+prefetcher = None if args.prefetch is None else mydfs.prefetch.Prefetcher(jobs=args.prefetch)
+
+warmup = None
+if args.warmup or len(args.warmup_path) != 0:
+    warmup = mydfs.warmup.Warmup(paths=args.warmup_path, maxSeconds=args.warmup_seconds,
+                                 maxEntries=args.warmup_entries, jobs=args.warmup_jobs)
+
+controller = mydfs.control.Controller() if args.control else None
+
+recorder = None if args.trace is None else mydfs.trace.Recorder(args.trace)
 
 logging.basicConfig()
+if args.log_sampling is not None:
+    logging.getLogger('mydfs').setLevel(logging.DEBUG)
+
+mydfs_ = mydfs.Mydfs(roots, tiering=tiering, stripeChunkSize=int(args.stripe_chunk_size * 2**20),
+                     stripeThreshold=None if args.stripe_threshold is None else int(args.stripe_threshold * 2**20),
+                     dirty=dirty, scrubber=scrubber, contentIndex=contentIndex, recorder=recorder,
+                     logSampling=args.log_sampling, inodes=inodes, sharedCache=sharedCache,
+                     mapThreshold=None if args.map_threshold is None else int(args.map_threshold * 2**20),
+                     direct=direct, scheduler=scheduler, replicator=replicator,
+                     placement=placement, listingCache=listingCache, warmup=warmup,
+                     prefetcher=prefetcher, controller=controller)
+
+try:
+    if args.backend == 'pyfuse3':
+        import mydfs.lowlevel
+        mydfs.lowlevel.main(mydfs_, args.dir, options=mydfs.cli.get_mount_options(args), debug=args.debug)
+
+    else:
+        mydfs.FUSE(mydfs_, args.dir, foreground=True, debug=args.debug, use_ino=inodes is not None,
+                   **mydfs.cli.get_mount_options(args))
 
-fuse.FUSE(mydfs.Mydfs(roots), args.dir, foreground=True, debug=args.debug)
+finally:
+    if recorder is not None:
+        recorder.close()
@@ -0,0 +1,93 @@
+'''
+Helpers for command line interfaces.
+'''
+
+import argparse
+import os
+
+ospath = os.path
+
+
+def add_roots_argument(parser):
+    parser.add_argument(metavar='root', nargs='+', dest='roots',
+                        help='Path of root directory as \'{character}={path}\'')
+
+
+def parse_roots(strings):
+    '''
+    @param strings iter(str); roots as '{character}={path}'
+    @return [(str, str)]; list of (character, path to root)
+    '''
+    r = []
+
+    for root in strings:
+        i = root.find('=')
+        if i == -1:
+            raise argparse.ArgumentError('root', 'Invalid root {}'.format(repr(root)))
+
+        character = root[:i]
+        path = root[(i + 1):]
+
+        if not ospath.isdir(path):
+            raise FileNotFoundError(path)
+
+        r.append((character, path))
+
+    return r
+
+
+CACHE_PROFILES = {
+    'strict': {
+        'attr_timeout': 0.,
+        'entry_timeout': 0.,
+        'negative_timeout': 0.,
+    },  # roots are modified outside the mount
+    'default': {},  # defaults of libfuse
+    'metadata': {
+        'attr_timeout': 60.,
+        'entry_timeout': 60.,
+        'negative_timeout': 5.,
+        'auto_cache': True,
+    },
+    'aggressive': {
+        'attr_timeout': 3600.,
+        'entry_timeout': 3600.,
+        'negative_timeout': 60.,
+        'auto_cache': True,
+        'max_read': 2**17,
+        'max_write': 2**17,
+    },  # roots are modified through the mount only
+}  # {name: {mount option: value}}
+
+
+def add_mount_arguments(parser):
+    parser.add_argument('--cache-profile', choices=list(CACHE_PROFILES), default='default',
+                        help='Profile of kernel cache options, overridden by the options below')
+    parser.add_argument('--attr-timeout', type=float, default=None, help='Seconds to cache attributes')
+    parser.add_argument('--entry-timeout', type=float, default=None, help='Seconds to cache names')
+    parser.add_argument('--negative-timeout', type=float, default=None, help='Seconds to cache inexistence of names')
+    parser.add_argument('--kernel-cache', action='store_true', default=None,
+                        help='Keep page cache of files on open, only safe if roots aren\'t modified outside the mount')
+    parser.add_argument('--auto-cache', action='store_true', default=None,
+                        help='Keep page cache of files on open if modification time and size are unchanged')
+    parser.add_argument('--max-read', type=int, default=None, help='Maximum bytes per read')
+    parser.add_argument('--max-write', type=int, default=None, help='Maximum bytes per write')
+
+
+def get_mount_options(args):
+    '''
+    @param args `argparse.Namespace`; see `add_mount_arguments`
+    @return {str: any}; keyword arguments for `fuse.FUSE`
+    '''
+    r = dict(CACHE_PROFILES[args.cache_profile])
+
+    for name in ('attr_timeout', 'entry_timeout', 'negative_timeout', 'kernel_cache', 'auto_cache', 'max_read',
+                 'max_write'):
+        value = getattr(args, name)
+        if value is not None:
+            r[name] = value
+
+    if 'max_write' in r:
+        r['big_writes'] = True  # otherwise writes are split into pages
+
+    return r
@@ -0,0 +1,170 @@
+'''
+Content-hash index: hashes of file versions used to decide equality of replicas, see `mydfs.Mydfs.readdir`.
+'''
+
+import mydfs.scheduler
+import mydfs.throttle
+import os
+import sqlite3
+import threading
+import collections
+import concurrent.futures
+import hashlib
+import logging
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 2**22
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hashes (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (device, inode, mtime, size)
+)
+'''
+
+
+class ContentIndex:
+    '''
+    Persistent map of file version to content hash, filled lazily by a worker pool.
+
+    file version = (device, inode, modification time, size)
+    '''
+
+    def __init__(self, path, jobs=2, rate=None, cacheSize=2**16):
+        '''
+        @param path      str; path of sqlite database
+        @param jobs      int; number of parallel hash computations
+        @param rate      None or float; maximum bytes per second read
+        @param cacheSize int; number of hashes to keep in memory
+        '''
+        self.Path = path
+        self.Jobs = jobs
+        self.CacheSize = cacheSize
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Limiter = mydfs.throttle.RateLimiter(rate)
+        self._Lock = threading.Lock()
+        self._Cache = collections.OrderedDict()  # {file version: digest}, least recently used first
+        self._Pending = set()  # {file version}
+
+        os.makedirs(ospath.dirname(ospath.abspath(path)), exist_ok=True)
+        self._Connection = sqlite3.connect(path, check_same_thread=False)
+        self._Connection.execute(_SCHEMA)
+        self._Connection.commit()
+
+        self._Executor = None
+        self._Mydfs = None
+
+    def start(self, mydfs_):
+        self._Mydfs = mydfs_
+        self._Executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.Jobs, thread_name_prefix='mydfs-hash',
+                                                               initializer=mydfs.scheduler.set_priority,
+                                                               initargs=(mydfs.scheduler.BACKGROUND, ))
+
+    def stop(self):
+        if self._Executor is not None:
+            self._Executor.shutdown(wait=False, cancel_futures=True)
+            self._Executor = None
+
+        with self._Lock:
+            self._Connection.close()
+
+    def get(self, path, stat_):
+        '''
+        Looks up hash and schedules computation if unknown.
+
+        @param path  str; real path of file
+        @param stat_ `os.stat_result`
+        @return None or bytes; digest
+        '''
+        version = (stat_.st_dev, stat_.st_ino, stat_.st_mtime_ns, stat_.st_size)
+
+        with self._Lock:
+            r = self._Cache.get(version, None)
+            if r is not None:
+                self._Cache.move_to_end(version)
+                self.Stats['cacheHits'] += 1
+                return r
+
+            row = self._Connection.execute(
+                'SELECT digest FROM hashes WHERE device = ? AND inode = ? AND mtime = ? AND size = ?',
+                version).fetchone()
+            if row is not None:
+                r, = row
+                self._remember(version, r)
+                self.Stats['hits'] += 1
+                return r
+
+            self.Stats['misses'] += 1
+            if version in self._Pending or self._Executor is None:
+                return None
+
+            self._Pending.add(version)
+
+        self._Executor.submit(self._hash, path, version)
+        return None
+
+    def _hash(self, path, version):
+        '''
+        - reads file and computes hash
+        - if version unchanged
+          - stores hash
+        '''
+        try:
+            h = hashlib.blake2b(digest_size=32)
+            root = next(root for _, root in self._Mydfs._Roots if path.startswith(root + '/'))
+
+            fileHandle = os.open(path, os.O_RDONLY)
+            try:
+                offset = 0
+                while True:
+                    self._Limiter.acquire(BLOCK_SIZE)
+                    with self._Mydfs._slot(root):
+                        data = os.pread(fileHandle, BLOCK_SIZE, offset)
+                        if len(data) != 0:
+                            os.posix_fadvise(fileHandle, offset, len(data), os.POSIX_FADV_DONTNEED)
+
+                    if len(data) == 0:
+                        break
+
+                    h.update(data)
+                    offset += len(data)
+
+                stat_ = os.fstat(fileHandle)
+
+            finally:
+                os.close(fileHandle)
+
+            if (stat_.st_dev, stat_.st_ino, stat_.st_mtime_ns, stat_.st_size) != version:  # modified
+                self.Stats['changed'] += 1
+                return
+
+            digest = h.digest()
+            with self._Lock:
+                self._Connection.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)', version + (digest, ))
+                self._Connection.commit()
+                self._remember(version, digest)
+
+            self.Stats['hashed'] += 1
+            self.Stats['hashedBytes'] += offset
+
+        except OSError as e:
+            self.Stats['errors'] += 1
+            log.warning('hashing %s failed: %s', repr(path), e)
+
+        finally:
+            with self._Lock:
+                self._Pending.discard(version)
+
+    def _remember(self, version, digest):
+        self._Cache[version] = digest
+        if self.CacheSize < len(self._Cache):
+            self._Cache.popitem(last=False)
@@ -0,0 +1,367 @@
+'''
+Runtime control through the virtual file `/.mydfs/control`, see `mydfs.Mydfs.write`.
+
+Each line written is a command:
+
+    set {setting} {value}   changes setting, see `SETTINGS`; `none` for None
+    drop {cache}            invalidates all entries of cache: listing, shared or all
+    resync                  starts resync of dirty replicas now, see `mydfs.dirty`
+    replicate               starts pending replication now, see `mydfs.replication`
+    scrub                   starts scrub of all files in the background, see `mydfs.scrub`
+    placement {path}        loads placement policy, see `mydfs.placement`; `none` to remove
+    snapshot [{path}]       writes stats as JSON, by default to the state directory of the first root
+
+e.g. `echo 'set listingCache.ttl 60' > /.mydfs/control`.
+Failing commands, including values out of range, fail the write with `EINVAL`.
+Reading the file shows current settings and results of the last commands.
+
+Commands are applied one at a time by assigning attributes or through the locks of the affected subsystem, so
+in-flight operations continue with either the old or the new value.
+Changes aren't persisted and are lost on unmount.
+'''
+
+import mydfs
+import mydfs.placement
+import mydfs.scheduler
+import os
+import threading
+import collections
+import logging
+import math
+import time
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+
+def _optional(parse):
+
+    def _parse(string):
+        return None if string == 'none' else parse(string)
+
+    return _parse
+
+
+def _checked(parse, check, description):
+    '''
+    @param parse       function(str) -> number
+    @param check       function(number) -> bool
+    @param description str; valid values
+    @return function(str) -> number; raises `ValueError` if not finite or not valid, before anything is changed
+    '''
+
+    def _parse(string):
+        r = parse(string)
+        if not (math.isfinite(r) and check(r)):
+            raise ValueError('{} is not {}'.format(repr(string), description))
+
+        return r
+
+    return _parse
+
+
+def _positive(parse):
+    return _checked(parse, lambda value: 0 < value, 'positive')
+
+
+def _non_negative(parse):
+    return _checked(parse, lambda value: 0 <= value, 'non-negative')
+
+
+def _attribute(owner, name, parse):
+    '''
+    @param owner None or str; name of attribute of `mydfs.Mydfs` with subsystem, None for `mydfs.Mydfs` itself
+    @param name  str; name of attribute
+    @param parse function(str) -> any
+    @return (None or str, function(object) -> any, function(object, any), function(str) -> any)
+    '''
+    return (owner, lambda object_: getattr(object_, name), lambda object_, value: setattr(object_, name, value), parse)
+
+
+def _rate(owner):
+    return (owner, lambda object_: object_._Limiter.Rate, lambda object_, value: object_._Limiter.set_rate(value),
+            _optional(_positive(float)))
+
+
+def _concurrency(name, parse):
+    return ('Scheduler', lambda scheduler: getattr(scheduler, name),
+            lambda scheduler, value: scheduler.configure(**{name: value}), parse)
+
+
+SETTINGS = {
+    'mapThreshold': _attribute(None, 'MapThreshold', _optional(_positive(int))),  # bytes
+    'stripeThreshold': _attribute(None, 'StripeThreshold', _optional(_positive(int))),  # bytes
+    'logSampling': _attribute(None, 'LogSampling', _optional(_checked(float, lambda value: 0 <= value <= 1,
+                                                                      'within [0, 1]'))),
+    'direct.minSize': _attribute('Direct', 'MinSize', _optional(_positive(int))),  # bytes
+    'listingCache.maxEntries': _attribute('ListingCache', 'MaxEntries', _positive(int)),
+    'listingCache.ttl': _attribute('ListingCache', 'Ttl', _positive(float)),  # seconds
+    'sharedCache.ttl': ('SharedCache', lambda cache: cache.Ttl, lambda cache, value: cache.set_ttl(value),
+                        _positive(float)),
+    'prefetch.maxPending': _attribute('Prefetcher', 'MaxPending', _positive(int)),
+    'prefetch.maxAge': _attribute('Prefetcher', 'MaxAge', _positive(float)),  # seconds
+    'prefetch.maxPerDirectory': _attribute('Prefetcher', 'MaxPerDirectory', _positive(int)),
+    'scheduler.concurrency': _concurrency('Concurrency', _optional(_positive(int))),
+    'scheduler.rotationalConcurrency': _concurrency('RotationalConcurrency', _positive(int)),
+    'scheduler.nonRotationalConcurrency': _concurrency('NonRotationalConcurrency', _positive(int)),
+    'tiering.promoteHeat': _attribute('Tiering', 'PromoteHeat', _positive(float)),
+    'tiering.evictHeat': _attribute('Tiering', 'EvictHeat', _non_negative(float)),
+    'tiering.halfLife': _attribute('Tiering', 'HalfLife', _positive(float)),  # seconds
+    'tiering.interval': _attribute('Tiering', 'Interval', _positive(float)),  # seconds
+    'tiering.maxMoves': _attribute('Tiering', 'MaxMoves', _non_negative(int)),  # 0 pauses moves
+    'tiering.reserve': _attribute('Tiering', 'Reserve', _checked(float, lambda value: 0 <= value < 1,
+                                                                 'within [0, 1)')),  # fraction
+    'tiering.rate': _rate('Tiering'),  # bytes per second
+    'dirty.interval': _attribute('Dirty', 'Interval', _positive(float)),  # seconds
+    'dirty.rate': _rate('Dirty'),  # bytes per second
+    'scrub.maxAge': _attribute('Scrubber', 'MaxAge', _optional(_positive(float))),  # seconds
+    'scrub.rate': _rate('Scrubber'),  # bytes per second
+    'replication.interval': _attribute('Replicator', 'Interval', _positive(float)),  # seconds
+    'replication.rate': _rate('Replicator'),  # bytes per second
+}  # {name: (owner, getter, setter, parse)}, see `_attribute`
+
+COMMANDS = {'set', 'drop', 'resync', 'replicate', 'scrub', 'placement', 'snapshot'}
+CACHES = ('listing', 'shared', 'all')
+
+
+class Controller:
+    '''
+    Parses and applies commands written to the control file.
+    '''
+
+    def __init__(self, snapshotDirectory=None, nResults=32):
+        '''
+        @param snapshotDirectory None or str; default directory of stats snapshots, default in state directory of first
+                                 root
+        @param nResults          int; number of results of commands shown when reading
+        '''
+        self.SnapshotDirectory = snapshotDirectory
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Lock = threading.Lock()  # one command at a time
+        self._Buffers = {}  # {file handle: bytearray}, incomplete lines
+        self._Results = collections.deque(maxlen=nResults)  # [str]
+        self._ScrubThread = None
+
+        self._Mydfs = None
+
+    def start(self, mydfs_):
+        self._Mydfs = mydfs_
+
+    def stop(self):
+        pass
+
+    def render(self):
+        '''
+        @return bytes; settings and results of last commands
+        '''
+        lines = []
+        for name, (owner, get, _, _) in SETTINGS.items():
+            object_ = self._get_owner(owner)
+            if object_ is not None:
+                lines.append('{} = {}'.format(name, _format(get(object_))))
+
+        with self._Lock:
+            results = list(self._Results)
+
+        if len(results) != 0:
+            lines.append('')
+            lines.extend('# {}'.format(result) for result in results)
+
+        r = ('\n'.join(lines) + '\n').encode()
+        return r
+
+    def open(self, fileHandle):
+        self._Buffers[fileHandle] = bytearray()
+
+    def write(self, fileHandle, data):
+        '''
+        Executes complete lines, all of them even if some fail.
+
+        @param fileHandle int
+        @param data       bytes
+        @return int; number of bytes written
+        '''
+        buffer = self._Buffers[fileHandle]
+        buffer.extend(data)
+
+        error = None
+        while True:
+            index = buffer.find(b'\n')
+            if index == -1:
+                break
+
+            line = bytes(buffer[:index])
+            del buffer[:(index + 1)]
+            try:
+                self.execute(line.decode())
+
+            except ValueError as e:
+                error = error or e
+
+        if error is not None:
+            raise error
+
+        return len(data)
+
+    def release(self, fileHandle):
+        '''
+        Executes incomplete line, if any.
+
+        @param fileHandle int
+        @return None
+        '''
+        buffer = self._Buffers.pop(fileHandle, None)
+        if buffer is None or len(buffer.strip()) == 0:
+            return
+
+        try:
+            self.execute(buffer.decode())
+
+        except ValueError:
+            pass  # logged and shown in results
+
+    def execute(self, line):
+        '''
+        @param line str; command, see module documentation
+        @return str; result
+        '''
+        words = line.split()
+        if len(words) == 0 or words[0].startswith('#'):
+            return ''
+
+        command, arguments = words[0], words[1:]
+        function = getattr(self, '_' + command, None) if command in COMMANDS else None
+
+        with self._Lock:
+            try:
+                if function is None:
+                    raise ValueError('unknown command {}'.format(repr(command)))
+
+                r = function(*arguments)
+
+            except (ValueError, TypeError, OSError) as e:
+                result = 'failed: {}: {}'.format(line.strip(), e)
+                self._Results.append(result)
+                self.Stats['failed'] += 1
+                log.warning('control: %s', result)
+                raise ValueError(result) from e
+
+            self._Results.append('{}: {}'.format(line.strip(), r))
+            self.Stats['commands'] += 1
+
+        log.info('control: %s: %s', line.strip(), r)
+        return r
+
+    def _set(self, name, value):
+        setting = SETTINGS.get(name, None)
+        if setting is None:
+            raise ValueError('unknown setting {}'.format(repr(name)))
+
+        owner, get, set_, parse = setting
+        object_ = self._get_owner(owner)
+        if object_ is None:
+            raise ValueError('{} not enabled'.format(owner))
+
+        value = parse(value)
+        old = get(object_)
+        set_(object_, value)
+        return '{} -> {}'.format(_format(old), _format(value))
+
+    def _drop(self, name):
+        if name not in CACHES:
+            raise ValueError('unknown cache {}, expected one of {}'.format(repr(name), ', '.join(CACHES)))
+
+        mydfs_ = self._Mydfs
+        dropped = []
+        if name in ('listing', 'all') and mydfs_.ListingCache is not None:
+            mydfs_.ListingCache.flush()
+            dropped.append('listing')
+
+        if name in ('shared', 'all') and mydfs_.SharedCache is not None:
+            mydfs_.SharedCache.flush()
+            dropped.append('shared')
+
+        if len(dropped) == 0:
+            raise ValueError('no cache enabled')
+
+        return 'dropped {}'.format(', '.join(dropped))
+
+    def _resync(self):
+        dirty = self._require('Dirty')
+        dirty.trigger()
+        return '{} dirty replicas'.format(len(dirty))
+
+    def _replicate(self):
+        replicator = self._require('Replicator')
+        replicator.trigger()
+        return '{} jobs'.format(replicator.Stats['pending'])
+
+    def _scrub(self):
+        scrubber = self._require('Scrubber')
+        if self._ScrubThread is not None and self._ScrubThread.is_alive():
+            raise ValueError('scrub running')
+
+        self._ScrubThread = threading.Thread(target=self._run_scrub, args=(scrubber, ), name='mydfs-control-scrub',
+                                             daemon=True)
+        self._ScrubThread.start()
+        return 'started'
+
+    def _run_scrub(self, scrubber):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        try:
+            stats = scrubber.run(self._Mydfs)
+
+        except Exception:
+            log.exception('scrub failed')
+            return
+
+        log.info('control: scrub done: %s', dict(stats))
+
+    def _placement(self, path):
+        mydfs_ = self._Mydfs
+        if path == 'none':
+            mydfs_.Placement = None
+            return 'removed'
+
+        placement = mydfs.placement.load(path)
+        placement.check(character for character, _ in mydfs_._Roots)
+        mydfs_.Placement = placement
+        return '{} rules'.format(len(placement.Rules))
+
+    def _snapshot(self, path=None):
+        mydfs_ = self._Mydfs
+        if path is None:
+            dirPath = self.SnapshotDirectory
+            if dirPath is None:
+                _, root = mydfs_._Roots[0]
+                dirPath = ospath.join(root, mydfs.STATE_NAME)
+
+            os.makedirs(dirPath, exist_ok=True)
+            path = ospath.join(dirPath, 'stats.{}.json'.format(time.strftime('%Y%m%dT%H%M%S')))
+
+        content = mydfs_.Statistics.to_json(mydfs_._get_stats_sources())
+
+        tempPath = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tempPath, 'wb') as file:
+            file.write(content)
+
+        os.replace(tempPath, path)
+        return 'written to {}'.format(path)
+
+    def _require(self, owner):
+        r = self._get_owner(owner)
+        if r is None:
+            raise ValueError('{} not enabled'.format(owner))
+
+        return r
+
+    def _get_owner(self, owner):
+        return self._Mydfs if owner is None else getattr(self._Mydfs, owner)
+
+
+def _format(value):
+    return 'none' if value is None else str(value)
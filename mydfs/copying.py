@@ -0,0 +1,146 @@
+'''
+Copying between replicas in different roots.
+'''
+
+import os
+import errno
+import shutil
+
+BLOCK_SIZE = 2**22
+
+# errors of `os.copy_file_range` which require a fallback
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL}
+
+
+def copy_file(sourcePath, targetPath, limiter=None, blockSize=BLOCK_SIZE, sparse=False, slot=None):
+    '''
+    Copies content and metadata.
+
+    - opens source and target
+    - if sparse
+      - sets size of target
+    - for all blocks, of data segments if sparse
+      - waits for limiter
+      - copies block, holding slot if given
+    - copies metadata
+
+    @param sourcePath str
+    @param targetPath str
+    @param limiter    None or `mydfs.throttle.RateLimiter`; limits bytes per second
+    @param blockSize  int
+    @param sparse     bool; skip holes, see `get_data_segments`
+    @param slot       None or function() -> context manager; held per block, see `mydfs.scheduler`
+    @return int; number of bytes copied
+    '''
+    r = 0
+
+    sourceFd = os.open(sourcePath, os.O_RDONLY)
+    try:
+        size = os.fstat(sourceFd).st_size
+        targetFd = os.open(targetPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            if sparse:
+                os.ftruncate(targetFd, size)
+                segments = get_data_segments(sourceFd, size)
+
+            else:
+                segments = [(0, size)]
+
+            for offset, length in segments:
+                end = offset + length
+                while offset < end:
+                    n = min(blockSize, end - offset)
+                    if limiter is not None:
+                        limiter.acquire(n)
+
+                    if slot is None:
+                        n = copy_range(sourceFd, targetFd, offset, n)
+
+                    else:
+                        with slot():
+                            n = copy_range(sourceFd, targetFd, offset, n)
+
+                    if n == 0:  # source shrunk
+                        break
+
+                    offset += n
+                    r += n
+
+        finally:
+            os.close(targetFd)
+
+    finally:
+        os.close(sourceFd)
+
+    shutil.copystat(sourcePath, targetPath, follow_symlinks=False)
+    return r
+
+
+def get_data_segments(fileHandle, size):
+    '''
+    Finds data between holes using `os.SEEK_DATA` and `os.SEEK_HOLE`.
+
+    @param fileHandle int
+    @param size       int
+    @return iter((int, int)); offset and length of data segments, one segment if seeking isn't supported
+    '''
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fileHandle, offset, os.SEEK_DATA)
+
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # no more data
+                return
+            if e.errno != errno.EINVAL:
+                raise
+
+            yield (offset, size - offset)
+            return
+
+        end = min(size, os.lseek(fileHandle, start, os.SEEK_HOLE))
+        if start < end:
+            yield (start, end - start)
+
+        offset = end
+
+
+def copy_range(sourceFd, targetFd, offset, length):
+    '''
+    Copies a range at the same offset using `os.copy_file_range` or read/write as fallback.
+
+    @param sourceFd int
+    @param targetFd int
+    @param offset   int
+    @param length   int
+    @return int; number of bytes copied, less than `length` only at end of source
+    '''
+    r = 0
+
+    while r < length:
+        try:
+            n = os.copy_file_range(sourceFd, targetFd, length - r, offset + r, offset + r)
+
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+
+            n = _copy_range(sourceFd, targetFd, offset + r, length - r)
+
+        if n == 0:
+            break
+
+        r += n
+
+    return r
+
+
+def _copy_range(sourceFd, targetFd, offset, length):
+    data = os.pread(sourceFd, min(length, BLOCK_SIZE), offset)
+    view = memoryview(data)
+
+    r = 0
+    while r < len(view):
+        r += os.pwrite(targetFd, view[r:], offset + r)
+
+    return r
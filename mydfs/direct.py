@@ -0,0 +1,171 @@
+'''
+Direct I/O: replicas opened with `os.O_DIRECT` bypass the page cache of the roots, see `mydfs.Mydfs._open_paths`.
+
+Direct I/O requires offsets, lengths and buffers aligned to the logical block size of the device.
+Reads and writes therefore go through reusable aligned buffers, one per thread, and unaligned heads and tails are read
+and written as whole blocks.
+'''
+
+import os
+import fcntl
+import mmap
+import errno
+import threading
+
+ALIGNMENT = 4096  # multiple of the logical block size of common devices
+
+_Local = threading.local()
+
+
+class DirectPolicy:
+    '''
+    Decides which files are opened with `os.O_DIRECT`.
+    '''
+
+    def __init__(self, prefixes=(), minSize=None):
+        '''
+        @param prefixes iter(str); paths without mask of directories or files
+        @param minSize  None or int; minimum size of existing files
+        '''
+        self.Prefixes = [prefix.rstrip('/') for prefix in prefixes]
+        self.MinSize = minSize
+
+    def matches(self, realPath, path):
+        '''
+        @param realPath str; path without mask
+        @param path     str; real path of replica
+        @return bool
+        '''
+        for prefix in self.Prefixes:
+            if realPath == prefix or realPath.startswith(prefix + '/'):
+                return True
+
+        if self.MinSize is None:
+            return False
+
+        try:
+            return self.MinSize <= os.stat(path).st_size
+
+        except FileNotFoundError:  # created
+            return False
+
+
+def enable(fileHandle):
+    '''
+    @param fileHandle int
+    @return bool; whether direct I/O is supported
+    '''
+    try:
+        fcntl.fcntl(fileHandle, fcntl.F_SETFL, fcntl.fcntl(fileHandle, fcntl.F_GETFL) | os.O_DIRECT)
+
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+
+        return False
+
+    return True
+
+
+def disable(fileHandle):
+    fcntl.fcntl(fileHandle, fcntl.F_SETFL, fcntl.fcntl(fileHandle, fcntl.F_GETFL) & ~os.O_DIRECT)
+
+
+def read(fileHandle, size, offset):
+    '''
+    - reads aligned range into buffer
+    - copies requested range
+
+    @param fileHandle int; with `os.O_DIRECT`
+    @param size       int
+    @param offset     int
+    @return bytes
+    '''
+    if size == 0:
+        return b''
+
+    start = offset - offset % ALIGNMENT
+    end = _align(offset + size)
+    buffer = _get_buffer(end - start)
+
+    with memoryview(buffer) as view:
+        with view[:(end - start)] as v:
+            n = os.preadv(fileHandle, [v], start)
+
+    r = buffer[(offset - start):min(n, offset - start + size)]
+    return r
+
+
+def write(fileHandle, data, offset):
+    '''
+    - if head is unaligned
+      - reads first block into buffer
+    - if tail is unaligned
+      - reads last block into buffer
+    - copies data into buffer
+    - writes aligned range
+    - if file grew beyond end of data
+      - truncates to end of data
+
+    Concurrent writes to the same block through different file handles may get lost.
+
+    @param fileHandle int; with `os.O_DIRECT`
+    @param data       bytes
+    @param offset     int
+    @return int; number of bytes written
+    '''
+    if len(data) == 0:
+        return 0
+
+    end = offset + len(data)
+    start = offset - offset % ALIGNMENT
+    alignedEnd = _align(end)
+    buffer = _get_buffer(alignedEnd - start)
+    size = os.fstat(fileHandle).st_size
+
+    with memoryview(buffer) as view:
+        if start < offset:
+            _read_block(fileHandle, view, 0, start)
+
+        if end < alignedEnd and not (start < offset and alignedEnd - ALIGNMENT == start):  # not already read
+            _read_block(fileHandle, view, alignedEnd - ALIGNMENT - start, alignedEnd - ALIGNMENT)
+
+        view[(offset - start):(end - start)] = data
+
+        with view[:(alignedEnd - start)] as v:
+            n = os.pwritev(fileHandle, [v], start)
+
+    if max(size, end) < alignedEnd:
+        os.ftruncate(fileHandle, max(size, end))
+
+    r = min(max(0, n - (offset - start)), len(data))
+    return r
+
+
+def _read_block(fileHandle, view, index, offset):
+    '''
+    Reads block into view, zero-filled beyond end of file.
+    '''
+    with view[index:(index + ALIGNMENT)] as v:
+        n = os.preadv(fileHandle, [v], offset)
+        if n < ALIGNMENT:
+            v[n:] = bytes(ALIGNMENT - n)
+
+
+def _get_buffer(size):
+    '''
+    @param size int; multiple of `ALIGNMENT`
+    @return mmap.mmap; page aligned, of this thread
+    '''
+    buffer = getattr(_Local, 'Buffer', None)
+    if buffer is None or len(buffer) < size:
+        if buffer is not None:
+            buffer.close()
+
+        buffer = _Local.Buffer = mmap.mmap(-1, size)
+
+    return buffer
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,358 @@
+'''
+Dirty-range tracking: remembers which blocks of a replica missed writes and copies only those from a clean replica.
+'''
+
+import mydfs.copying
+import mydfs.scheduler
+import mydfs.throttle
+import os
+import json
+import threading
+import collections
+import logging
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+ALL = -1  # bitmap of replicas which missed an unknown range
+
+
+class DirtyJournal:
+    '''
+    Keeps a bitmap of dirty blocks per replica in memory and in an append-only journal file.
+
+    journal line = JSON list [character, path without mask, bitmap as hex string, `ALL` or None for clean]
+    '''
+
+    def __init__(self, path, blockSize=2**20, interval=5., rate=None):
+        '''
+        @param path      str; path of journal file
+        @param blockSize int; bytes per bit of bitmaps
+        @param interval  float; seconds between resync runs
+        @param rate      None or float; maximum bytes per second copied
+        '''
+        self.Path = path
+        self.BlockSize = blockSize
+        self.Interval = interval
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Limiter = mydfs.throttle.RateLimiter(rate)
+        self._Lock = threading.Lock()
+        self._Bitmaps = {}  # {(character, path): int}
+
+        self._load()
+        self._File = open(self.Path, 'a')
+
+        self._Mydfs = None
+        self._Thread = None
+        self._Stop = threading.Event()
+        self._Wake = threading.Event()
+
+    def __len__(self):
+        return len(self._Bitmaps)
+
+    def mark(self, character, path, offset, length):
+        '''
+        Marks range as dirty.
+
+        @param character str; character of root
+        @param path      str; path without mask
+        @param offset    int
+        @param length    int
+        @return None
+        '''
+        first = offset // self.BlockSize
+        last = max(first, (offset + length - 1) // self.BlockSize)
+        self._update(character, path, ((1 << (last - first + 1)) - 1) << first)
+
+    def mark_all(self, character, path):
+        self._update(character, path, ALL)
+
+    def is_dirty(self, character, path):
+        return (character, path) in self._Bitmaps
+
+    def move(self, old, new, characters):
+        '''
+        Moves bitmaps of renamed replicas and of replicas below renamed directories, replacing those of overwritten
+        replicas.
+
+        @param old        str; path without mask
+        @param new        str; path without mask
+        @param characters iter(str); characters of roots in which the replica was renamed
+        @return None
+        '''
+        if old == new:
+            return
+
+        characters = set(characters)
+        with self._Lock:
+            for character, path in list(self._Bitmaps):
+                if character in characters and (path == new or path.startswith(new + '/')):
+                    self._Bitmaps.pop((character, path))
+                    self._append(character, path, None)
+
+            for (character, path), bitmap in list(self._Bitmaps.items()):
+                if character in characters and (path == old or path.startswith(old + '/')):
+                    newPath = new + path[len(old):]
+                    self._Bitmaps.pop((character, path))
+                    self._Bitmaps[(character, newPath)] = bitmap
+                    self._append(character, path, None)
+                    self._append(character, newPath, bitmap)
+                    self.Stats['moved'] += 1
+
+    def start(self, mydfs_):
+        self._Mydfs = mydfs_
+
+        self._Stop.clear()
+        self._Thread = threading.Thread(target=self._run, name='mydfs-resync', daemon=True)
+        self._Thread.start()
+
+    def trigger(self):
+        '''
+        Starts resync run now instead of after interval.
+        '''
+        self._Wake.set()
+
+    def stop(self):
+        if self._Thread is not None:
+            self._Stop.set()
+            self._Wake.set()
+            self._Thread.join()
+            self._Thread = None
+
+        self._File.close()
+
+    def run_once(self):
+        '''
+        - for all dirty replicas of files without writers
+          - tries to resync, see `._resync`
+        '''
+        with self._Lock:
+            items = list(self._Bitmaps.items())
+
+        for (character, path), bitmap in items:
+            if self._Stop.is_set():
+                break
+            if self._Mydfs._Writers[path] != 0:
+                continue
+
+            try:
+                self._resync(character, path, bitmap)
+
+            except OSError as e:
+                self.Stats['errors'] += 1
+                log.warning('resync of %s in %s failed: %s', repr(path), repr(character), e)
+
+    def _run(self):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        while True:
+            self._Wake.wait(self.Interval)
+            self._Wake.clear()
+            if self._Stop.is_set():
+                break
+
+            try:
+                self.run_once()
+
+            except Exception:
+                log.exception('resync run failed')
+
+    def _resync(self, character, path, bitmap):
+        '''
+        - if replica doesn't exist anymore
+          - forgets it, see `._forget`
+        - for all dirty ranges
+          - finds replica which is clean in range
+          - copies range from replica
+        - if shrinking, closes memory mappings, see `mydfs.mapping`
+        - truncates to size of source
+        - copies modification time of source
+        - acquires lock of Mydfs
+        - if no writer, sources unchanged and no new marks
+          - clears bitmap
+        '''
+        roots = dict(self._Mydfs._Roots)
+        targetPath = roots[character] + path
+
+        if not ospath.isfile(targetPath):
+            self._forget(character, path, bitmap)
+            return
+
+        with self._Lock:
+            bitmaps = {c: self._Bitmaps.get((c, path), 0) for c in roots}
+
+        sourceCharacters = [c for c, root in roots.items() if c != character and ospath.isfile(root + path)]
+        if len(sourceCharacters) == 0:
+            self.Stats['resyncsSkipped'] += 1
+            return
+
+        # source for size and modification time: least dirty
+        mainCharacter = min(sourceCharacters, key=lambda c: (bitmaps[c] == ALL, bin(bitmaps[c]).count('1')))
+        if bitmaps[mainCharacter] == ALL:
+            self.Stats['resyncsSkipped'] += 1
+            return
+
+        mainPath = roots[mainCharacter] + path
+        stat_ = os.stat(mainPath)
+        sourceStats = {}
+
+        n = 0
+        try:
+            targetFd = os.open(targetPath, os.O_WRONLY)
+
+        except FileNotFoundError:
+            self._forget(character, path, bitmap)
+            return
+
+        try:
+            if bitmap == ALL:
+                ranges = [(mainCharacter, 0, stat_.st_size)]
+
+            else:
+                ranges = []
+                for offset, length in self._get_ranges(bitmap):
+                    first = offset // self.BlockSize
+                    rangeBitmap = ((1 << (length // self.BlockSize)) - 1) << first
+                    for c in sourceCharacters:
+                        if bitmaps[c] != ALL and bitmaps[c] & rangeBitmap == 0:
+                            ranges.append((c, offset, length))
+                            break
+
+                    else:
+                        self.Stats['resyncsSkipped'] += 1
+                        log.warning('no clean replica for %s in range %d+%d', repr(path), offset, length)
+                        return
+
+            for c, offset, length in ranges:
+                sourcePath = roots[c] + path
+                sourceFd = os.open(sourcePath, os.O_RDONLY)
+                try:
+                    sourceStats.setdefault(c, os.fstat(sourceFd))
+                    end = offset + max(0, min(length, stat_.st_size - offset))
+                    while offset < end:  # in blocks to share roots with foreground operations
+                        length = min(mydfs.copying.BLOCK_SIZE, end - offset)
+                        self._Limiter.acquire(length)
+                        with self._Mydfs._slots([roots[c], roots[character]]):
+                            length = mydfs.copying.copy_range(sourceFd, targetFd, offset, length)
+
+                        if length == 0:  # source shrunk
+                            break
+
+                        offset += length
+                        n += length
+
+                finally:
+                    os.close(sourceFd)
+
+            if stat_.st_size < os.fstat(targetFd).st_size and len(self._Mydfs._Mappings) != 0:
+                self._Mydfs._close_mappings(path)  # reading beyond end of file raises SIGBUS, see `mydfs.mapping`
+
+            os.ftruncate(targetFd, stat_.st_size)
+
+        finally:
+            os.close(targetFd)
+
+        os.utime(targetPath, ns=(stat_.st_atime_ns, stat_.st_mtime_ns))
+        sourceStats[mainCharacter] = stat_
+
+        with self._Mydfs._FileHandleLock:
+            changed = False
+            for c, sourceStat in sourceStats.items():
+                nStat = os.stat(roots[c] + path)
+                if (nStat.st_mtime_ns, nStat.st_size) != (sourceStat.st_mtime_ns, sourceStat.st_size):
+                    changed = True
+
+            with self._Lock:
+                if self._Mydfs._Writers[path] != 0 or changed or self._Bitmaps.get((character, path)) != bitmap:
+                    self.Stats['resyncsRetried'] += 1
+                    return
+
+                self._Bitmaps.pop((character, path))
+                self._append(character, path, None)
+
+        self._Mydfs.invalidate(path)
+        self.Stats['resyncs'] += 1
+        self.Stats['resyncedBytes'] += n
+
+    def _forget(self, character, path, bitmap):
+        '''
+        Clears bitmap of replica which was removed, e.g. by unlink or rename, unless marked meanwhile.
+        '''
+        with self._Lock:
+            if self._Bitmaps.get((character, path)) != bitmap:
+                return
+
+            self._Bitmaps.pop((character, path))
+            self._append(character, path, None)
+
+        self.Stats['forgotten'] += 1
+
+    def _get_ranges(self, bitmap):
+        '''
+        @param bitmap int
+        @return iter((int, int)); offset and length of runs of set bits
+        '''
+        index = 0
+        while bitmap != 0:
+            if bitmap & 1 == 0:
+                zeros = (bitmap & -bitmap).bit_length() - 1
+                bitmap >>= zeros
+                index += zeros
+                continue
+
+            ones = (~bitmap & (bitmap + 1)).bit_length() - 1
+            yield (index * self.BlockSize, ones * self.BlockSize)
+            bitmap >>= ones
+            index += ones
+
+    def _update(self, character, path, bitmap):
+        with self._Lock:
+            key = (character, path)
+            previous = self._Bitmaps.get(key, 0)
+            nBitmap = ALL if ALL in (previous, bitmap) else previous | bitmap
+            if nBitmap == previous:
+                return
+
+            self._Bitmaps[key] = nBitmap
+            self._append(character, path, nBitmap)
+
+        self.Stats['marks'] += 1
+
+    def _append(self, character, path, bitmap):
+        value = bitmap if bitmap in (None, ALL) else '{:x}'.format(bitmap)
+        self._File.write(json.dumps([character, path, value]) + '\n')
+        self._File.flush()
+        os.fsync(self._File.fileno())
+
+    def _load(self):
+        '''
+        - replays journal
+        - rewrites journal compacted
+        '''
+        if ospath.exists(self.Path):
+            with open(self.Path) as f:
+                for line in f:
+                    try:
+                        character, path, value = json.loads(line)
+
+                    except ValueError:  # partially written line
+                        continue
+
+                    if value is None:
+                        self._Bitmaps.pop((character, path), None)
+
+                    else:
+                        self._Bitmaps[(character, path)] = value if value == ALL else int(value, 16)
+
+        os.makedirs(ospath.dirname(ospath.abspath(self.Path)), exist_ok=True)
+
+        tempPath = self.Path + '.tmp'
+        with open(tempPath, 'w') as f:
+            for (character, path), bitmap in self._Bitmaps.items():
+                value = bitmap if bitmap == ALL else '{:x}'.format(bitmap)
+                f.write(json.dumps([character, path, value]) + '\n')
+
+        os.replace(tempPath, self.Path)
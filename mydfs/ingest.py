@@ -0,0 +1,248 @@
+'''
+Copies a directory tree into the roots directly, bypassing the mount, with the placement of `mydfs.Mydfs.create` and
+`mydfs.Mydfs.mkdir`.
+'''
+
+import mydfs
+import mydfs.cli
+import mydfs.copying
+import mydfs.sharedcache
+import mydfs.throttle
+import os
+import stat
+import json
+import shutil
+import collections
+import concurrent.futures
+import argparse
+import logging
+import uuid
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+# path in mount, path of source, [(character, path)] of targets
+Entry = collections.namedtuple('Entry', ['Path', 'Source', 'Targets'])
+
+
+class Ingest:
+    '''
+    - plans targets of all files and directories
+    - creates directories per root in parallel, parents first
+    - copies files on a worker pool, each replica to a temporary file which replaces the target
+    - copies metadata of directories
+    - invalidates all paths, see `mydfs.Mydfs.invalidate`
+
+    Indexes keyed by file version, see `mydfs.contenthash` and `mydfs.scrub`, pick up the new files by themselves.
+    '''
+
+    def __init__(self, mydfs_, mask=None, jobs=4, rate=None, dryRun=False):
+        '''
+        @param mydfs_ `mydfs.Mydfs`
+        @param mask   None or str; characters of roots, '.' for absent, as in masked names
+        @param jobs   int; number of parallel copies
+        @param rate   None or float; maximum bytes per second written per root
+        @param dryRun bool; only report targets
+        '''
+        if mask is not None:
+            masked = mydfs_._parse_mask('/{}_'.format(mask))
+            if masked is None or len(mask) != len(mydfs_._Roots):
+                raise ValueError('invalid mask {}'.format(repr(mask)))
+
+        self.Mydfs = mydfs_
+        self.Mask = mask
+        self.Jobs = jobs
+        self.DryRun = dryRun
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Roots = dict(mydfs_._Roots)  # {character: real path}
+        self._Characters = {root: character for character, root in mydfs_._Roots}  # {real path: character}
+        self._Limiters = {root: mydfs.throttle.RateLimiter(rate) for _, root in mydfs_._Roots}
+
+    def run(self, sourcePath, targetPath):
+        '''
+        @param sourcePath str; path of file or directory
+        @param targetPath str; path in mount, for directories the contents of source are copied into it
+        @return collections.Counter; stats
+        '''
+        directories, files = self._plan(sourcePath, targetPath)
+
+        for entry in directories + files:
+            log.info('ingest %s to %s', repr(entry.Path), ''.join(character for character, _ in entry.Targets))
+
+        if self.DryRun:
+            return self.Stats
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.Jobs) as executor:
+            self._create_directories(executor, directories, files)
+
+            futures = [
+                executor.submit(self._copy, entry, character, path) for entry in files
+                for character, path in entry.Targets
+            ]
+            concurrent.futures.wait(futures)
+
+        for entry in reversed(directories):  # copying files changes modification times of directories
+            for _, path in entry.Targets:
+                try:
+                    shutil.copystat(entry.Source, path, follow_symlinks=False)
+
+                except OSError as e:
+                    self.Stats['errors'] += 1
+                    log.warning('copy of metadata to %s failed: %s', repr(path), e)
+
+        mydfs_ = self.Mydfs
+        for entry in directories + files:
+            mydfs_.invalidate(mydfs_._get_real_path(entry.Path))
+
+        return self.Stats
+
+    def _plan(self, sourcePath, targetPath):
+        '''
+        - for all files and directories in source
+          - resolves paths, see `mydfs.Mydfs._resolve`, with mask if given
+
+        All paths are resolved before anything is created, so new directory trees end up in a single root like they
+        would through the mount.
+
+        @return [Entry], [Entry]; directories, parents first, and files
+        '''
+        sources = []  # [(path in mount, path of source, is directory)]
+        if ospath.isdir(sourcePath) and not ospath.islink(sourcePath):
+            if targetPath != '/':
+                sources.append((targetPath, sourcePath, True))
+
+            for dirPath, dirNames, fileNames in os.walk(sourcePath):
+                dirNames.sort()
+                relativePath = ospath.relpath(dirPath, sourcePath)
+                for name in sorted(dirNames + fileNames):
+                    path = ospath.normpath(ospath.join(targetPath, relativePath, name))
+                    p = ospath.join(dirPath, name)
+                    sources.append((path, p, name in dirNames and not ospath.islink(p)))
+
+        else:
+            sources.append((targetPath, sourcePath, False))
+
+        directories = []
+        files = []
+        for path, source, isDirectory in sources:
+            if self.Mask is not None:
+                dirPath, name = ospath.split(path)
+                path = ospath.join(dirPath, '{}_{}'.format(self.Mask, name))
+
+            paths = self.Mydfs._resolve(path, orBestInexistent=True)
+            if self.Mydfs._is_striped(paths):
+                self.Stats['skipped'] += 1
+                log.warning('skip %s: target is striped', repr(path))
+                continue
+
+            entry = Entry(path, source, [(self._Characters[root], p) for root, p in paths])
+            (directories if isDirectory else files).append(entry)
+
+        return directories, files
+
+    def _create_directories(self, executor, directories, files):
+        '''
+        - collects directories and parent directories of all targets per root
+        - per root in parallel
+          - creates missing directories, parents first
+        '''
+        dirPaths = collections.defaultdict(set)  # {character: {path of directory}}
+        for entries, isDirectory in ((directories, True), (files, False)):
+            for entry in entries:
+                for character, path in entry.Targets:
+                    root = self._Roots[character]
+                    dirPath = path if isDirectory else ospath.dirname(path)
+                    while dirPath != root and dirPath not in dirPaths[character]:
+                        dirPaths[character].add(dirPath)
+                        dirPath = ospath.dirname(dirPath)
+
+        def _create(paths):
+            for path in sorted(paths):
+                try:
+                    os.mkdir(path)
+                    self.Stats['directories'] += 1
+
+                except FileExistsError:
+                    continue
+
+        for future in [executor.submit(_create, paths) for paths in dirPaths.values()]:
+            future.result()
+
+    def _copy(self, entry, character, targetPath):
+        try:
+            self._copy_replica(entry.Source, targetPath, self._Roots[character])
+
+        except OSError as e:
+            self.Stats['errors'] += 1
+            log.warning('ingest of %s to %s failed: %s', repr(entry.Path), character, e)
+
+        except Exception:
+            self.Stats['errors'] += 1
+            log.exception('ingest of %s to %s failed', repr(entry.Path), character)
+
+    def _copy_replica(self, sourcePath, targetPath, root):
+        '''
+        - copies source to temporary file in root, skipping holes
+        - replaces target by temporary file
+        '''
+        dirPath = ospath.join(root, mydfs.STATE_NAME, 'ingest')
+        os.makedirs(dirPath, exist_ok=True)
+        tempPath = ospath.join(dirPath, uuid.uuid4().hex)
+
+        try:
+            stat_ = os.lstat(sourcePath)
+            if stat.S_ISLNK(stat_.st_mode):
+                os.symlink(os.readlink(sourcePath), tempPath)
+                shutil.copystat(sourcePath, tempPath, follow_symlinks=False)
+                n = 0
+
+            elif stat.S_ISREG(stat_.st_mode):
+                n = mydfs.copying.copy_file(sourcePath, tempPath, limiter=self._Limiters[root], sparse=True)
+
+            else:
+                self.Stats['skipped'] += 1
+                log.info('skip %s: not a regular file', repr(sourcePath))
+                return
+
+            os.replace(tempPath, targetPath)
+
+        finally:
+            if ospath.lexists(tempPath):
+                os.unlink(tempPath)
+
+        self.Stats['copies'] += 1
+        self.Stats['copiedBytes'] += n
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs ingest', description=__doc__.strip())
+
+    parser.add_argument('--mask', default=None, help='Characters of roots to place files on, \'.\' for absent')
+    parser.add_argument('--jobs', type=int, default=4, help='Number of parallel copies')
+    parser.add_argument('--rate', type=float, default=None, help='Maximum MB/s written per root')
+    parser.add_argument('--shared-cache', metavar='name', default=None,
+                        help='Name of shared memory used by mounts, to invalidate ingested paths')
+    parser.add_argument('-n', '--dry-run', action='store_true', default=False, help='Only report targets')
+    parser.add_argument('source', help='Path of file or directory to copy')
+    parser.add_argument('target', help='Path in mount')
+    mydfs.cli.add_roots_argument(parser)
+
+    args = parser.parse_args(arguments)
+
+    sharedCache = None if args.shared_cache is None else mydfs.sharedcache.SharedCache(args.shared_cache)
+    mydfs_ = mydfs.Mydfs(mydfs.cli.parse_roots(args.roots), sharedCache=sharedCache)
+
+    try:
+        ingest = Ingest(mydfs_, mask=args.mask, jobs=args.jobs, rate=None if args.rate is None else args.rate * 2**20,
+                        dryRun=args.dry_run)
+        stats = ingest.run(args.source, ospath.join('/', args.target))
+
+    finally:
+        if sharedCache is not None:
+            sharedCache.stop()
+
+    print(json.dumps(dict(stats), sort_keys=True))
+    return 1 if stats['errors'] != 0 else 0
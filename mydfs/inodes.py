@@ -0,0 +1,151 @@
+'''
+Synthetic inode numbers: stable per file and persisted across restarts, see `mydfs.Mydfs.getattr`.
+
+Paths are taken without mask if the name denotes all replicas of the file, see `mydfs.Mydfs._get_inode_key`, so
+numbers don't change when replicas are added or removed.
+Names of diverged replicas are taken with mask and get different numbers, as they are different files.
+'''
+
+import os
+import sqlite3
+import threading
+import collections
+
+ospath = os.path
+
+ROOT_INODE = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inodes (
+    path TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL UNIQUE
+)
+'''
+
+
+class InodeMap:
+    '''
+    Persistent map of path to inode number.
+
+    New numbers are committed in batches, so numbers allocated shortly before a crash may be allocated again.
+    '''
+
+    def __init__(self, path, cacheSize=2**18, batchSize=1024):
+        '''
+        @param path      str; path of sqlite database
+        @param cacheSize int; number of inode numbers to keep in memory
+        @param batchSize int; number of new inode numbers per commit
+        '''
+        self.Path = path
+        self.CacheSize = cacheSize
+        self.BatchSize = batchSize
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Lock = threading.Lock()
+        self._Cache = collections.OrderedDict()  # {path: inode number}, least recently used first
+        self._Uncommitted = 0
+
+        os.makedirs(ospath.dirname(ospath.abspath(path)), exist_ok=True)
+        self._Connection = sqlite3.connect(path, check_same_thread=False)
+        self._Connection.execute(_SCHEMA)
+        self._Connection.commit()
+
+        inode, = self._Connection.execute('SELECT MAX(inode) FROM inodes').fetchone()
+        self._Next = ROOT_INODE + 1 if inode is None else inode + 1
+
+    def start(self, mydfs_):
+        pass
+
+    def stop(self):
+        with self._Lock:
+            self._Connection.commit()
+            self._Connection.close()
+
+    def get(self, path):
+        '''
+        @param path str; key, see `mydfs.Mydfs._get_inode_key`
+        @return int; inode number, allocated if necessary
+        '''
+        if path == '/':
+            return ROOT_INODE
+
+        with self._Lock:
+            r = self._Cache.get(path, None)
+            if r is not None:
+                self._Cache.move_to_end(path)
+                return r
+
+            row = self._Connection.execute('SELECT inode FROM inodes WHERE path = ?', (path, )).fetchone()
+            if row is None:
+                r = self._Next
+                self._Next += 1
+                self._Connection.execute('INSERT INTO inodes VALUES (?, ?)', (path, r))
+                self.Stats['allocated'] += 1
+                self._commit_later()
+
+            else:
+                r, = row
+
+            self._remember(path, r)
+
+        return r
+
+    def rename(self, old, new, isDirectory):
+        '''
+        Moves inode number of path and, if directory, of all paths below it.
+
+        @param old         str; key, see `mydfs.Mydfs._get_inode_key`
+        @param new         str; key, see `mydfs.Mydfs._get_inode_key`
+        @param isDirectory bool
+        '''
+        with self._Lock:
+            if isDirectory:
+                self._Connection.execute('DELETE FROM inodes WHERE path = ? OR substr(path, 1, ?) = ?',
+                                         (new, len(new) + 1, new + '/'))
+                self._Connection.execute(
+                    'UPDATE inodes SET path = ? || substr(path, ?) WHERE path = ? OR substr(path, 1, ?) = ?',
+                    (new, len(old) + 1, old, len(old) + 1, old + '/'))
+
+                self._forget(old)
+                self._forget(new)
+
+            else:
+                self._Connection.execute('DELETE FROM inodes WHERE path = ?', (new, ))
+                self._Connection.execute('UPDATE inodes SET path = ? WHERE path = ?', (new, old))
+
+                self._Cache.pop(old, None)
+                self._Cache.pop(new, None)
+
+            self._commit_later()
+
+    def remove(self, path):
+        '''
+        @param path str; key, see `mydfs.Mydfs._get_inode_key`
+        '''
+        with self._Lock:
+            self._Connection.execute('DELETE FROM inodes WHERE path = ?', (path, ))
+            self._commit_later()
+
+            self._Cache.pop(path, None)
+
+    def _commit_later(self):
+        self._Uncommitted += 1
+        if self.BatchSize <= self._Uncommitted:
+            self._Connection.commit()
+            self._Uncommitted = 0
+
+    def _remember(self, path, inode):
+        self._Cache[path] = inode
+        if self.CacheSize < len(self._Cache):
+            self._Cache.popitem(last=False)
+
+    def _forget(self, path):
+        '''
+        Removes path and all paths below it from cache.
+
+        Iterates over the whole cache.
+        '''
+        prefix = path + '/'
+        for p in [p for p in self._Cache if p == path or p.startswith(prefix)]:
+            del self._Cache[p]
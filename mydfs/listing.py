@@ -0,0 +1,170 @@
+'''
+Cache of merged directory scans, see `mydfs.Mydfs._scan`.
+
+Entries are invalidated by operations through the mount, see `mydfs.Mydfs._invalidate_listings`, and expire after a
+time to live, which bounds staleness after changes of roots outside the mount.
+'''
+
+import threading
+import collections
+import time
+
+
+class ListingCache:
+    '''
+    Scans by path of directory, least recently used first out.
+
+    Scans are filled by `.begin` and `.end` so that scans which overlap an invalidation of the same directory aren't
+    cached.
+    '''
+
+    def __init__(self, maxEntries=2**14, ttl=10.):
+        '''
+        @param maxEntries int; maximum number of directories
+        @param ttl        float; seconds an entry stays valid
+        '''
+        self.MaxEntries = maxEntries
+        self.Ttl = ttl
+
+        self._Stats = collections.Counter()  # {name: count}
+
+        self._Lock = threading.Lock()
+        self._Entries = collections.OrderedDict()  # {path without mask: (scan, time of fill)}
+        self._Filling = {}  # {path without mask: [number of fills, version]}
+
+    @property
+    def Stats(self):
+        '''
+        @return {str: int}; hits, misses, fills, invalidations and number of entries
+        '''
+        with self._Lock:
+            r = collections.Counter(self._Stats)
+            r['entries'] = len(self._Entries)
+
+        return r
+
+    def start(self, mydfs_):
+        pass
+
+    def stop(self):
+        pass
+
+    def get(self, path):
+        '''
+        @param path str; path without mask of directory
+        @return None or any; scan, see `mydfs.Mydfs._scan`
+        '''
+        with self._Lock:
+            entry = self._Entries.get(path, None)
+            if entry is None:
+                self._Stats['misses'] += 1
+                return None
+
+            scan, fillTime = entry
+            if fillTime + self.Ttl < time.monotonic():
+                del self._Entries[path]
+                self._Stats['expired'] += 1
+                return None
+
+            self._Entries.move_to_end(path)
+            self._Stats['hits'] += 1
+
+        return scan
+
+    def __contains__(self, path):
+        '''
+        @param path str; path without mask of directory
+        @return bool; whether entry exists, regardless of time to live, without affecting order or stats
+        '''
+        with self._Lock:
+            return path in self._Entries
+
+    def begin(self, path):
+        '''
+        Starts fill.
+
+        @param path str; path without mask of directory
+        @return tuple; token for `.end`
+        '''
+        with self._Lock:
+            filling = self._Filling.get(path, None)
+            if filling is None:
+                self._Filling[path] = filling = [0, 0]
+
+            filling[0] += 1
+            r = (path, filling[1], time.monotonic())
+
+        return r
+
+    def end(self, token, scan):
+        '''
+        Ends fill and caches scan unless the directory was invalidated since `.begin`.
+
+        @param token tuple; see `.begin`
+        @param scan  None or any; None if scan failed
+        @return None
+        '''
+        path, version, fillTime = token
+
+        with self._Lock:
+            filling = self._Filling[path]
+            filling[0] -= 1
+            if filling[0] == 0:
+                del self._Filling[path]
+
+            if scan is None:
+                return
+
+            if filling[1] != version:
+                self._Stats['discarded'] += 1
+                return
+
+            self._Entries[path] = (scan, fillTime)
+            self._Entries.move_to_end(path)
+            self._Stats['fills'] += 1
+
+            while self.MaxEntries < len(self._Entries):
+                self._Entries.popitem(last=False)
+                self._Stats['evictions'] += 1
+
+    def invalidate(self, path):
+        '''
+        @param path str; path without mask of directory
+        @return None
+        '''
+        with self._Lock:
+            if self._Entries.pop(path, None) is not None:
+                self._Stats['invalidations'] += 1
+
+            filling = self._Filling.get(path, None)
+            if filling is not None:
+                filling[1] += 1
+
+    def invalidate_tree(self, path):
+        '''
+        Invalidates directory and all directories below it, e.g. on rename.
+
+        @param path str; path without mask of directory
+        @return None
+        '''
+        prefix = path.rstrip('/') + '/'
+
+        with self._Lock:
+            for p in [p for p in self._Entries if p == path or p.startswith(prefix)]:
+                del self._Entries[p]
+                self._Stats['invalidations'] += 1
+
+            for p, filling in self._Filling.items():
+                if p == path or p.startswith(prefix):
+                    filling[1] += 1
+
+    def flush(self):
+        '''
+        Invalidates all entries.
+        '''
+        with self._Lock:
+            self._Entries.clear()
+            for filling in self._Filling.values():
+                filling[1] += 1
+
+            self._Stats['flushes'] += 1
@@ -0,0 +1,510 @@
+'''
+Backend on the inode-based, asynchronous API of pyfuse3, running on asyncio.
+
+Operations are translated to paths and passed to `mydfs.Mydfs`, so the merged namespace and masks are the same as
+with fusepy. Blocking calls run on bounded executors per root, or on a shared one if the path doesn't denote roots.
+'''
+
+import mydfs
+import mydfs.inodes
+import os
+import errno
+import collections
+import concurrent.futures
+import itertools as it
+import asyncio
+import logging
+
+try:
+    import pyfuse3
+    import pyfuse3_asyncio
+
+except ImportError:  # optional dependency
+    pyfuse3 = None
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+
+class Operations(pyfuse3.Operations if pyfuse3 is not None else object):
+    '''
+    Low-level operations for use with `pyfuse3.init`.
+
+    - inode numbers are taken from `mydfs.Mydfs.Inodes`, paths of inodes known to the kernel are kept until forgotten
+    - cache behaviour follows mount options of `mydfs.cli.get_mount_options`
+    - replicas changed in background, see `mydfs.Mydfs.invalidate`, are invalidated in the kernel
+    '''
+
+    def __init__(self, mydfs_, options=None, jobs=4):
+        '''
+        @param mydfs_  `mydfs.Mydfs` with inode map
+        @param options None or {str: any}; see `mydfs.cli.get_mount_options`
+        @param jobs    int; number of threads per root and for paths without mask
+        '''
+        super().__init__()
+
+        if mydfs_.Inodes is None:
+            raise ValueError('inode map required')
+
+        options = {} if options is None else options
+
+        self.Mydfs = mydfs_
+        self.AttrTimeout = options.get('attr_timeout', 1.)
+        self.EntryTimeout = options.get('entry_timeout', 1.)
+        self.NegativeTimeout = options.get('negative_timeout', 0.)
+        self.KernelCache = options.get('kernel_cache', False)
+        self.AutoCache = options.get('auto_cache', False)
+
+        # {inode: path}; names with the same inode denote the same replicas, see `mydfs.Mydfs._get_inode_key`
+        self._Paths = {mydfs.inodes.ROOT_INODE: '/'}
+        self._Lookups = collections.Counter()  # {inode: lookup count of kernel}
+        self._FileHandles = {}  # {file handle: path}
+        self._Directories = {}  # {file handle: [path, None or [(name, attributes)]]}
+        self._NextDirectoryHandle = it.count(1)
+        self._Versions = {}  # {inode: (modification time, size)} of last open, for auto cache
+        self._Loop = None
+
+        self._Executors = {
+            root: concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='mydfs-{}'.format(c))
+            for c, root in mydfs_._Roots
+        }  # {real path of root: executor}
+        self._SharedExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs,
+                                                                     thread_name_prefix='mydfs-shared')
+
+        mydfs_.add_invalidation_listener(self._on_invalidate)
+
+    def start(self):
+        '''
+        Must be called on the event loop.
+        '''
+        self._Loop = asyncio.get_running_loop()
+
+    def shutdown(self):
+        for executor in it.chain(self._Executors.values(), [self._SharedExecutor]):
+            executor.shutdown(wait=True)
+
+    async def lookup(self, parent_inode, name, ctx=None):
+        path = self._get_child_path(parent_inode, name)
+        try:
+            attributes = await self._lookup(path)
+
+        except pyfuse3.FUSEError as e:
+            if e.errno == errno.ENOENT and self.NegativeTimeout != 0:
+                r = pyfuse3.EntryAttributes()
+                r.st_ino = 0
+                r.entry_timeout = self.NegativeTimeout
+                return r
+
+            raise
+
+        r = self._get_entry_attributes(attributes)
+        return r
+
+    async def _lookup(self, path):
+        '''
+        - gets attributes
+        - remembers path of inode
+
+        @param path str; path in mount
+        @return {str: any}; see `mydfs.Mydfs.getattr`
+        '''
+        r = await self._call(self._get_executor(path=path), 'getattr', path)
+        self._remember(r['st_ino'], path)
+        return r
+
+    async def forget(self, inode_list):
+        for inode, n in inode_list:
+            self._Lookups[inode] -= n
+            if self._Lookups[inode] <= 0:
+                del self._Lookups[inode]
+                self._Versions.pop(inode, None)
+                if inode != mydfs.inodes.ROOT_INODE:
+                    self._Paths.pop(inode, None)
+
+    async def getattr(self, inode, ctx=None):
+        path = self._get_path(inode)
+        r = self._get_entry_attributes(await self._call(self._get_executor(path=path), 'getattr', path))
+        return r
+
+    async def setattr(self, inode, attr, fields, fh, ctx):
+        '''
+        - changes mode, owner, size and times as requested
+        - returns attributes
+        '''
+        path = self._get_path(inode)
+        executor = self._get_executor(path=path)
+
+        if fields.update_mode:
+            await self._call(executor, 'chmod', path, attr.st_mode)
+
+        if fields.update_uid or fields.update_gid:
+            await self._call(executor, 'chown', path, attr.st_uid if fields.update_uid else -1,
+                             attr.st_gid if fields.update_gid else -1)
+
+        if fields.update_size:
+            await self._call(executor, 'truncate', path, attr.st_size)
+
+        if fields.update_atime or fields.update_mtime:
+            attributes = await self._call(executor, 'getattr', path)
+            times = (attr.st_atime_ns / 1e9 if fields.update_atime else attributes['st_atime'],
+                     attr.st_mtime_ns / 1e9 if fields.update_mtime else attributes['st_mtime'])
+            await self._call(executor, 'utimens', path, times)
+
+        r = self._get_entry_attributes(await self._call(executor, 'getattr', path))
+        return r
+
+    async def readlink(self, inode, ctx):
+        path = self._get_path(inode)
+        r = os.fsencode(await self._call(self._get_executor(path=path), 'readlink', path))
+        return r
+
+    async def opendir(self, inode, ctx):
+        r = next(self._NextDirectoryHandle)
+        self._Directories[r] = [self._get_path(inode), None]
+        return r
+
+    async def readdir(self, fh, start_id, token):
+        '''
+        - on first call
+          - lists directory, see `mydfs.Mydfs.readdir`
+          - gets attributes of all entries concurrently
+        - replies entries starting at `start_id` until the buffer is full
+        '''
+        directory = self._Directories[fh]
+        path, entries = directory
+
+        if entries is None:
+            executor = self._get_executor(path=path)
+            names = await self._call(executor, 'readdir', path, 0)
+
+            names = [name for name in names if name not in ('.', '..')]
+            results = await asyncio.gather(*[
+                self._call(self._get_executor(path=ospath.join(path, name)), 'getattr', ospath.join(path, name))
+                for name in names
+            ], return_exceptions=True)
+
+            # skips entries removed in the meantime
+            entries = [(name, attributes) for name, attributes in zip(names, results)
+                       if not isinstance(attributes, Exception)]
+            directory[1] = entries
+
+        for index in range(start_id, len(entries)):
+            name, attributes = entries[index]
+            entryAttributes = self._get_entry_attributes(attributes)
+            if not pyfuse3.readdir_reply(token, os.fsencode(name), entryAttributes, index + 1):
+                break
+
+            self._remember(entryAttributes.st_ino, ospath.join(path, name))
+
+    async def releasedir(self, fh):
+        del self._Directories[fh]
+
+    async def open(self, inode, flags, ctx):
+        '''
+        - opens file
+        - keeps page cache if kernel cache is enabled, or auto cache is enabled and the file didn't change since last
+          open
+        - virtual files aren't cached
+        '''
+        path = self._get_path(inode)
+        executor = self._get_executor(path=path)
+        fh = await self._call(executor, 'open', path, flags)
+        self._FileHandles[fh] = path
+
+        r = pyfuse3.FileInfo(fh=fh)
+        if mydfs.VIRTUAL_FILE_HANDLE <= fh:
+            r.direct_io = True
+            return r
+
+        keepCache = self.KernelCache
+        if self.AutoCache:
+            attributes = await self._call(executor, 'getattr', path)
+            version = (attributes['st_mtime'], attributes['st_size'])
+            keepCache = keepCache or self._Versions.get(inode, None) == version
+            self._Versions[inode] = version
+
+        r.keep_cache = keepCache
+        return r
+
+    async def create(self, parent_inode, name, mode, flags, ctx):
+        path = self._get_child_path(parent_inode, name)
+        executor = self._get_executor(path=path)
+        fh = await self._call(executor, 'create', path, mode)
+        self._FileHandles[fh] = path
+
+        attributes = self._get_entry_attributes(await self._call(executor, 'getattr', path))
+        self._remember(attributes.st_ino, path)
+        return pyfuse3.FileInfo(fh=fh), attributes
+
+    async def read(self, fh, off, size):
+        r = await self._call(self._get_executor(fileHandle=fh), 'read', self._FileHandles[fh], size, off, fh)
+        return r
+
+    async def write(self, fh, off, buf):
+        r = await self._call(self._get_executor(fileHandle=fh), 'write', self._FileHandles[fh], buf, off, fh)
+        return r
+
+    async def flush(self, fh):
+        await self._call(self._get_executor(fileHandle=fh), 'flush', self._FileHandles[fh], fh)
+
+    async def fsync(self, fh, datasync):
+        await self._call(self._get_executor(fileHandle=fh), 'fsync', self._FileHandles[fh], int(datasync), fh)
+
+    async def release(self, fh):
+        path = self._FileHandles.pop(fh)
+        await self._call(self._get_executor(fileHandle=fh), 'release', path, fh)
+
+    async def mkdir(self, parent_inode, name, mode, ctx):
+        path = self._get_child_path(parent_inode, name)
+        executor = self._get_executor(path=path)
+        await self._call(executor, 'mkdir', path, mode)
+
+        r = self._get_entry_attributes(await self._call(executor, 'getattr', path))
+        self._remember(r.st_ino, path)
+        return r
+
+    async def unlink(self, parent_inode, name, ctx):
+        path = self._get_child_path(parent_inode, name)
+        await self._call(self._get_executor(path=path), 'unlink', path)
+
+    async def rmdir(self, parent_inode, name, ctx):
+        path = self._get_child_path(parent_inode, name)
+        await self._call(self._get_executor(path=path), 'rmdir', path)
+
+    async def rename(self, parent_inode_old, name_old, parent_inode_new, name_new, flags, ctx):
+        '''
+        - renames, see `mydfs.Mydfs.rename`
+        - updates paths of known inodes at and below old path
+        '''
+        if flags != 0:
+            raise pyfuse3.FUSEError(errno.EINVAL)
+
+        old = self._get_child_path(parent_inode_old, name_old)
+        new = self._get_child_path(parent_inode_new, name_new)
+        await self._call(self._get_executor(path=old), 'rename', old, new)
+
+        prefix = old + '/'
+        for inode, path in list(self._Paths.items()):
+            if path == old:
+                self._Paths[inode] = new
+
+            elif path.startswith(prefix):
+                self._Paths[inode] = new + path[len(old):]
+
+    async def symlink(self, parent_inode, name, target, ctx):
+        path = self._get_child_path(parent_inode, name)
+        executor = self._get_executor(path=path)
+        await self._call(executor, 'symlink', path, os.fsdecode(target))
+
+        r = self._get_entry_attributes(await self._call(executor, 'getattr', path))
+        self._remember(r.st_ino, path)
+        return r
+
+    async def link(self, inode, new_parent_inode, new_name, ctx):
+        source = self._get_path(inode)
+        path = self._get_child_path(new_parent_inode, new_name)
+        executor = self._get_executor(path=path)
+        await self._call(executor, 'link', path, source)
+
+        r = self._get_entry_attributes(await self._call(executor, 'getattr', path))
+        self._remember(r.st_ino, path)
+        return r
+
+    async def access(self, inode, mode, ctx):
+        path = self._get_path(inode)
+        try:
+            await self._call(self._get_executor(path=path), 'access', path, mode)
+
+        except pyfuse3.FUSEError:
+            return False
+
+        return True
+
+    async def statfs(self, ctx):
+        statfs = await self._call(self._get_executor(), 'statfs', '/')
+
+        r = pyfuse3.StatvfsData()
+        for name, value in statfs.items():
+            if hasattr(r, name):
+                setattr(r, name, value)
+
+        return r
+
+    async def _call(self, executor, op, *args):
+        '''
+        Calls operation of Mydfs on executor.
+
+        @param executor `concurrent.futures.Executor`
+        @param op       str
+        @param args     tuple
+        @return any
+        '''
+        try:
+            r = await asyncio.get_running_loop().run_in_executor(executor, self.Mydfs, op, *args)
+
+        except OSError as e:
+            raise pyfuse3.FUSEError(e.errno or errno.EIO) from e
+
+        return r
+
+    def _get_executor(self, path=None, fileHandle=None):
+        '''
+        @param path       None or str; path in mount
+        @param fileHandle None or int
+        @return `concurrent.futures.Executor`; of root of open file, first root of mask, root of root view or shared
+        '''
+        mydfs_ = self.Mydfs
+
+        if fileHandle is not None:
+            openFilePath = mydfs_._OpenFilePaths.get(fileHandle, None)
+            if openFilePath is not None:
+                _, _, roots = openFilePath
+                return self._Executors[roots[-1]]
+
+        if path is not None:
+            masked = mydfs_._parse_mask(path)
+            if masked is not None:
+                _, roots, _ = masked
+                return self._Executors[roots[0]]
+
+            view = mydfs_._parse_root_view(path)
+            if view is not None:
+                root, _ = view
+                return self._Executors[root]
+
+        return self._SharedExecutor  # resolving roots would block the loop
+
+    def _get_path(self, inode):
+        r = self._Paths.get(inode, None)
+        if r is None:
+            raise pyfuse3.FUSEError(errno.ESTALE)
+
+        return r
+
+    def _get_child_path(self, parent_inode, name):
+        r = ospath.join(self._get_path(parent_inode), os.fsdecode(name))
+        return r
+
+    def _remember(self, inode, path):
+        self._Paths[inode] = path
+        self._Lookups[inode] += 1
+
+    def _get_entry_attributes(self, attributes):
+        '''
+        @param attributes {str: any}; see `mydfs.Mydfs.getattr`
+        @return `pyfuse3.EntryAttributes`
+        '''
+        r = pyfuse3.EntryAttributes()
+
+        r.st_ino = attributes['st_ino']
+        r.generation = 0
+        r.entry_timeout = self.EntryTimeout
+        r.attr_timeout = self.AttrTimeout
+        r.st_mode = attributes['st_mode']
+        r.st_nlink = attributes['st_nlink']
+        r.st_uid = attributes['st_uid']
+        r.st_gid = attributes['st_gid']
+        r.st_rdev = 0
+        r.st_size = attributes['st_size']
+        r.st_blksize = 4096
+        r.st_blocks = (attributes['st_size'] + 511) // 512
+
+        for name in ('atime', 'mtime', 'ctime'):
+            ns = attributes.get('st_{}_ns'.format(name), None)
+            if ns is None:
+                ns = int(attributes['st_{}'.format(name)] * 1e9)
+
+            setattr(r, 'st_{}_ns'.format(name), ns)
+
+        return r
+
+    def _on_invalidate(self, realPath):
+        '''
+        Called from any thread, see `mydfs.Mydfs.invalidate`.
+        '''
+        if self._Loop is not None:
+            self._Loop.call_soon_threadsafe(self._invalidate, realPath)
+
+    def _invalidate(self, realPath):
+        '''
+        - for all known inodes in parent directory or root views, see `mydfs.Mydfs._parse_root_view`, with same path
+          without mask
+          - invalidates entry and inode
+        - invalidates parent directories
+        '''
+        mydfs_ = self.Mydfs
+        parentPath = ospath.dirname(realPath)
+        inodes = {path: inode for inode, path in self._Paths.items()}
+
+        parentPaths = set()
+        for inode, path in list(self._Paths.items()):
+            dirPath = ospath.dirname(path)
+            if not (dirPath == parentPath or path.startswith(mydfs.ROOTS_PATH)):
+                continue
+            if mydfs_._get_real_path(path) != realPath:
+                continue
+
+            parentInode = inodes.get(dirPath, None)
+            if parentInode is not None:
+                pyfuse3.invalidate_entry_async(parentInode, os.fsencode(ospath.basename(path)), ignore_enoent=True)
+                parentPaths.add(dirPath)
+
+            self._Loop.run_in_executor(None, self._invalidate_inode, inode)
+
+        parentPaths.add(parentPath)
+        for dirPath in parentPaths:
+            parentInode = inodes.get(dirPath, None)
+            if parentInode is not None:
+                self._Loop.run_in_executor(None, self._invalidate_inode, parentInode)
+
+    def _invalidate_inode(self, inode):
+        try:
+            pyfuse3.invalidate_inode(inode)
+
+        except OSError:  # unknown to the kernel
+            pass
+
+
+def main(mydfs_, mountPath, options=None, debug=False, jobs=4, maxTasks=1024):
+    '''
+    Mounts and serves requests until unmounted.
+
+    @param mydfs_    `mydfs.Mydfs` with inode map
+    @param mountPath str
+    @param options   None or {str: any}; see `mydfs.cli.get_mount_options`
+    @param debug     bool
+    @param jobs      int; number of threads per root
+    @param maxTasks  int; maximum number of concurrent requests
+    '''
+    if pyfuse3 is None:
+        raise RuntimeError('backend pyfuse3 requires packages pyfuse3 and pyfuse3_asyncio')
+
+    options = {} if options is None else options
+    operations = Operations(mydfs_, options=options, jobs=jobs)
+
+    fuseOptions = set(pyfuse3.default_options)
+    fuseOptions.add('fsname=mydfs')
+    if debug:
+        fuseOptions.add('debug')
+    if 'max_read' in options:
+        fuseOptions.add('max_read={}'.format(options['max_read']))
+
+    pyfuse3_asyncio.enable()
+    pyfuse3.init(operations, mountPath, fuseOptions)
+
+    async def _main():
+        operations.start()
+        mydfs_.init('/')
+        try:
+            await pyfuse3.main(max_tasks=maxTasks)
+
+        finally:
+            mydfs_.destroy('/')
+
+    try:
+        asyncio.run(_main())
+
+    finally:
+        pyfuse3.close(unmount=True)
+        operations.shutdown()
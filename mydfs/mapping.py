@@ -0,0 +1,82 @@
+'''
+Reads from memory mappings of replicas opened read-only, see `mydfs.Mydfs.read`.
+'''
+
+import os
+import mmap
+import threading
+
+
+class Mapping:
+    '''
+    Memory mapping of a file, renewed when the file grows.
+
+    Accessing pages beyond the end of file raises SIGBUS, which terminates the process.
+    Therefore the size is checked with `os.fstat` before each read and reads are limited to it.
+    `mydfs.Mydfs` closes mappings before it truncates, see `mydfs.Mydfs._close_mappings`, and so does
+    `mydfs.dirty.DirtyJournal` before it shrinks a replica.
+    A truncation by another process between check and copy remains possible, so mappings should only be used for
+    files which aren't truncated outside of the mount.
+    '''
+
+    def __init__(self, fileHandle):
+        '''
+        @param fileHandle int; opened read-only
+        '''
+        self.FileHandle = fileHandle
+
+        self._Lock = threading.Lock()
+        self._Map = None
+        self._Size = 0  # size of mapping
+        self._Closed = False
+
+    def read(self, size, offset):
+        '''
+        - gets size of file
+        - if file grew
+          - renews mapping
+        - copies range, limited to size of file
+
+        @param size   int
+        @param offset int
+        @return None or bytes; None if closed, empty or mapping failed
+        '''
+        fileSize = os.fstat(self.FileHandle).st_size
+
+        with self._Lock:
+            if self._Size < fileSize and not self._Closed:
+                self._remap(fileSize)
+
+            if self._Map is None:
+                return None
+
+            end = min(offset + size, fileSize, self._Size)
+            if end <= offset:
+                return b''
+
+            return self._Map[offset:end]
+
+    def _remap(self, size):
+        if self._Map is not None:
+            self._Map.close()
+            self._Map = None
+            self._Size = 0
+
+        try:
+            self._Map = mmap.mmap(self.FileHandle, size, access=mmap.ACCESS_READ)
+
+        except (OSError, ValueError):  # e.g. not supported by file system, or truncated in the meantime
+            return
+
+        self._Size = size
+
+    def close(self):
+        '''
+        Unmaps, waiting for reads in progress; subsequent reads return None.
+        '''
+        with self._Lock:
+            self._Closed = True
+            if self._Map is not None:
+                self._Map.close()
+                self._Map = None
+                self._Size = 0
@@ -0,0 +1,107 @@
+'''
+Placement of new files and directories by path prefix, see `mydfs.Mydfs._resolve`.
+
+Without policy, new files and directories are created in the single root with the longest existing parent directory.
+A policy file overrides this per directory tree, with one rule per line:
+
+    # path prefix, number of replicas, preferred roots (optional, default all in order of roots)
+    /tmp       1  c
+    /projects  2  ab
+
+New entries below `/tmp` are created on root c only, new entries below `/projects` on roots a and b.
+If there are fewer preferred roots than replicas, the remaining roots fill up in order of roots.
+The rule with the longest matching prefix applies; existing files and masked paths are unaffected.
+'''
+
+import os
+
+ospath = os.path
+
+
+class PlacementPolicy:
+    '''
+    Number of replicas and preferred roots by path prefix.
+    '''
+
+    def __init__(self, rules):
+        '''
+        @param rules iter((str, int, str)); (path prefix, number of replicas, characters of preferred roots in order of
+                     preference)
+        '''
+        self.Rules = {}  # {path prefix: (int, str)}
+
+        for prefix, nReplicas, characters in rules:
+            if not prefix.startswith('/'):
+                raise ValueError('relative path prefix {}'.format(repr(prefix)))
+            if nReplicas < 1:
+                raise ValueError('no replicas for {}'.format(repr(prefix)))
+
+            self.Rules[ospath.normpath(prefix)] = (nReplicas, characters)
+
+    def check(self, characters):
+        '''
+        @param characters iter(str); characters of roots
+        @return None
+        '''
+        characters = set(characters)
+        for prefix, (_, preferred) in self.Rules.items():
+            for character in preferred:
+                if character not in characters:
+                    raise ValueError('no root for character {} in rule for {}'.format(repr(character), repr(prefix)))
+
+    def get_roots(self, path, roots):
+        '''
+        - finds rule with longest matching prefix
+        - if found
+          - returns preferred roots, filled up with remaining roots, up to number of replicas
+
+        @param path  str; path without mask
+        @param roots [(str, str)]; (character, real path of root) in order of roots
+        @return None or [str]; real paths of roots in order of preference, None if no rule applies
+        '''
+        rule = None
+        p = path
+        while True:
+            rule = self.Rules.get(p, None)
+            if rule is not None or p == '/':
+                break
+
+            p = ospath.dirname(p)
+
+        if rule is None:
+            return None
+
+        nReplicas, preferred = rule
+        byCharacter = dict(roots)
+
+        r = [byCharacter[character] for character in preferred]
+        r.extend(root for character, root in roots if character not in preferred)
+        r = r[:nReplicas]
+        return r
+
+
+def load(path):
+    '''
+    @param path str; path of policy file
+    @return PlacementPolicy
+    '''
+    rules = []
+
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            line = line.partition('#')[0].strip()
+            if line == '':
+                continue
+
+            fields = line.split()
+            try:
+                if len(fields) not in (2, 3):
+                    raise ValueError('expected path prefix, number of replicas and optional roots')
+
+                rules.append((fields[0], int(fields[1]), fields[2] if len(fields) == 3 else ''))
+
+            except ValueError as e:
+                raise ValueError('{}:{}: {}'.format(path, number, e))
+
+    r = PlacementPolicy(rules)
+    return r
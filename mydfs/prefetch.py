@@ -0,0 +1,182 @@
+'''
+Prefetch of directory listings during tree walks: when `mydfs.Mydfs.readdir` lists subdirectories, their scans are
+scheduled on a few background threads into the listing cache, see `mydfs.listing`.
+
+Tree walkers descend depth-first into the subdirectories of the directory listed last, so the newest prefetches run
+first and, under load, the oldest are dropped: if more than `maxPending` are pending, or if one waited longer than
+`maxAge`.
+'''
+
+import mydfs.scheduler
+import os
+import threading
+import collections
+import logging
+import time
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    '''
+    Scans subdirectories of listed directories in the background.
+    '''
+
+    def __init__(self, jobs=4, maxPending=256, maxAge=2., maxPerDirectory=64):
+        '''
+        @param jobs            int; number of threads
+        @param maxPending      int; maximum number of pending prefetches
+        @param maxAge          float; seconds after which pending prefetches are dropped
+        @param maxPerDirectory int; maximum number of subdirectories prefetched per listed directory
+        '''
+        self.Jobs = jobs
+        self.MaxPending = maxPending
+        self.MaxAge = maxAge
+        self.MaxPerDirectory = maxPerDirectory
+
+        self._Stats = collections.Counter()  # {name: count}
+
+        self._Condition = threading.Condition()
+        self._Pending = collections.OrderedDict()  # {path: time scheduled}, newest last
+        self._Prefetched = collections.OrderedDict()  # {path: None}, prefetched and not yet listed, newest last
+
+        self._Mydfs = None
+        self._Threads = []
+        self._Stop = False
+
+    @property
+    def Stats(self):
+        '''
+        @return {str: int}; scheduled, dropped and prefetched listings, hits and hit rate in per mille
+        '''
+        with self._Condition:
+            r = collections.Counter(self._Stats)
+            r['pending'] = len(self._Pending)
+
+        if r['prefetched'] != 0:
+            r['hitRatePermille'] = r['hits'] * 1000 // r['prefetched']
+
+        return r
+
+    def start(self, mydfs_):
+        '''
+        Starts background threads.
+
+        @param mydfs_ `mydfs.Mydfs`
+        @return None
+        '''
+        if mydfs_.ListingCache is None:
+            raise ValueError('prefetch requires listing cache')
+
+        self._Mydfs = mydfs_
+
+        self._Stop = False
+        self._Threads = [
+            threading.Thread(target=self._run, name='mydfs-prefetch-{}'.format(index), daemon=True)
+            for index in range(self.Jobs)
+        ]
+        for thread in self._Threads:
+            thread.start()
+
+    def stop(self):
+        with self._Condition:
+            self._Stop = True
+            self._Condition.notify_all()
+
+        for thread in self._Threads:
+            thread.join()
+
+        self._Threads = []
+
+    def schedule(self, path, dirNames):
+        '''
+        - for subdirectories, up to maximum per directory
+          - if not cached
+            - adds to pending prefetches
+        - drops oldest prefetches while too many are pending
+
+        @param path     str; path of listed directory
+        @param dirNames iter(str); names of subdirectories
+        @return None
+        '''
+        cache = self._Mydfs.ListingCache
+        paths = [ospath.join(path, name) for name in sorted(dirNames)[:self.MaxPerDirectory]]
+        paths = [p for p in paths if p not in cache]
+        if len(paths) == 0:
+            return
+
+        now = time.monotonic()
+        with self._Condition:
+            for p in reversed(paths):  # first subdirectory runs first
+                self._Pending[p] = now
+                self._Pending.move_to_end(p)
+
+            self._Stats['scheduled'] += len(paths)
+
+            while self.MaxPending < len(self._Pending):
+                self._Pending.popitem(last=False)
+                self._Stats['dropped'] += 1
+
+            self._Condition.notify(len(paths))
+
+    def use(self, path):
+        '''
+        Records listing of directory, before it is scanned or taken from the cache.
+
+        @param path str; path of directory
+        @return None
+        '''
+        with self._Condition:
+            if self._Pending.pop(path, None) is not None:  # listed before prefetched
+                self._Stats['late'] += 1
+                return
+
+            if path not in self._Prefetched:
+                return
+
+            del self._Prefetched[path]
+
+        self._count('hits' if path in self._Mydfs.ListingCache else 'misses')  # invalidated or evicted
+
+    def _run(self):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        while True:
+            with self._Condition:
+                while not self._Stop and len(self._Pending) == 0:
+                    self._Condition.wait()
+
+                if self._Stop:
+                    return
+
+                path, scheduled = self._Pending.popitem(last=True)
+
+            if scheduled + self.MaxAge < time.monotonic():
+                self._count('expired')
+                continue
+
+            if path in self._Mydfs.ListingCache:
+                self._count('cached')
+                continue
+
+            try:
+                self._Mydfs._scan(path)
+
+            except OSError as e:
+                self._count('errors')
+                log.debug('prefetch failed for %s: %s', repr(path), e)
+                continue
+
+            with self._Condition:
+                self._Prefetched[path] = None
+                while self.MaxPending < len(self._Prefetched):
+                    self._Prefetched.popitem(last=False)
+                    self._Stats['unused'] += 1
+
+                self._Stats['prefetched'] += 1
+
+    def _count(self, name):
+        with self._Condition:
+            self._Stats[name] += 1
@@ -0,0 +1,210 @@
+'''
+Answers queries on the merged namespace, see `mydfs.Mydfs.readdir`, by reading the roots directly instead of through
+the mount.
+
+- ls: lists a directory
+- find: lists files recursively, optionally filtered by mask and name
+- du: sums files and bytes per mask recursively
+'''
+
+import mydfs
+import mydfs.cli
+import mydfs.striping
+import os
+import sys
+import json
+import fnmatch
+import collections
+import concurrent.futures
+import argparse
+import logging
+import time
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+QUERIES = ('ls', 'find', 'du')
+
+# path in mount with mask, mask, size of file
+Entry = collections.namedtuple('Entry', ['Path', 'Mask', 'Size'])
+
+
+class Walker:
+    '''
+    Walks the merged namespace breadth-first.
+
+    Each root has a single worker, which scans directories in the order of the directory queue, see
+    `mydfs.Mydfs._scan_root`.
+    Up to `depth` directories are scanned ahead of the merge, see `mydfs.Mydfs._merge`.
+    '''
+
+    def __init__(self, mydfs_, depth=64):
+        '''
+        @param mydfs_ `mydfs.Mydfs`
+        @param depth  int; maximum number of directories in flight
+        '''
+        self.Mydfs = mydfs_
+        self.Depth = depth
+
+        self.Stats = collections.Counter()  # {name: count}
+
+    def walk(self, path='/', recursive=True):
+        '''
+        - while directories are queued or in flight
+          - while directories are queued and less than depth are in flight
+            - submits scan to the workers of all roots
+          - joins scans of oldest directory
+          - merges files
+          - if recursive
+            - queues directories
+          - yields directory
+
+        @param path      str; path of directory
+        @param recursive bool
+        @return iter((str, [str], [Entry])); path of directory, names of directories and files
+        '''
+        mydfs_ = self.Mydfs
+        executors = [
+            concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='mydfs-query-{}'.format(character))
+            for character, _ in mydfs_._Roots
+        ]
+        try:
+            queue = collections.deque([path])
+            inFlight = collections.deque()  # [(path of directory, [Future])]
+            while len(queue) != 0 or len(inFlight) != 0:
+                while len(queue) != 0 and len(inFlight) < self.Depth:
+                    dirPath = queue.popleft()
+                    inFlight.append((dirPath, [
+                        executor.submit(mydfs_._scan_root, dirPath, root)
+                        for executor, (_, root) in zip(executors, mydfs_._Roots)
+                    ]))
+
+                dirPath, futures = inFlight.popleft()
+                dirNames, fileIds, stripes = mydfs_._join_scans([self._get_scan(dirPath, future) for future in futures])
+                entries = sorted(self._get_entries(dirPath, fileIds, stripes))
+                dirNames = sorted(dirNames)
+
+                self.Stats['directories'] += 1
+                self.Stats['files'] += len(entries)
+
+                if recursive:
+                    queue.extend(ospath.join(dirPath, name) for name in dirNames)
+
+                yield dirPath, dirNames, entries
+
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_scan(self, dirPath, future):
+        try:
+            return future.result()
+
+        except OSError as e:  # e.g. file removed during scan
+            self.Stats['errors'] += 1
+            log.warning('scan of %s failed: %s', repr(dirPath), e)
+
+        return set(), {}, set()
+
+    def _get_entries(self, dirPath, fileIds, stripes):
+        mydfs_ = self.Mydfs
+
+        for mask, separator, name, fileId in mydfs_._merge(dirPath, fileIds, stripes):
+            if fileId is None:  # striped
+                memberPath = mydfs.striping.get_member_path(ospath.join(dirPath, name))
+                try:
+                    size = mydfs.striping.get_stat_size(
+                        [root + memberPath for character, (_, root) in zip(mask, mydfs_._Roots) if character != '.'])
+
+                except OSError as e:
+                    self.Stats['errors'] += 1
+                    log.warning('size of striped file %s failed: %s', repr(ospath.join(dirPath, name)), e)
+                    size = 0
+
+            else:
+                _, _, size = fileId
+
+            yield Entry(ospath.join(dirPath, ''.join([mask, separator, name])), mask, size)
+
+
+def ls(walker, path, long, output):
+    for dirPath, dirNames, entries in walker.walk(path, recursive=False):
+        for name in dirNames:
+            print(name + '/', file=output)
+
+        for entry in entries:
+            name = ospath.basename(entry.Path)
+            print('{}\t{}'.format(entry.Size, name) if long else name, file=output)
+
+
+def find(walker, path, maskPattern, namePattern, long, output):
+    for dirPath, dirNames, entries in walker.walk(path):
+        for entry in entries:
+            if not _matches(entry, maskPattern, namePattern, len(walker.Mydfs._Roots)):
+                continue
+
+            print('{}\t{}'.format(entry.Size, entry.Path) if long else entry.Path, file=output)
+
+
+def du(walker, path, maskPattern, namePattern, output):
+    '''
+    @return {str: [int, int]}; {mask: [number of files, number of bytes]}
+    '''
+    r = collections.defaultdict(lambda: [0, 0])
+
+    for dirPath, dirNames, entries in walker.walk(path):
+        for entry in entries:
+            if not _matches(entry, maskPattern, namePattern, len(walker.Mydfs._Roots)):
+                continue
+
+            counts = r[entry.Mask]
+            counts[0] += 1
+            counts[1] += entry.Size
+
+    for mask, (nFiles, nBytes) in sorted(r.items()):
+        print('{}\t{}\t{}'.format(mask, nFiles, nBytes), file=output)
+
+    return r
+
+
+def _matches(entry, maskPattern, namePattern, nRoots):
+    if maskPattern is not None and not fnmatch.fnmatchcase(entry.Mask, maskPattern):
+        return False
+
+    if namePattern is not None and not fnmatch.fnmatchcase(ospath.basename(entry.Path)[(nRoots + 1):], namePattern):
+        return False
+
+    return True
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs query', description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--path', default='/', help='Directory to start at')
+    parser.add_argument('--mask', metavar='pattern', default=None,
+                        help='Pattern of masks for find and du, e.g. \'.b\' for files only in root b')
+    parser.add_argument('--name', metavar='pattern', default=None, help='Pattern of names for find and du')
+    parser.add_argument('-l', '--long', action='store_true', default=False, help='Print sizes')
+    parser.add_argument('--depth', type=int, default=64, help='Number of directories scanned ahead')
+    parser.add_argument('query', choices=QUERIES)
+    mydfs.cli.add_roots_argument(parser)
+
+    args = parser.parse_args(arguments)
+
+    walker = Walker(mydfs.Mydfs(mydfs.cli.parse_roots(args.roots)), depth=args.depth)
+    start = time.monotonic()
+
+    if args.query == 'ls':
+        ls(walker, args.path, args.long, sys.stdout)
+
+    elif args.query == 'find':
+        find(walker, args.path, args.mask, args.name, args.long, sys.stdout)
+
+    else:
+        du(walker, args.path, args.mask, args.name, sys.stdout)
+
+    stats = dict(walker.Stats, seconds=round(time.monotonic() - start, 3))
+    print(json.dumps(stats, sort_keys=True), file=sys.stderr)
+    return 1 if walker.Stats['errors'] != 0 else 0
@@ -0,0 +1,257 @@
+'''
+Replication by mask: renames which widen the mask of a file copy it to the added roots, renames which narrow it remove
+the replicas from the dropped roots, both in the background, see `mydfs.Mydfs.rename`.
+
+Until copies land, reads are served from the existing replicas; until replicas are removed, they stay visible.
+Pending jobs are kept in memory only and are lost on unmount.
+'''
+
+import mydfs.copying
+import mydfs.scheduler
+import mydfs.throttle
+import os
+import stat
+import threading
+import collections
+import logging
+import uuid
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+
+class Replicator:
+    '''
+    Copies and removes replicas in the background.
+
+    Jobs which can't complete, because the file is open for writing or changed while copying, are retried after
+    `interval`.
+    '''
+
+    def __init__(self, rate=None, interval=5.):
+        '''
+        @param rate     None or float; maximum bytes per second copied
+        @param interval float; seconds between retries
+        '''
+        self.Interval = interval
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Limiter = mydfs.throttle.RateLimiter(rate)
+        self._Lock = threading.Lock()
+        self._Jobs = collections.OrderedDict()  # {path without mask: (frozenset, frozenset)}; real paths of roots to
+        # copy to and to remove from
+
+        self._Mydfs = None
+        self._Thread = None
+        self._Stop = threading.Event()
+        self._Wake = threading.Event()
+
+    def schedule(self, path, targets, drops):
+        '''
+        Adds roots to copy to and to remove from, overriding pending jobs for the same file.
+
+        @param path    str; path without mask
+        @param targets iter(str); real paths of roots to copy to
+        @param drops   iter(str); real paths of roots to remove from
+        @return None
+        '''
+        targets = set(targets)
+        drops = set(drops)
+
+        with self._Lock:
+            pendingTargets, pendingDrops = self._Jobs.get(path, (frozenset(), frozenset()))
+            job = (frozenset((pendingTargets - drops) | targets), frozenset((pendingDrops - targets) | drops))
+            if len(job[0]) == 0 and len(job[1]) == 0:
+                self._Jobs.pop(path, None)
+
+            else:
+                self._Jobs[path] = job
+
+            self.Stats['pending'] = len(self._Jobs)
+
+        self._Wake.set()
+
+    def move(self, old, new):
+        '''
+        Moves pending jobs of renamed files and directories.
+
+        @param old str; path without mask
+        @param new str; path without mask
+        @return None
+        '''
+        with self._Lock:
+            for path in list(self._Jobs):
+                if path == old or path.startswith(old + '/'):
+                    self._Jobs[new + path[len(old):]] = self._Jobs.pop(path)
+
+    def trigger(self):
+        '''
+        Starts run now instead of after interval.
+        '''
+        self._Wake.set()
+
+    def start(self, mydfs_):
+        '''
+        Starts background thread.
+
+        @param mydfs_ `mydfs.Mydfs`
+        @return None
+        '''
+        self._Mydfs = mydfs_
+
+        self._Stop.clear()
+        self._Thread = threading.Thread(target=self._run, name='mydfs-replication', daemon=True)
+        self._Thread.start()
+
+    def stop(self):
+        if self._Thread is None:
+            return
+
+        self._Stop.set()
+        self._Wake.set()
+        self._Thread.join()
+        self._Thread = None
+
+        with self._Lock:
+            if len(self._Jobs) != 0:
+                log.warning('%d replication jobs pending on stop', len(self._Jobs))
+
+    def run_once(self):
+        '''
+        Processes all pending jobs once.
+        '''
+        with self._Lock:
+            jobs = list(self._Jobs.items())
+
+        for path, job in jobs:
+            if self._Stop.is_set():
+                break
+
+            try:
+                done = self._replicate(path, *job)
+
+            except OSError as e:
+                self.Stats['errors'] += 1
+                log.warning('replication failed for %s: %s', repr(path), e)
+                done = False
+
+            if not done:
+                self.Stats['retries'] += 1
+                continue
+
+            with self._Lock:
+                if self._Jobs.get(path, None) is job:
+                    del self._Jobs[path]
+
+                self.Stats['pending'] = len(self._Jobs)
+
+    def _run(self):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        while not self._Stop.is_set():
+            self._Wake.wait(self.Interval)
+            self._Wake.clear()
+
+            try:
+                self.run_once()
+
+            except Exception:
+                log.exception('replication run failed')
+
+    def _replicate(self, path, targets, drops):
+        '''
+        - gets regular replicas
+        - if there are none
+          - drops job
+        - copies first replica which is kept to temporary files on roots without replica
+        - acquires lock of Mydfs
+        - if no writer and replica unchanged
+          - links temporary files to replicas
+          - if any replica is kept
+            - removes replicas to drop
+        - removes temporary files
+
+        @param path    str; path without mask
+        @param targets frozenset(str); real paths of roots to copy to
+        @param drops   frozenset(str); real paths of roots to remove from
+        @return bool; whether job is done
+        '''
+        mydfs_ = self._Mydfs
+
+        replicas = collections.OrderedDict()  # {real path of root: os.stat_result}
+        for _, root in mydfs_._Roots:
+            try:
+                with mydfs_._slot(root):
+                    stat_ = os.lstat(root + path)
+
+            except FileNotFoundError:
+                continue
+
+            if stat.S_ISREG(stat_.st_mode):
+                replicas[root] = stat_
+
+        if len(replicas) == 0:  # removed or replaced meanwhile
+            self.Stats['jobsDropped'] += 1
+            return True
+
+        sources = [root for root in replicas if root not in drops] or list(replicas)
+        source = sources[0]
+        sourcePath = source + path
+        stat_ = replicas[source]
+
+        copies = [root for _, root in mydfs_._Roots if root in targets and root not in replicas]
+
+        tempPaths = []
+        try:
+            n = 0
+            for root in copies:
+                tempPath = self._get_temp_path(root)
+                tempPaths.append(tempPath)
+                n += mydfs.copying.copy_file(sourcePath, tempPath, limiter=self._Limiter,
+                                             slot=lambda: mydfs_._slots([source, root]))
+
+            with mydfs_._FileHandleLock:
+                nStat = os.lstat(sourcePath)
+                if mydfs_._Writers[path] != 0 or (nStat.st_mtime_ns, nStat.st_size) != (stat_.st_mtime_ns,
+                                                                                        stat_.st_size):
+                    self.Stats['aborted'] += 1
+                    return False
+
+                for root, tempPath in zip(copies, tempPaths):
+                    targetPath = root + path
+                    mydfs_._ensure_directory(targetPath)
+                    try:
+                        os.link(tempPath, targetPath)
+
+                    except FileExistsError:  # created meanwhile
+                        self.Stats['conflicts'] += 1
+                        continue
+
+                    replicas[root] = nStat
+                    self.Stats['copies'] += 1
+
+                removes = [root for root in drops if root in replicas]
+                if len(removes) != 0:
+                    if all(root in drops for root in replicas):
+                        log.warning('not removing last replicas of %s', repr(path))
+                        self.Stats['dropsSkipped'] += 1
+
+                    else:
+                        for root in removes:
+                            os.unlink(root + path)
+                            self.Stats['drops'] += 1
+
+        finally:
+            for tempPath in tempPaths:
+                os.unlink(tempPath)
+
+        mydfs_.invalidate(path)
+        self.Stats['copiedBytes'] += n
+        return True
+
+    def _get_temp_path(self, root):
+        dirPath = ospath.join(root, mydfs.STATE_NAME, 'replication')
+        os.makedirs(dirPath, exist_ok=True)
+        return ospath.join(dirPath, uuid.uuid4().hex)
@@ -0,0 +1,365 @@
+'''
+Repairs diverged replicas, see `mydfs.Mydfs.readdir`, by copying an authoritative replica over the others.
+'''
+
+import mydfs
+import mydfs.cli
+import mydfs.copying
+import mydfs.throttle
+import os
+import stat
+import json
+import threading
+import collections
+import concurrent.futures
+import argparse
+import logging
+import uuid
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+POLICIES = ('newest', 'largest', 'root')
+
+# path without mask, (character, path) of source, [(character, path)] of targets
+Copy = collections.namedtuple('Copy', ['Path', 'Source', 'Targets'])
+
+
+class Resync:
+    '''
+    Walks the merged namespace depth-first and re-replicates diverged files in parallel.
+
+    Completed directories, including their subdirectories, are appended to the progress file and skipped when run
+    again.
+    Directories with failed copies, and their parents, aren't completed.
+    The progress file is compacted after each run and removed once the run completed.
+    '''
+
+    def __init__(self, mydfs_, policy='newest', rootCharacter=None, jobs=4, rate=None, progressPath=None,
+                 dryRun=False):
+        '''
+        @param mydfs_        `mydfs.Mydfs`
+        @param policy        str; one of `POLICIES`
+        @param rootCharacter None or str; character of authoritative root for policy 'root', falls back to 'newest'
+        @param jobs          int; number of parallel copies
+        @param rate          None or float; maximum bytes per second written per root
+        @param progressPath  None or str; path of progress file
+        @param dryRun        bool; only report copies
+        '''
+        if policy not in POLICIES:
+            raise ValueError('invalid policy {}'.format(repr(policy)))
+        if policy == 'root' and rootCharacter is None:
+            raise ValueError('policy \'root\' requires root character')
+
+        self.Mydfs = mydfs_
+        self.Policy = policy
+        self.RootCharacter = rootCharacter
+        self.Jobs = jobs
+        self.ProgressPath = progressPath
+        self.DryRun = dryRun
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Limiters = {root: mydfs.throttle.RateLimiter(rate) for _, root in mydfs_._Roots}
+        self._Lock = threading.Lock()
+        self._Done = set()  # {path of directory}
+        self._Pending = {}  # {path of directory: number of pending copies and directories + 1}
+        self._Failed = set()  # {path of directory}, with failed copies in subtree
+        self._ProgressFile = None
+
+    def run(self, path='/'):
+        '''
+        - loads progress
+        - walks directories depth-first
+          - scans directory, see `mydfs.Mydfs._scan`
+          - for all diverged files
+            - submits copy
+        - waits for copies
+        - compacts or removes progress file
+
+        @param path str; path of directory to start at
+        @return collections.Counter; stats
+        '''
+        self._load_progress()
+        self._Failed.clear()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.Jobs) as executor:
+            stack = [(path, None)]
+            while len(stack) != 0:
+                dirPath, parentPath = stack.pop()
+                if dirPath in self._Done:
+                    self._count('directoriesSkipped')
+                    if parentPath is not None:
+                        self._finish(parentPath)
+
+                    continue
+
+                dirNames, copies = self._scan(dirPath)
+                self._count('directories')
+
+                with self._Lock:
+                    self._Pending[dirPath] = len(copies) + len(dirNames) + 1
+
+                for copy in copies:
+                    executor.submit(self._copy, copy, dirPath)
+
+                for name in sorted(dirNames, reverse=True):
+                    stack.append((ospath.join(dirPath, name), dirPath))
+
+                self._finish(dirPath)  # scan
+
+        if self._ProgressFile is not None:
+            self._ProgressFile.close()
+            self._ProgressFile = None
+            self._compact_progress(path)
+
+        return self.Stats
+
+    def _scan(self, dirPath):
+        '''
+        - scans directory, see `mydfs.Mydfs._scan`
+        - for all names with more than one file id
+          - chooses authoritative file id
+          - targets are all roots with other file ids
+        '''
+        mydfs_ = self.Mydfs
+        dirNames, fileIds, _ = mydfs_._scan(dirPath)
+
+        versions = {}  # {name: {file id: [index of root]}}
+        for index, fIds in enumerate(fileIds):
+            for fileId in fIds:
+                name, _, _ = fileId
+                versions.setdefault(name, {}).setdefault(fileId, []).append(index)
+
+        r = []
+        for name, fIds in versions.items():
+            if len(fIds) < 2:
+                continue
+
+            self._count('diverged')
+            fileId = self._choose(fIds)
+
+            path = ospath.join(dirPath, name)
+            character, root = mydfs_._Roots[fIds[fileId][0]]
+            source = (character, root + path)
+            targets = [mydfs_._Roots[index] for fId, indices in fIds.items() if fId != fileId for index in indices]
+            r.append(Copy(path, source, [(character, root + path) for character, root in targets]))
+
+        return dirNames, r
+
+    def _choose(self, fileIds):
+        '''
+        @param fileIds {file id: [index of root]}
+        @return file id
+        '''
+        if self.Policy == 'root':
+            for fileId, indices in fileIds.items():
+                if any(self.Mydfs._Roots[index][0] == self.RootCharacter for index in indices):
+                    return fileId
+
+        if self.Policy == 'largest':
+            return max(fileIds, key=lambda fileId: (fileId[2], fileId[1]))
+
+        return max(fileIds, key=lambda fileId: (fileId[1], fileId[2]))
+
+    def _copy(self, copy, dirPath):
+        done = False
+        try:
+            done = self._copy_replicas(copy)
+
+        except OSError as e:
+            self._count('errors')
+            log.warning('resync of %s failed: %s', repr(copy.Path), e)
+
+        except Exception:
+            self._count('errors')
+            log.exception('resync of %s failed', repr(copy.Path))
+
+        self._finish(dirPath, done)
+
+    def _count(self, name, n=1):
+        with self._Lock:
+            self.Stats[name] += n
+
+    def _copy_replicas(self, copy):
+        '''
+        - if source or any target isn't a regular file
+          - skips
+        - for all targets
+          - copies source to temporary file in root, skipping holes
+        - if source unchanged
+          - replaces targets by temporary files
+        - removes remaining temporary files
+
+        @param copy `Copy`
+        @return bool; whether replicas are in sync or can't be, i.e. skipped
+        '''
+        sourceCharacter, sourcePath = copy.Source
+
+        stat_ = os.lstat(sourcePath)
+        if not (stat.S_ISREG(stat_.st_mode) and all(stat.S_ISREG(os.lstat(p).st_mode) for _, p in copy.Targets)):
+            self._count('skipped')
+            log.info('skip %s: not a regular file', repr(copy.Path))
+            return True
+
+        log.info('copy %s from %s to %s', repr(copy.Path), sourceCharacter,
+                 ''.join(character for character, _ in copy.Targets))
+        if self.DryRun:
+            return True
+
+        roots = dict(self.Mydfs._Roots)
+        tempPaths = []
+        try:
+            for character, _ in copy.Targets:
+                root = roots[character]
+                dirPath = ospath.join(root, mydfs.STATE_NAME, 'resync')
+                os.makedirs(dirPath, exist_ok=True)
+                tempPath = ospath.join(dirPath, uuid.uuid4().hex)
+                tempPaths.append(tempPath)
+
+                n = mydfs.copying.copy_file(sourcePath, tempPath, limiter=self._Limiters[root], sparse=True)
+
+                self._count('copiedBytes', n)
+
+            nStat = os.lstat(sourcePath)
+            if (nStat.st_mtime_ns, nStat.st_size) != (stat_.st_mtime_ns, stat_.st_size):
+                self._count('changed')
+                log.warning('skip %s: changed during copy', repr(copy.Path))
+                return False
+
+            for (_, targetPath), tempPath in zip(copy.Targets, tempPaths):
+                os.replace(tempPath, targetPath)
+
+            tempPaths.clear()
+
+        finally:
+            for tempPath in tempPaths:
+                os.unlink(tempPath)
+
+        self._count('copies', len(copy.Targets))
+        return True
+
+    def _finish(self, dirPath, done=True):
+        '''
+        - decrements pending count of directory
+        - while count of directory is zero
+          - if no copy failed in directory or subdirectories
+            - marks directory as done
+          - continues with parent
+
+        @param dirPath str
+        @param done    bool; whether the finished copy succeeded
+        '''
+        with self._Lock:
+            if not done:
+                self._Failed.add(dirPath)
+
+            while True:
+                self._Pending[dirPath] -= 1
+                if self._Pending[dirPath] != 0:
+                    break
+
+                del self._Pending[dirPath]
+                failed = dirPath in self._Failed
+                if not failed:
+                    self._write_progress(dirPath)
+
+                parentPath = ospath.dirname(dirPath)
+                if parentPath == dirPath or parentPath not in self._Pending:
+                    break
+
+                if failed:
+                    self._Failed.add(parentPath)
+
+                dirPath = parentPath
+
+    def _load_progress(self):
+        if self.ProgressPath is None:
+            return
+
+        self._Done.clear()
+
+        if ospath.exists(self.ProgressPath):
+            with open(self.ProgressPath) as f:
+                for line in f:
+                    try:
+                        self._Done.add(json.loads(line))
+
+                    except ValueError:  # partially written line
+                        continue
+
+        self._ProgressFile = open(self.ProgressPath, 'a')
+
+    def _write_progress(self, dirPath):
+        if self._ProgressFile is None or self.DryRun:
+            return
+
+        self._ProgressFile.write(json.dumps(dirPath) + '\n')
+        self._ProgressFile.flush()
+        self._Done.add(dirPath)
+
+    def _compact_progress(self, path):
+        '''
+        - if directory of run is done
+          - removes it and directories below from progress
+        - removes directories below other done directories
+        - rewrites progress file or, if empty, removes it
+
+        @param path str; path of directory the run started at
+        '''
+        if self.DryRun:
+            return
+
+        done = set(self._Done)
+        if path in done:
+            done = {p for p in done if not (p == path or p.startswith(path.rstrip('/') + '/'))}
+
+        paths = sorted(p for p in done if not any(q in done for q in _get_parents(p)))
+        if len(paths) == 0:
+            os.unlink(self.ProgressPath)
+            return
+
+        tempPath = self.ProgressPath + '.tmp'
+        with open(tempPath, 'w') as f:
+            for p in paths:
+                f.write(json.dumps(p) + '\n')
+
+        os.replace(tempPath, self.ProgressPath)
+
+
+def _get_parents(path):
+    '''
+    @param path str
+    @return iter(str); parent directories, up to `/`
+    '''
+    while True:
+        parentPath = ospath.dirname(path)
+        if parentPath == path:
+            return
+
+        yield parentPath
+        path = parentPath
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs resync', description=__doc__.strip())
+
+    parser.add_argument('--policy', choices=POLICIES, default='newest', help='Policy to choose authoritative replica')
+    parser.add_argument('--root', metavar='character', default=None, help='Authoritative root for policy \'root\'')
+    parser.add_argument('--jobs', type=int, default=4, help='Number of parallel copies')
+    parser.add_argument('--rate', type=float, default=None, help='Maximum MB/s written per root')
+    parser.add_argument('--progress', metavar='path', default=None, help='Path of progress file to resume from')
+    parser.add_argument('--path', default='/', help='Directory to start at')
+    parser.add_argument('-n', '--dry-run', action='store_true', default=False, help='Only report copies')
+    mydfs.cli.add_roots_argument(parser)
+
+    args = parser.parse_args(arguments)
+
+    resync = Resync(mydfs.Mydfs(mydfs.cli.parse_roots(args.roots)), policy=args.policy, rootCharacter=args.root,
+                    jobs=args.jobs, rate=None if args.rate is None else args.rate * 2**20, progressPath=args.progress,
+                    dryRun=args.dry_run)
+    stats = resync.run(args.path)
+
+    print(json.dumps(dict(stats), sort_keys=True))
+    return 1 if stats['errors'] != 0 else 0
@@ -0,0 +1,325 @@
+'''
+Scheduling of I/O on roots, see `mydfs.Mydfs._slot`.
+
+Each root has a limited number of slots, chosen by device type: few for rotational disks, which thrash on seeks, and
+many for solid state drives.
+Foreground operations take precedence over background work, see `set_priority`: a slot which becomes free goes to the
+oldest waiting foreground operation, and only if there is none to the oldest background operation.
+
+A slot should only be held for system calls on its root.
+Slots of the same root are reentrant per thread; slots of multiple roots must be taken at once, see `Scheduler.slots`,
+to avoid deadlocks.
+'''
+
+import mydfs.stats
+import os
+import threading
+import collections
+import contextlib
+import logging
+import math
+import time
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+FOREGROUND = 0
+BACKGROUND = 1  # e.g. `mydfs.tiering`, `mydfs.dirty` and `mydfs.scrub`
+PRIORITY_NAMES = ('foreground', 'background')
+
+
+class _ThreadState(threading.local):
+    Priority = FOREGROUND
+
+    def __init__(self):
+        self.Held = {}  # {_Queue: number of slots}
+
+
+_Local = _ThreadState()
+
+
+def set_priority(priority):
+    '''
+    Sets priority of I/O by the current thread.
+
+    @param priority int; `FOREGROUND` or `BACKGROUND`
+    '''
+    _Local.Priority = priority
+
+
+def get_priority():
+    '''
+    @return int; priority of I/O by the current thread, `FOREGROUND` by default
+    '''
+    return _Local.Priority
+
+
+def is_rotational(path):
+    '''
+    Reads the rotational flag of the block device, or the disk of the partition, containing path from sysfs.
+
+    @param path str
+    @return None or bool; None if unknown, e.g. tmpfs, network or multi-device file systems
+    '''
+    dev = os.stat(path).st_dev
+    dirPath = '/sys/dev/block/{}:{}'.format(os.major(dev), os.minor(dev))
+
+    for p in (ospath.join(dirPath, 'queue', 'rotational'), ospath.join(dirPath, '..', 'queue', 'rotational')):
+        try:
+            with open(p) as file:
+                return file.read().strip() == '1'
+
+        except OSError:
+            continue
+
+    return None
+
+
+class Scheduler:
+    '''
+    Limits concurrent I/O per root with strict priority of foreground operations.
+    '''
+
+    def __init__(self, concurrency=None, rotationalConcurrency=2, nonRotationalConcurrency=32):
+        '''
+        @param concurrency              None or int; slots per root of unknown device type, None for unlimited
+        @param rotationalConcurrency    int; slots per root on rotational disks
+        @param nonRotationalConcurrency int; slots per root on solid state drives
+        '''
+        self.Concurrency = concurrency
+        self.RotationalConcurrency = rotationalConcurrency
+        self.NonRotationalConcurrency = nonRotationalConcurrency
+
+        self._Lock = threading.Lock()  # for `.configure`
+        self._Queues = {}  # {real path of root: _Queue}
+        self._Rotational = {}  # {real path of root: None or bool}
+        self._Statistics = None  # mydfs.stats.Statistics
+        self._Characters = {}  # {real path of root: character}
+
+    def start(self, mydfs_):
+        '''
+        - for all roots
+          - gets device type
+          - creates queue with corresponding number of slots
+
+        Until started, slots are unlimited.
+        '''
+        self._Statistics = mydfs_.Statistics
+        self._Characters = dict(mydfs_._Characters)
+
+        for character, root in mydfs_._Roots:
+            try:
+                rotational = is_rotational(root)
+
+            except OSError as e:
+                log.warning('device type of root %s unknown: %s', character, e)
+                rotational = None
+
+            self._Rotational[root] = rotational
+            concurrency = self._get_concurrency(rotational)
+            log.info('root %s: %s, %s slots', character,
+                     {None: 'unknown device', True: 'rotational', False: 'non-rotational'}[rotational],
+                     'unlimited' if concurrency is None else concurrency)
+
+            self._Queues[root] = None if concurrency is None else _Queue(concurrency)
+
+    def configure(self, **attributes):
+        '''
+        Changes numbers of slots, e.g. at runtime, see `mydfs.control`.
+
+        Operations which wait for a slot get one as soon as there is room, and operations which hold a slot keep it.
+
+        @param attributes {str: None or int}; values of `Concurrency`, `RotationalConcurrency` or
+                          `NonRotationalConcurrency`
+        @return None
+        '''
+        for name, value in attributes.items():
+            if name not in ('Concurrency', 'RotationalConcurrency', 'NonRotationalConcurrency'):
+                raise ValueError('unknown attribute {}'.format(repr(name)))
+            if value is None and name != 'Concurrency':
+                raise ValueError('{} must not be None'.format(name))
+            if value is not None and value < 1:
+                raise ValueError('{} must be at least 1'.format(name))
+
+        with self._Lock:
+            for name, value in attributes.items():
+                setattr(self, name, value)
+
+            for root, rotational in self._Rotational.items():
+                concurrency = self._get_concurrency(rotational)
+                queue = self._Queues[root]
+                if queue is None:
+                    if concurrency is not None:
+                        self._Queues[root] = _Queue(concurrency)
+
+                    continue
+
+                if concurrency is None:
+                    self._Queues[root] = None
+
+                queue.set_concurrency(concurrency)
+
+    def _get_concurrency(self, rotational):
+        return (self.Concurrency if rotational is None else
+                self.RotationalConcurrency if rotational else self.NonRotationalConcurrency)
+
+    def slot(self, root, priority=None):
+        '''
+        @param root     str; real path of root
+        @param priority None or int; see `get_priority` if None
+        @return context manager
+        '''
+        return _Slot(self, self._Queues.get(root, None), root, _Local.Priority if priority is None else priority)
+
+    @contextlib.contextmanager
+    def slots(self, roots, priority=None):
+        '''
+        Takes slots of multiple roots in a fixed order.
+
+        @param roots    iter(str); real paths of roots
+        @param priority None or int; see `.slot`
+        @return context manager
+        '''
+        with contextlib.ExitStack() as stack:
+            for root in sorted(set(roots)):
+                stack.enter_context(self.slot(root, priority=priority))
+
+            yield
+
+    @property
+    def Stats(self):
+        '''
+        @return {str: int}; operations, queued operations, wait times and queue depths per priority
+        '''
+        r = collections.Counter()
+
+        for queue in self._Queues.values():
+            if queue is None:
+                continue
+
+            with queue.Lock:
+                for priority, name in enumerate(PRIORITY_NAMES):
+                    waitTimes = queue.WaitTimes[priority]
+                    r[name + 'Ops'] += queue.Ops[priority]
+                    r[name + 'Queued'] += sum(waitTimes.Counts)
+                    r[name + 'WaitNs'] += waitTimes.Sum
+                    r[name + 'QueueDepth'] += len(queue.Waiting[priority])
+                    r[name + 'WaitP99Ns'] = max(r[name + 'WaitP99Ns'], waitTimes.get_quantile(0.99) or 0)
+
+                r['running'] += queue.Running
+                r['maxQueueDepth'] = max(r['maxQueueDepth'], queue.MaxDepth)
+
+        return r
+
+    def _record_wait(self, root, priority, duration):
+        self._Statistics.add(self._Characters[root], PRIORITY_NAMES[priority] + 'Queued')
+        self._Statistics.add(self._Characters[root], PRIORITY_NAMES[priority] + 'WaitNs', duration)
+
+
+class _Queue:
+    '''
+    Slots of a root and waiting operations per priority.
+
+    Free slots are handed over to waiting operations directly, so operations wait only if all slots are taken.
+    '''
+
+    def __init__(self, concurrency):
+        self.Concurrency = concurrency
+
+        self.Lock = threading.Lock()
+        self.Running = 0
+        self.Waiting = tuple(collections.deque() for _ in PRIORITY_NAMES)  # per priority, [threading.Lock]
+        self.Ops = [0] * len(PRIORITY_NAMES)
+        self.WaitTimes = tuple(mydfs.stats.Histogram() for _ in PRIORITY_NAMES)  # ns
+        self.MaxDepth = 0
+
+    def acquire(self, priority):
+        '''
+        @param priority int
+        @return int; ns waited
+        '''
+        with self.Lock:
+            self.Ops[priority] += 1
+            if self.Running < self.Concurrency:
+                self.Running += 1
+                return 0
+
+            waiter = threading.Lock()
+            waiter.acquire()
+            self.Waiting[priority].append(waiter)
+            self.MaxDepth = max(self.MaxDepth, sum(len(waiting) for waiting in self.Waiting))
+
+        start = time.perf_counter_ns()
+        waiter.acquire()  # released with slot, see `.release`
+        r = time.perf_counter_ns() - start
+
+        with self.Lock:
+            self.WaitTimes[priority].add(r)
+
+        return r
+
+    def release(self):
+        with self.Lock:
+            if self.Running <= self.Concurrency:  # else shrunk, see `.set_concurrency`
+                for waiting in self.Waiting:  # in order of priority
+                    if len(waiting) != 0:
+                        waiting.popleft().release()
+                        return
+
+            self.Running -= 1
+
+    def set_concurrency(self, concurrency):
+        '''
+        - sets number of slots
+        - hands free slots to waiting operations
+
+        @param concurrency None or int; None for unlimited
+        '''
+        with self.Lock:
+            self.Concurrency = math.inf if concurrency is None else concurrency
+
+            for waiting in self.Waiting:  # in order of priority
+                while len(waiting) != 0 and self.Running < self.Concurrency:
+                    waiting.popleft().release()
+                    self.Running += 1
+
+
+class _Slot:
+    __slots__ = ('Scheduler', 'Queue', 'Root', 'Priority', 'Taken')
+
+    def __init__(self, scheduler, queue, root, priority):
+        self.Scheduler = scheduler
+        self.Queue = queue
+        self.Root = root
+        self.Priority = priority
+        self.Taken = False
+
+    def __enter__(self):
+        queue = self.Queue
+        if queue is None:
+            return self
+
+        held = _Local.Held
+        n = held.get(queue, 0)
+        if n == 0:
+            duration = queue.acquire(self.Priority)
+            if duration != 0:
+                self.Scheduler._record_wait(self.Root, self.Priority, duration)
+
+            self.Taken = True
+
+        held[queue] = n + 1
+        return self
+
+    def __exit__(self, type, value, traceback):
+        queue = self.Queue
+        if queue is None:
+            return
+
+        if self.Taken:
+            del _Local.Held[queue]
+            queue.release()
+
+        else:
+            _Local.Held[queue] -= 1
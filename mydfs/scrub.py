@@ -0,0 +1,274 @@
+'''
+Scrubbing: verifies that replicas which are supposed to be identical, see `mydfs.Mydfs.readdir`, have the same content.
+'''
+
+import mydfs
+import mydfs.cli
+import mydfs.scheduler
+import mydfs.throttle
+import os
+import json
+import sqlite3
+import threading
+import collections
+import argparse
+import hashlib
+import logging
+import time
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 2**22
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scrub (
+    path TEXT PRIMARY KEY,
+    replicas TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    detail TEXT,
+    checked REAL NOT NULL
+)
+'''  # replicas = JSON [[character, device, inode, modification time, size]]
+
+
+class Scrubber:
+    '''
+    Reads all replicas of shared files block by block and compares block hashes.
+
+    Results are stored per file with the identity of its replicas, so files are skipped until a replica changes or
+    the result is older than `maxAge`.
+    Skipped files with stored mismatches are reported again, without reading them.
+    '''
+
+    def __init__(self, statePath, rate=None, blockSize=BLOCK_SIZE, interval=None, maxAge=None):
+        '''
+        @param statePath str; path of sqlite database with results
+        @param rate      None or float; maximum bytes per second read
+        @param blockSize int
+        @param interval  None or float; seconds between background runs, None for no background runs
+        @param maxAge    None or float; seconds after which verified files are checked again
+        '''
+        self.StatePath = statePath
+        self.BlockSize = blockSize
+        self.Interval = interval
+        self.MaxAge = maxAge
+
+        self.Stats = collections.Counter()  # {name: count}
+        self.Mismatches = []  # [(path, detail)] of last run
+
+        self._Limiter = mydfs.throttle.RateLimiter(rate)
+        self._Thread = None
+        self._Stop = threading.Event()
+
+    def start(self, mydfs_):
+        if self.Interval is None:
+            return
+
+        self._Stop.clear()
+        self._Thread = threading.Thread(target=self._run, args=(mydfs_, ), name='mydfs-scrub', daemon=True)
+        self._Thread.start()
+
+    def stop(self):
+        if self._Thread is None:
+            return
+
+        self._Stop.set()
+        self._Thread.join()
+        self._Thread = None
+
+    def run(self, mydfs_, path='/'):
+        '''
+        - walks directories
+          - scans directory, see `mydfs.Mydfs._scan`
+          - for all files with same file id in more than one root
+            - if replicas changed or result is too old
+              - checks replicas, see `._check`
+              - stores result
+
+        @param mydfs_ `mydfs.Mydfs`
+        @param path   str; path of directory to start at
+        @return collections.Counter; stats
+        '''
+        self.Mismatches = []
+
+        os.makedirs(ospath.dirname(ospath.abspath(self.StatePath)), exist_ok=True)
+        connection = sqlite3.connect(self.StatePath)
+        try:
+            connection.execute(_SCHEMA)
+
+            stack = [path]
+            while len(stack) != 0 and not self._Stop.is_set():
+                dirPath = stack.pop()
+                dirNames, fileIds, _ = mydfs_._scan(dirPath)
+
+                stack.extend(ospath.join(dirPath, name) for name in sorted(dirNames, reverse=True))
+
+                roots = {}  # {file id: [(character, root)]}
+                for (character, root), fIds in zip(mydfs_._Roots, fileIds):
+                    for fileId in fIds:
+                        roots.setdefault(fileId, []).append((character, root))
+
+                for (name, _, _), fileRoots in sorted(roots.items()):
+                    if len(fileRoots) < 2:
+                        continue
+                    if self._Stop.is_set():
+                        break
+
+                    try:
+                        self._scrub(mydfs_, connection, ospath.join(dirPath, name), fileRoots)
+
+                    except OSError as e:
+                        self.Stats['errors'] += 1
+                        log.warning('scrub of %s failed: %s', repr(ospath.join(dirPath, name)), e)
+
+        finally:
+            connection.close()
+
+        return self.Stats
+
+    def _run(self, mydfs_):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        while not self._Stop.wait(self.Interval):
+            try:
+                self.run(mydfs_)
+
+            except Exception:
+                log.exception('scrub run failed')
+
+    def _scrub(self, mydfs_, connection, path, roots):
+        '''
+        - if stored result is for same replicas and recent enough
+          - if mismatch
+            - reports stored mismatch
+          - skips
+        - checks replicas
+        - if replicas unchanged
+          - stores result
+        '''
+        replicas = self._get_replicas(path, roots)
+
+        row = connection.execute('SELECT replicas, ok, detail, checked FROM scrub WHERE path = ?',
+                                 (path, )).fetchone()
+        if row is not None:
+            storedReplicas, ok, detail, checked = row
+            if json.loads(storedReplicas) == replicas and (self.MaxAge is None or time.time() - checked < self.MaxAge):
+                if not ok:
+                    self._report(path, None if detail is None else json.loads(detail))
+
+                self.Stats['filesSkipped'] += 1
+                return
+
+        ok, detail = self._check([root + path for _, root in roots], lambda index: mydfs_._slot(roots[index][1]))
+        if detail is not None:
+            detail['differing'] = [roots[i][0] for i in detail['differing']]
+
+        if self._get_replicas(path, roots) != replicas:  # modified during check
+            self.Stats['filesChanged'] += 1
+            return
+
+        if not ok:
+            self._report(path, detail)
+
+        connection.execute('INSERT OR REPLACE INTO scrub VALUES (?, ?, ?, ?, ?)',
+                           (path, json.dumps(replicas), int(ok), None if detail is None else json.dumps(detail),
+                            time.time()))
+        connection.commit()
+
+        self.Stats['files'] += 1
+
+    def _report(self, path, detail):
+        self.Stats['mismatches'] += 1
+        self.Mismatches.append((path, detail))
+        log.warning('replicas of %s differ: %s', repr(path), detail)
+
+    def _get_replicas(self, path, roots):
+        r = []
+
+        for character, root in roots:
+            stat_ = os.lstat(root + path)
+            r.append([character, stat_.st_dev, stat_.st_ino, stat_.st_mtime_ns, stat_.st_size])
+
+        return r
+
+    def _check(self, paths, slot):
+        '''
+        - opens replicas
+        - for all blocks
+          - waits for limiter
+          - reads block of all replicas, dropping it from page cache
+          - hashes blocks
+          - if hashes differ
+            - returns offset and indices of replicas which differ from majority
+
+        @param paths [str]; paths of replicas
+        @param slot  function(int) -> context manager; by index of replica, see `mydfs.Mydfs._slot`
+        @return bool, None or {str: any}; whether equal and details
+        '''
+        fileHandles = []
+        try:
+            for path in paths:
+                fileHandles.append(os.open(path, os.O_RDONLY))
+
+            offset = 0
+            while True:
+                self._Limiter.acquire(self.BlockSize * len(fileHandles))
+
+                digests = []
+                n = 0
+                for index, fileHandle in enumerate(fileHandles):
+                    with slot(index):
+                        data = os.pread(fileHandle, self.BlockSize, offset)
+                        os.posix_fadvise(fileHandle, offset, len(data), os.POSIX_FADV_DONTNEED)
+
+                    digests.append(hashlib.blake2b(data, digest_size=16).digest())
+                    n = max(n, len(data))
+
+                self.Stats['bytes'] += n * len(fileHandles)
+
+                if len(set(digests)) != 1:
+                    majority, _ = collections.Counter(digests).most_common(1)[0]
+                    differing = [i for i, digest in enumerate(digests) if digest != majority]
+                    return False, {'offset': offset, 'differing': differing}
+
+                if n == 0:
+                    break
+
+                offset += n
+
+        finally:
+            for fileHandle in fileHandles:
+                os.close(fileHandle)
+
+        return True, None
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs scrub', description=__doc__.strip())
+
+    parser.add_argument('--state', metavar='path', default=None,
+                        help='Path of database with results, default in state directory of first root')
+    parser.add_argument('--rate', type=float, default=None, help='Maximum MB/s read')
+    parser.add_argument('--max-age', type=float, default=None, help='Days after which verified files are checked again')
+    parser.add_argument('--path', default='/', help='Directory to start at')
+    mydfs.cli.add_roots_argument(parser)
+
+    args = parser.parse_args(arguments)
+
+    roots = mydfs.cli.parse_roots(args.roots)
+    statePath = args.state
+    if statePath is None:
+        _, root = roots[0]
+        statePath = ospath.join(root, mydfs.STATE_NAME, 'scrub.sqlite')
+
+    scrubber = Scrubber(statePath, rate=None if args.rate is None else args.rate * 2**20,
+                        maxAge=None if args.max_age is None else args.max_age * 86400)
+    stats = scrubber.run(mydfs.Mydfs(roots), args.path)
+
+    for path, detail in scrubber.Mismatches:
+        print(json.dumps({'path': path, **detail}))
+
+    print(json.dumps(dict(stats), sort_keys=True))
+    return 1 if stats['mismatches'] != 0 or stats['errors'] != 0 else 0
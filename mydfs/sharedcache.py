@@ -0,0 +1,298 @@
+'''
+Metadata cache in shared memory, used by all mounts on the host, see `mydfs.Mydfs._lstat`.
+
+Entries are results of `os.lstat` keyed by real path of replica, so mounts with different but overlapping roots share
+them.
+The table has a fixed layout: a header followed by slots, each slot holding one entry selected by hash of path.
+
+There is no lock across processes.
+Instead, each slot has a generation counter which is odd while the slot is written, and a checksum.
+Torn or inconsistent entries are treated as missing.
+Each slot also holds the time of its last invalidation, outside of the entry, so fills which started before it are
+refused and entries which raced past the check are treated as expired.
+The epoch in the header invalidates all entries at once, e.g. on rename of directories.
+'''
+
+import os
+import stat
+import errno
+import struct
+import hashlib
+import zlib
+import random
+import time
+import collections
+import multiprocessing.resource_tracker
+import multiprocessing.shared_memory
+
+MAGIC = b'MYDFSSHM'
+VERSION = 2
+
+_HEADER = struct.Struct('<8sHHIQ')  # magic, version, slot size, reserved, number of slots
+_EPOCH = struct.Struct('<Q')
+_EPOCH_OFFSET = _HEADER.size
+_HEADER_SIZE = 64
+
+_GENERATION = struct.Struct('<Q')
+_CHECKSUM = struct.Struct('<Q')
+_INVALIDATED = struct.Struct('<Q')  # time of last invalidation in ns
+_INVALIDATED_OFFSET = _GENERATION.size + _CHECKSUM.size
+# epoch, key, time of fill in ns, exists, mode, nlink, uid, gid, size, ino, dev, atime, mtime and ctime in ns
+_BODY = struct.Struct('<QQqB7xIIIIqQQqqq')
+_BODY_OFFSET = _INVALIDATED_OFFSET + _INVALIDATED.size
+_KEY = struct.Struct('<Q')
+_KEY_OFFSET = _BODY_OFFSET + 8
+_SLOT = struct.Struct('<QQQ' + _BODY.format[1:])
+_SLOT_SIZE = _SLOT.size
+
+
+class SharedCache:
+    '''
+    Hash table of `os.stat_result` or inexistence per path in shared memory.
+
+    A lookup costs a few µs, so the cache pays off if `os.lstat` on roots is slower, e.g. on network filesystems or
+    disks with cold metadata.
+
+    The shared memory persists until it is removed, e.g. `rm /dev/shm/mydfs`.
+    '''
+
+    def __init__(self, name='mydfs', nSlots=2**18, ttl=10.):
+        '''
+        - creates or attaches to shared memory
+
+        @param name   str; name of shared memory
+        @param nSlots int; number of entries, if created
+        @param ttl    float; seconds an entry stays valid, bounds staleness after changes outside of mounts
+        '''
+        self.Name = name
+        self.Ttl = ttl
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        size = _HEADER_SIZE + nSlots * _SLOT_SIZE
+        try:
+            self._Memory = _open_shared_memory(name, True, size)
+            _HEADER.pack_into(self._Memory.buf, 0, MAGIC, VERSION, _SLOT_SIZE, 0, nSlots)
+
+        except FileExistsError:
+            self._Memory = _open_shared_memory(name, False, 0)
+            nSlots = self._read_header()
+
+        self.NSlots = nSlots
+        self._Buffer = self._Memory.buf
+        self._TtlNs = int(ttl * 1e9)
+
+    def _read_header(self):
+        '''
+        - waits for creator to write header
+        - validates header
+
+        @return int; number of slots
+        '''
+        for _ in range(100):
+            magic, version, slotSize, _, nSlots = _HEADER.unpack_from(self._Memory.buf, 0)
+            if magic != bytes(len(MAGIC)):
+                break
+
+            time.sleep(0.01)
+
+        if magic != MAGIC or version != VERSION or slotSize != _SLOT_SIZE:
+            raise ValueError('shared memory {} is not a compatible cache'.format(repr(self.Name)))
+
+        if self._Memory.size < _HEADER_SIZE + nSlots * _SLOT_SIZE:
+            raise ValueError('shared memory {} is too small'.format(repr(self.Name)))
+
+        return nSlots
+
+    def start(self, mydfs_):
+        pass
+
+    def stop(self):
+        self._Buffer = None
+        self._Memory.close()
+
+    def set_ttl(self, ttl):
+        '''
+        @param ttl float; see `.__init__`
+        '''
+        self.Ttl = ttl
+        self._TtlNs = int(ttl * 1e9)
+
+    def get(self, path):
+        '''
+        @param path str; real path of replica
+        @return None, False or `os.stat_result`; None if unknown, False if inexistent
+        '''
+        key = _get_key(path)
+        offset = self._get_offset(key)
+        buffer = self._Buffer
+
+        slot = buffer[offset:(offset + _SLOT_SIZE)].tobytes()
+        generation, checksum, invalidated, epoch, slotKey, fillTime, exists, *attributes = _SLOT.unpack(slot)
+        if slotKey != key:
+            self.Stats['misses'] += 1
+            return None
+
+        if (generation & 1 == 1 or _GENERATION.unpack_from(buffer, offset)[0] != generation
+                or checksum != zlib.crc32(slot[_BODY_OFFSET:])):  # being written
+            self.Stats['torn'] += 1
+            return None
+
+        if (epoch != _EPOCH.unpack_from(buffer, _EPOCH_OFFSET)[0] or fillTime + self._TtlNs < time.monotonic_ns()
+                or fillTime <= invalidated):
+            self.Stats['expired'] += 1
+            return None
+
+        self.Stats['hits'] += 1
+
+        if not exists:
+            return False
+
+        mode, nlink, uid, gid, size, ino, dev, atime, mtime, ctime = attributes
+        r = os.stat_result((mode, ino, dev, nlink, uid, gid, size, atime // 10**9, mtime // 10**9, ctime // 10**9,
+                            atime / 1e9, mtime / 1e9, ctime / 1e9, atime, mtime, ctime))
+        return r
+
+    def put(self, path, stat_, fillTime):
+        '''
+        - refuses if slot was invalidated after `fillTime`, as `stat_` may be outdated
+
+        @param path     str; real path of replica
+        @param stat_    None or `os.stat_result`; None if inexistent
+        @param fillTime int; `time.monotonic_ns` before `os.lstat`
+        '''
+        if stat_ is None:
+            attributes = (False, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        else:
+            attributes = (True, stat_.st_mode, stat_.st_nlink, stat_.st_uid, stat_.st_gid, stat_.st_size, stat_.st_ino,
+                          stat_.st_dev, stat_.st_atime_ns, stat_.st_mtime_ns, stat_.st_ctime_ns)
+
+        key = _get_key(path)
+        invalidated, = _INVALIDATED.unpack_from(self._Buffer, self._get_offset(key) + _INVALIDATED_OFFSET)
+        if fillTime <= invalidated:
+            self.Stats['refused'] += 1
+            return
+
+        epoch, = _EPOCH.unpack_from(self._Buffer, _EPOCH_OFFSET)
+        self._write(key, _BODY.pack(epoch, key, fillTime, *attributes))
+        self.Stats['fills'] += 1
+
+    def invalidate(self, path):
+        '''
+        - records time of invalidation in slot, also if not cached, as a fill may be in progress
+        - removes entry
+
+        @param path str; real path of replica
+        '''
+        key = _get_key(path)
+        offset = self._get_offset(key)
+        invalidated, = _INVALIDATED.unpack_from(self._Buffer, offset + _INVALIDATED_OFFSET)
+        _INVALIDATED.pack_into(self._Buffer, offset + _INVALIDATED_OFFSET, max(invalidated, time.monotonic_ns()))
+
+        slotKey, = _KEY.unpack_from(self._Buffer, offset + _KEY_OFFSET)
+        if slotKey != key:  # not cached
+            return
+
+        self._write(key, bytes(_BODY.size))
+        self.Stats['invalidations'] += 1
+
+    def flush(self):
+        '''
+        Invalidates all entries.
+        '''
+        epoch, = _EPOCH.unpack_from(self._Buffer, _EPOCH_OFFSET)
+        newEpoch = random.getrandbits(64)  # concurrent flushes result in different epochs
+        while newEpoch == epoch:
+            newEpoch = random.getrandbits(64)
+
+        _EPOCH.pack_into(self._Buffer, _EPOCH_OFFSET, newEpoch)
+        self.Stats['flushes'] += 1
+
+    def _write(self, key, body):
+        '''
+        - makes generation odd
+        - writes checksum and body
+        - makes generation even
+        '''
+        offset = self._get_offset(key)
+        buffer = self._Buffer
+
+        generation, = _GENERATION.unpack_from(buffer, offset)
+        generation |= 1
+        _GENERATION.pack_into(buffer, offset, generation)
+        _CHECKSUM.pack_into(buffer, offset + _GENERATION.size, zlib.crc32(body))
+        buffer[(offset + _BODY_OFFSET):(offset + _SLOT_SIZE)] = body
+        _GENERATION.pack_into(buffer, offset, (generation + 1) & 0xffffffffffffffff)
+
+    def _get_offset(self, key):
+        return _HEADER_SIZE + (key % self.NSlots) * _SLOT_SIZE
+
+
+def lstat(cache, path):
+    '''
+    `os.lstat` using cache.
+
+    @param cache `SharedCache`
+    @param path  str
+    @return `os.stat_result`
+    '''
+    r = cache.get(path)
+    if r is False:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+    if r is None:
+        fillTime = time.monotonic_ns()
+        try:
+            r = os.lstat(path)
+
+        except FileNotFoundError:
+            cache.put(path, None, fillTime)
+            raise
+
+        cache.put(path, r, fillTime)
+
+    return r
+
+
+def exists(cache, path):
+    '''
+    `os.path.exists` using cache.
+
+    @param cache `SharedCache`
+    @param path  str
+    @return bool
+    '''
+    try:
+        stat_ = lstat(cache, path)
+
+    except (OSError, ValueError):
+        return False
+
+    if stat.S_ISLNK(stat_.st_mode):  # entries don't follow links
+        return os.path.exists(path)
+
+    return True
+
+
+def _get_key(path):
+    '''
+    @param path str
+    @return int; 0 < key < 2**64
+    '''
+    r = int.from_bytes(hashlib.blake2b(os.fsencode(path), digest_size=8).digest(), 'little') or 1
+    return r
+
+
+def _open_shared_memory(name, create, size):
+    '''
+    Opens shared memory without tracking, which would remove it at exit of the process.
+    '''
+    try:
+        return multiprocessing.shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+
+    except TypeError:  # before Python 3.13
+        pass
+
+    r = multiprocessing.shared_memory.SharedMemory(name=name, create=create, size=size)
+    multiprocessing.resource_tracker.unregister(r._name, 'shared_memory')
+    return r
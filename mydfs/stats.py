@@ -0,0 +1,194 @@
+'''
+Statistics of operations, served as virtual files, see `mydfs.Mydfs.getattr`.
+'''
+
+import json
+import threading
+import collections
+import re
+
+N_BUCKETS = 65  # bucket i contains values v with v.bit_length() == i, i.e. 2**(i - 1) <= v < 2**i
+
+
+class Histogram:
+    '''
+    Counts of values in buckets of powers of two.
+    '''
+
+    def __init__(self):
+        self.Counts = [0] * N_BUCKETS
+        self.Sum = 0
+
+    def add(self, value):
+        self.Counts[value.bit_length()] += 1
+        self.Sum += value
+
+    def get_quantile(self, q):
+        '''
+        @param q float; 0 <= q <= 1
+        @return None or int; upper bound of bucket containing quantile
+        '''
+        total = sum(self.Counts)
+        if total == 0:
+            return None
+
+        n = 0
+        for i, count in enumerate(self.Counts):
+            n += count
+            if q * total <= n:
+                return 2**i
+
+        return 2**(N_BUCKETS - 1)
+
+
+class _Op:
+    __slots__ = ('Count', 'Errors', 'Bytes', 'Latency')
+
+    def __init__(self):
+        self.Count = 0
+        self.Errors = 0
+        self.Bytes = 0
+        self.Latency = Histogram()  # ns
+
+
+class Statistics:
+    '''
+    Counts, errors, bytes and latency histograms per operation, and counters per root.
+    '''
+
+    def __init__(self):
+        self._Lock = threading.Lock()
+        self._Ops = {}  # {op: _Op}
+        self._Roots = collections.defaultdict(collections.Counter)  # {character: {name: count}}
+
+    def record(self, op, duration, errno, result):
+        '''
+        @param op       str
+        @param duration int; in ns
+        @param errno    int; 0 if successful
+        @param result   any; bytes read or number of bytes written
+        '''
+        with self._Lock:
+            stats = self._Ops.get(op, None)
+            if stats is None:
+                stats = self._Ops[op] = _Op()
+
+            stats.Count += 1
+            stats.Latency.add(duration)
+
+            if errno != 0:
+                stats.Errors += 1
+
+            elif op == 'read' and isinstance(result, bytes):
+                stats.Bytes += len(result)
+
+            elif op == 'write' and isinstance(result, int):
+                stats.Bytes += result
+
+    def add(self, character, name, n=1):
+        '''
+        Increments counter of root.
+
+        @param character str; character of root
+        @param name      str
+        @param n         int
+        '''
+        with self._Lock:
+            self._Roots[character][name] += n
+
+    def get(self, sources):
+        '''
+        @param sources {str: {str: int}}; further counters by name, e.g. `mydfs.tiering.Tiering.Stats`
+        @return {str: any}
+        '''
+        with self._Lock:
+            ops = {}
+            for op, stats in sorted(self._Ops.items()):
+                latency = stats.Latency
+                ops[op] = {
+                    'count': stats.Count,
+                    'errors': stats.Errors,
+                    'bytes': stats.Bytes,
+                    'latency': {
+                        'sum': latency.Sum,
+                        'p50': latency.get_quantile(0.5),
+                        'p90': latency.get_quantile(0.9),
+                        'p99': latency.get_quantile(0.99),
+                        'buckets': {2**i: count for i, count in enumerate(latency.Counts) if count != 0},
+                    },
+                }
+
+            roots = {character: dict(counter) for character, counter in sorted(self._Roots.items())}
+
+        r = {'ops': ops, 'roots': roots}
+        for name, counter in sources.items():
+            r[name] = dict(counter)
+
+        return r
+
+    def to_json(self, sources):
+        '''
+        @param sources see `.get`
+        @return bytes
+        '''
+        return (json.dumps(self.get(sources), indent=2, sort_keys=True) + '\n').encode()
+
+    def to_prometheus(self, sources):
+        '''
+        @param sources see `.get`
+        @return bytes; in Prometheus text format, latencies in seconds
+        '''
+        stats = self.get(sources)
+        lines = []
+
+        def _add(name, type, samples):
+            lines.append('# TYPE {} {}'.format(name, type))
+            for labels, value in samples:
+                lines.append('{}{} {}'.format(name, _format_labels(labels), value))
+
+        ops = stats['ops']
+        _add('mydfs_ops_total', 'counter', [({'op': op}, s['count']) for op, s in ops.items()])
+        _add('mydfs_op_errors_total', 'counter', [({'op': op}, s['errors']) for op, s in ops.items()])
+        _add('mydfs_op_bytes_total', 'counter', [({'op': op}, s['bytes']) for op, s in ops.items()])
+
+        samples = []
+        for op, s in ops.items():
+            latency = s['latency']
+            n = 0
+            for bound, count in latency['buckets'].items():
+                n += count
+                samples.append(({'op': op, 'le': repr(bound / 1e9)}, n))
+
+            samples.append(({'op': op, 'le': '+Inf'}, n))
+
+        lines.append('# TYPE mydfs_op_latency_seconds histogram')
+        for labels, value in samples:
+            lines.append('mydfs_op_latency_seconds_bucket{} {}'.format(_format_labels(labels), value))
+        for op, s in ops.items():
+            lines.append('mydfs_op_latency_seconds_sum{} {}'.format(_format_labels({'op': op}),
+                                                                   repr(s['latency']['sum'] / 1e9)))
+            lines.append('mydfs_op_latency_seconds_count{} {}'.format(_format_labels({'op': op}), s['count']))
+
+        names = sorted({name for counter in stats['roots'].values() for name in counter})
+        for name in names:
+            _add('mydfs_root_{}_total'.format(_snake_case(name)), 'counter',
+                 [({'root': character}, counter[name]) for character, counter in stats['roots'].items()
+                  if name in counter])
+
+        for source in sources:
+            for name, value in sorted(stats[source].items()):
+                _add('mydfs_{}_{}'.format(_snake_case(source), _snake_case(name)), 'untyped', [({}, value)])
+
+        return ('\n'.join(lines) + '\n').encode()
+
+
+def _format_labels(labels):
+    if len(labels) == 0:
+        return ''
+
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels.items()))
+
+
+def _snake_case(name):
+    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', name).lower()
@@ -0,0 +1,343 @@
+'''
+Striped layout: fixed-size chunks of a file are spread round-robin across member files in several roots.
+
+member file = header + chunks `index`, `index + width`, `index + 2 * width`, ...
+'''
+
+import os
+import errno
+import struct
+import collections
+
+ospath = os.path
+
+MEMBER_PREFIX = '.mydfs~'  # prefix of base name of member files
+MASK_SEPARATOR = '~'  # separator between mask and name for striped files, instead of '_'
+
+HEADER_SIZE = 4096  # keeps chunks page aligned
+_HEADER = struct.Struct('<8sIHH')  # magic, chunk size, width, index
+_MAGIC = b'MYDFSSTR'
+
+Layout = collections.namedtuple('Layout', ['ChunkSize', 'Width', 'Index'])
+
+
+def get_member_path(path):
+    '''
+    @param path str; path without mask
+    @return str; path of member file relative to root
+    '''
+    dirPath, name = ospath.split(path)
+    return ospath.join(dirPath, MEMBER_PREFIX + name)
+
+
+def is_member_path(path):
+    return ospath.basename(path).startswith(MEMBER_PREFIX)
+
+
+def write_layout(fileHandle, layout):
+    header = _HEADER.pack(_MAGIC, *layout)
+    os.pwrite(fileHandle, header + bytes(HEADER_SIZE - len(header)), 0)
+
+
+def read_layout(fileHandle):
+    '''
+    @param fileHandle int
+    @return Layout
+    '''
+    header = os.pread(fileHandle, _HEADER.size, 0)
+    if len(header) != _HEADER.size:
+        raise OSError(errno.EIO, 'truncated stripe header')
+
+    magic, *layout = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        raise OSError(errno.EIO, 'invalid stripe header')
+
+    return Layout(*layout)
+
+
+def read_layout_from_path(path):
+    fileHandle = os.open(path, os.O_RDONLY)
+    try:
+        return read_layout(fileHandle)
+
+    finally:
+        os.close(fileHandle)
+
+
+def get_size(memberSizes, chunkSize, width):
+    '''
+    Computes the size of the striped file from the sizes of its members.
+
+    @param memberSizes iter(int); sizes of member files ordered by index
+    @param chunkSize   int
+    @param width       int
+    @return int
+    '''
+    r = 0
+
+    for index, memberSize in enumerate(memberSizes):
+        n = memberSize - HEADER_SIZE
+        if n <= 0:
+            continue
+
+        nChunks, rest = divmod(n, chunkSize)
+        if rest == 0:
+            nChunks -= 1
+            rest = chunkSize
+
+        r = max(r, (nChunks * width + index) * chunkSize + rest)
+
+    return r
+
+
+def get_member_size(size, layout):
+    '''
+    Inverse of `get_size` for one member.
+
+    @param size   int; size of the striped file
+    @param layout Layout
+    @return int; size of member file
+    '''
+    nChunks, rest = divmod(size, layout.ChunkSize)
+    n = nChunks // layout.Width + (1 if layout.Index < nChunks % layout.Width else 0)
+    r = HEADER_SIZE + n * layout.ChunkSize + (rest if nChunks % layout.Width == layout.Index else 0)
+    return r
+
+
+def get_segments(offset, length, chunkSize, width):
+    '''
+    Splits a range of the striped file at chunk boundaries.
+
+    @param offset    int
+    @param length    int
+    @param chunkSize int
+    @param width     int
+    @return {int: [(int, int, int)]}; {member index: [(offset in member, length, offset in range)]}
+    '''
+    r = {}
+
+    position = offset
+    end = offset + length
+    while position < end:
+        chunk, chunkOffset = divmod(position, chunkSize)
+        n = min(chunkSize - chunkOffset, end - position)
+
+        memberOffset = HEADER_SIZE + (chunk // width) * chunkSize + chunkOffset
+        r.setdefault(chunk % width, []).append((memberOffset, n, position - offset))
+
+        position += n
+
+    return r
+
+
+class Stripe:
+    '''
+    Open striped file.
+
+    The size of the file is cached per handle and updated by its writes and truncations; reads beyond it check the
+    members again, for writes through other handles.
+    Truncations through other handles or by path must be followed by `.invalidate`.
+    '''
+
+    def __init__(self, fileHandles, chunkSize):
+        '''
+        @param fileHandles [int]; file handles of member files ordered by index
+        @param chunkSize   int
+        '''
+        self.FileHandles = fileHandles
+        self.ChunkSize = chunkSize
+
+        self._Size = None  # None or int; cached size of the striped file
+
+    def get_size(self):
+        r = self._Size
+        if r is None:
+            r = get_size((os.fstat(fileHandle).st_size for fileHandle in self.FileHandles), self.ChunkSize,
+                         len(self.FileHandles))
+            self._Size = r
+
+        return r
+
+    def invalidate(self):
+        '''
+        Drops cached size.
+        '''
+        self._Size = None
+
+    def read(self, size, offset, executor, slot=None):
+        '''
+        - if range exceeds cached size
+          - drops cached size
+        - limits range to end of file
+        - for all members in parallel
+          - reads segments into buffer, leaving holes zeroed
+
+        @param size     int
+        @param offset   int
+        @param executor `concurrent.futures.Executor`
+        @param slot     None or function(int) -> context manager; held per member, see `mydfs.scheduler`
+        @return bytes
+        '''
+        if self.get_size() < offset + size:  # might have grown through other handles
+            self.invalidate()
+
+        size = max(0, min(size, self.get_size() - offset))
+        buffer = bytearray(size)
+
+        def _read(index, segments):
+            fileHandle = self.FileHandles[index]
+            for memberOffset, n, bufferOffset in segments:
+                data = os.pread(fileHandle, n, memberOffset)
+                buffer[bufferOffset:(bufferOffset + len(data))] = data
+
+        self._run(_read, get_segments(offset, size, self.ChunkSize, len(self.FileHandles)), executor, slot)
+        return bytes(buffer)
+
+    def write(self, data, offset, executor, slot=None):
+        '''
+        - for all members in parallel
+          - writes segments
+        - updates cached size
+
+        @param data     bytes
+        @param offset   int
+        @param executor `concurrent.futures.Executor`
+        @param slot     see `.read`
+        @return int; number of bytes written
+        '''
+        view = memoryview(data)
+
+        def _write(index, segments):
+            fileHandle = self.FileHandles[index]
+            for memberOffset, n, dataOffset in segments:
+                m = 0
+                while m < n:
+                    m += os.pwrite(fileHandle, view[(dataOffset + m):(dataOffset + n)], memberOffset + m)
+
+        self._run(_write, get_segments(offset, len(view), self.ChunkSize, len(self.FileHandles)), executor, slot)
+
+        size = self._Size
+        if size is not None:
+            self._Size = max(size, offset + len(view))
+
+        return len(view)
+
+    def truncate(self, length):
+        self._Size = None
+
+        width = len(self.FileHandles)
+        for index, fileHandle in enumerate(self.FileHandles):
+            os.ftruncate(fileHandle, get_member_size(length, Layout(self.ChunkSize, width, index)))
+
+        self._Size = length
+
+    def _run(self, function, segmentsByIndex, executor, slot):
+        if slot is not None:
+            _function = function
+
+            def function(index, segments):
+                with slot(index):
+                    _function(index, segments)
+
+        if len(segmentsByIndex) == 1:  # no need for threads
+            (index, segments), = segmentsByIndex.items()
+            function(index, segments)
+            return
+
+        futures = [executor.submit(function, index, segments) for index, segments in segmentsByIndex.items()]
+        for future in futures:
+            future.result()
+
+
+def open_stripe(paths, flags, mode, chunkSize):
+    '''
+    Opens or creates member files.
+
+    - for all member paths
+      - opens member without truncation or appending
+      - if new
+        - writes header with index in order of `paths`
+      - reads header
+    - orders members by index
+    - if truncation requested
+      - truncates members to headers
+    - if error
+      - for all files opened in reverse order
+        - closes file
+      - raises error
+
+    @param paths     [str]; paths of member files
+    @param flags     int; see `os.open`
+    @param mode      int; see `os.open`
+    @param chunkSize int; chunk size of new stripes
+    @return [int], Stripe; file handles in order of `paths` and stripe
+    '''
+    readOnly = (flags & os.O_ACCMODE) == os.O_RDONLY and not (flags & (os.O_CREAT | os.O_TRUNC))
+    nFlags = (flags & ~(os.O_TRUNC | os.O_APPEND | os.O_ACCMODE)) | (os.O_RDONLY if readOnly else os.O_RDWR)
+
+    fileHandles = []
+    try:
+        layouts = []
+        for index, path in enumerate(paths):
+            fileHandle = os.open(path, nFlags, mode)
+            fileHandles.append(fileHandle)
+
+            if os.fstat(fileHandle).st_size == 0:
+                layout = Layout(chunkSize, len(paths), index)
+                write_layout(fileHandle, layout)
+
+            else:
+                layout = read_layout(fileHandle)
+
+            layouts.append(layout)
+
+        if any(layout.Width != len(paths) or layout.ChunkSize != layouts[0].ChunkSize for layout in layouts):
+            raise OSError(errno.EIO, 'incomplete or inconsistent stripe')
+
+        members = [None] * len(paths)
+        for fileHandle, layout in zip(fileHandles, layouts):
+            members[layout.Index] = fileHandle
+
+        if None in members:
+            raise OSError(errno.EIO, 'duplicate stripe member')
+
+        r = Stripe(members, layouts[0].ChunkSize)
+
+        if flags & os.O_TRUNC:
+            r.truncate(0)
+
+    except Exception:
+        for fileHandle in reversed(fileHandles):
+            os.close(fileHandle)
+
+        raise
+
+    return fileHandles, r
+
+
+def get_stat_size(paths):
+    '''
+    @param paths [str]; paths of member files
+    @return int; size of the striped file
+    '''
+    memberSizes = [None] * len(paths)
+    chunkSize = None
+
+    for path in paths:
+        layout = read_layout_from_path(path)
+        if layout.Width != len(paths):
+            raise OSError(errno.EIO, 'incomplete stripe')
+
+        memberSizes[layout.Index] = os.lstat(path).st_size
+        chunkSize = layout.ChunkSize
+
+    if None in memberSizes:
+        raise OSError(errno.EIO, 'incomplete stripe')
+
+    return get_size(memberSizes, chunkSize, len(paths))
+
+
+def truncate(paths, length):
+    for path in paths:
+        layout = read_layout_from_path(path)
+        os.truncate(path, get_member_size(length, layout))
@@ -0,0 +1,85 @@
+'''
+Rate limiting for background work on roots.
+'''
+
+import threading
+import time
+
+
+class RateLimiter:
+    '''
+    Token bucket limiting the rate of units (bytes, operations) per second.
+    '''
+
+    def __init__(self, rate, burst=None):
+        '''
+        @param rate  None or float; units per second, None for unlimited
+        @param burst None or float; maximum number of units available at once, defaults to `rate`
+        '''
+        self.Rate = rate
+        self.Burst = rate if burst is None else burst
+
+        self._Lock = threading.Lock()
+        self._Tokens = self.Burst
+        self._Time = time.monotonic()
+
+    def set_rate(self, rate, burst=None):
+        '''
+        Changes rate, e.g. at runtime, see `mydfs.control`.
+
+        @param rate  None or float; see `.__init__`
+        @param burst None or float; see `.__init__`
+        '''
+        with self._Lock:
+            self.Rate = rate
+            self.Burst = rate if burst is None else burst
+            self._Tokens = self.Burst
+            self._Time = time.monotonic()
+
+    def acquire(self, n=1):
+        '''
+        Waits until `n` units are available.
+
+        - acquires lock
+        - refills tokens
+        - takes tokens, possibly going into debt
+        - sleeps until debt is paid
+
+        @param n float; number of units
+        @return None
+        '''
+        if self.Rate is None:
+            return
+
+        with self._Lock:
+            now = time.monotonic()
+            self._Tokens = min(self.Burst, self._Tokens + (now - self._Time) * self.Rate)
+            self._Time = now
+
+            self._Tokens -= n
+            delay = -self._Tokens / self.Rate
+
+        if 0 < delay:
+            time.sleep(delay)
+
+    def try_acquire(self, n=1):
+        '''
+        Takes `n` units if available.
+
+        @param n float; number of units
+        @return bool; True if taken
+        '''
+        if self.Rate is None:
+            return True
+
+        with self._Lock:
+            now = time.monotonic()
+            self._Tokens = min(self.Burst, self._Tokens + (now - self._Time) * self.Rate)
+            self._Time = now
+
+            if self._Tokens < n:
+                return False
+
+            self._Tokens -= n
+
+        return True
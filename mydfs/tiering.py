@@ -0,0 +1,430 @@
+'''
+Hot/cold tiering: promotes frequently accessed files to a fast root and evicts them when they cool down.
+
+Promoted files and their heats are kept in the state directory of the fast root, so they are evicted after remount.
+'''
+
+import mydfs.copying
+import mydfs.scheduler
+import mydfs.throttle
+import os
+import stat
+import threading
+import collections
+import logging
+import json
+import time
+import uuid
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+
+class Tiering:
+    '''
+    Tracks access heat per file and moves replicas between the fast root and the other roots in the background.
+
+    heat = number of accesses, decaying exponentially with `halfLife`
+    '''
+
+    def __init__(self, fastCharacter, promoteHeat=8., evictHeat=1., halfLife=600., interval=10., rate=None,
+                 maxMoves=16, reserve=0.1):
+        '''
+        @param fastCharacter str; character of the fast root
+        @param promoteHeat   float; minimum heat for promotion
+        @param evictHeat     float; heat below which promoted files are evicted
+        @param halfLife      float; seconds until heat halves
+        @param interval      float; seconds between promotion/eviction runs
+        @param rate          None or float; maximum bytes per second copied
+        @param maxMoves      int; maximum number of promotions and evictions per run
+        @param reserve       float; fraction of the fast root to keep free
+        '''
+        self.FastCharacter = fastCharacter
+        self.PromoteHeat = promoteHeat
+        self.EvictHeat = evictHeat
+        self.HalfLife = halfLife
+        self.Interval = interval
+        self.MaxMoves = maxMoves
+        self.Reserve = reserve
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Limiter = mydfs.throttle.RateLimiter(rate)
+        self._Lock = threading.Lock()
+        self._Heats = {}  # {path: (heat, time)}
+        self._Promoted = set()  # {path}
+        self._Changed = False  # whether promoted files changed since last save
+
+        self._Mydfs = None
+        self._FastRoot = None
+        self._StatePath = None
+        self._Thread = None
+        self._Stop = threading.Event()
+
+    def touch(self, path, n=1.):
+        '''
+        Records access.
+
+        @param path str; path without mask
+        @param n    float; amount of heat to add
+        @return None
+        '''
+        now = time.monotonic()
+
+        with self._Lock:
+            heat, t = self._Heats.get(path, (0., now))
+            self._Heats[path] = (self._decay(heat, now - t) + n, now)
+
+    def order(self, paths):
+        '''
+        Moves the fast replica to the front so it serves reads.
+
+        @param paths [(str, str)]; see `mydfs.Mydfs._resolve`
+        @return [(str, str)]
+        '''
+        for i, (root, _) in enumerate(paths):
+            if root == self._FastRoot:
+                if i != 0:
+                    paths = [paths[i]] + paths[:i] + paths[(i + 1):]
+
+                break
+
+        return paths
+
+    def start(self, mydfs_):
+        '''
+        Loads promoted files and starts background thread.
+
+        @param mydfs_ `mydfs.Mydfs`
+        @return None
+        '''
+        for character, root in mydfs_._Roots:
+            if character == self.FastCharacter:
+                break
+
+        else:
+            raise ValueError('no root for character {}'.format(repr(self.FastCharacter)))
+
+        self._Mydfs = mydfs_
+        self._FastRoot = root
+        self._StatePath = ospath.join(root, mydfs.STATE_NAME, 'tiering.promoted')
+        self._load()
+
+        self._Stop.clear()
+        self._Thread = threading.Thread(target=self._run, name='mydfs-tiering', daemon=True)
+        self._Thread.start()
+
+    def stop(self):
+        if self._Thread is None:
+            return
+
+        self._Stop.set()
+        self._Thread.join()
+        self._Thread = None
+
+        self._save()
+
+    def run_once(self):
+        '''
+        - decays heats and forgets cold files
+        - evicts promoted files which are cold
+        - evicts coldest promoted files while fast root is short of space
+        - promotes hottest files while fast root has space
+        '''
+        now = time.monotonic()
+
+        with self._Lock:
+            heats = {}
+            for path, (heat, t) in self._Heats.items():
+                heat = self._decay(heat, now - t)
+                if heat < 0.01 and path not in self._Promoted:
+                    continue
+
+                heats[path] = heat
+
+            self._Heats = {path: (heat, now) for path, heat in heats.items()}
+            promoted = set(self._Promoted)
+
+        nMoves = 0
+
+        evicts = sorted(promoted, key=lambda path: heats.get(path, 0.))
+        for path in evicts:
+            if self.MaxMoves <= nMoves:
+                break
+            if self.EvictHeat <= heats.get(path, 0.) and self.Reserve <= self._get_free_fraction(0):
+                break
+
+            self._try(self._evict, path)
+            nMoves += 1
+
+        promotes = sorted((path for path, heat in heats.items() if self.PromoteHeat <= heat and path not in promoted),
+                          key=heats.get, reverse=True)
+        for path in promotes:
+            if self.MaxMoves <= nMoves:
+                break
+
+            self._try(self._promote, path)
+            nMoves += 1
+
+        self._save()
+
+    def _run(self):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        while not self._Stop.wait(self.Interval):
+            try:
+                self.run_once()
+
+            except Exception:
+                log.exception('tiering run failed')
+
+    def _try(self, function, path):
+        try:
+            function(path)
+
+        except OSError as e:
+            self.Stats['errors'] += 1
+            log.warning('tiering failed for %s: %s', repr(path), e)
+
+    def _promote(self, path):
+        '''
+        - if fast replica exists
+          - returns
+        - copies first regular replica to temporary file on fast root
+        - acquires lock of Mydfs
+        - if no writer and replica unchanged
+          - links temporary file to fast replica
+        - removes temporary file
+        '''
+        mydfs_ = self._Mydfs
+        fastPath = self._FastRoot + path
+
+        if ospath.lexists(fastPath):
+            return
+
+        for _, root in mydfs_._Roots:
+            if root == self._FastRoot:
+                continue
+
+            sourcePath = root + path
+            try:
+                stat_ = os.lstat(sourcePath)
+
+            except FileNotFoundError:
+                continue
+
+            if stat.S_ISREG(stat_.st_mode):
+                break
+
+        else:
+            return
+
+        if not self._has_space(stat_.st_size):
+            self.Stats['promotionsSkipped'] += 1
+            return
+
+        tempPath = self._get_temp_path(self._FastRoot)
+        try:
+            n = mydfs.copying.copy_file(sourcePath, tempPath, limiter=self._Limiter,
+                                        slot=lambda: mydfs_._slots([root, self._FastRoot]))
+
+            with mydfs_._FileHandleLock:
+                nStat = os.lstat(sourcePath)
+                if mydfs_._Writers[path] != 0 or (nStat.st_mtime_ns, nStat.st_size) != (stat_.st_mtime_ns,
+                                                                                        stat_.st_size):
+                    self.Stats['promotionsAborted'] += 1
+                    return
+
+                mydfs_._ensure_directory(fastPath)
+                os.link(tempPath, fastPath)
+
+        finally:
+            os.unlink(tempPath)
+
+        with self._Lock:
+            self._Promoted.add(path)
+            self._Changed = True
+
+        mydfs_.invalidate(path)
+        self.Stats['promotions'] += 1
+        self.Stats['promotedBytes'] += n
+
+    def _evict(self, path):
+        '''
+        - copies fast replica to other roots where replicas differ or, if there are none, to best root
+        - acquires lock of Mydfs
+        - if no writer and fast replica unchanged
+          - replaces replicas by copies
+          - removes fast replica
+        - removes remaining temporary files
+        '''
+        mydfs_ = self._Mydfs
+        fastPath = self._FastRoot + path
+
+        try:
+            stat_ = os.lstat(fastPath)
+
+        except FileNotFoundError:
+            with self._Lock:
+                self._Promoted.discard(path)
+                self._Changed = True
+            return
+
+        id_ = (stat_.st_mtime_ns, stat_.st_size)
+
+        targetPaths = []
+        copies = []
+        for _, root in mydfs_._Roots:
+            if root == self._FastRoot:
+                continue
+
+            targetPath = root + path
+            try:
+                nStat = os.lstat(targetPath)
+
+            except FileNotFoundError:
+                continue
+
+            targetPaths.append(targetPath)
+            if (nStat.st_mtime_ns, nStat.st_size) != id_:
+                copies.append((root, targetPath))
+
+        if len(targetPaths) == 0:
+            root, targetPath = self._get_best_root(path)
+            copies.append((root, targetPath))
+
+        tempPaths = []
+        try:
+            n = 0
+            for root, targetPath in copies:
+                tempPath = self._get_temp_path(root)
+                tempPaths.append(tempPath)
+                n += mydfs.copying.copy_file(fastPath, tempPath, limiter=self._Limiter,
+                                             slot=lambda: mydfs_._slots([self._FastRoot, root]))
+
+            with mydfs_._FileHandleLock:
+                nStat = os.lstat(fastPath)
+                if mydfs_._Writers[path] != 0 or (nStat.st_mtime_ns, nStat.st_size) != id_:
+                    self.Stats['evictionsAborted'] += 1
+                    return
+
+                for (_, targetPath), tempPath in zip(copies, tempPaths):
+                    mydfs_._ensure_directory(targetPath)
+                    os.replace(tempPath, targetPath)
+
+                tempPaths.clear()
+                os.unlink(fastPath)
+
+        finally:
+            for tempPath in tempPaths:
+                os.unlink(tempPath)
+
+        with self._Lock:
+            self._Promoted.discard(path)
+            self._Changed = True
+
+        mydfs_.invalidate(path)
+        self.Stats['evictions'] += 1
+        self.Stats['evictedBytes'] += n
+
+    def _load(self):
+        '''
+        - reads promoted files and their heats
+        - forgets files without fast replica, e.g. removed while unmounted
+        '''
+        if not ospath.exists(self._StatePath):
+            return
+
+        now = time.monotonic()
+        promoted = {}  # {path: heat}
+        with open(self._StatePath) as f:
+            for line in f:
+                try:
+                    path, heat = json.loads(line)
+
+                except ValueError:  # partially written line
+                    continue
+
+                if ospath.lexists(self._FastRoot + path):
+                    promoted[path] = heat
+
+        with self._Lock:
+            self._Promoted.update(promoted)
+            for path, heat in promoted.items():
+                self._Heats[path] = (heat, now)
+
+        self.Stats['promotedLoaded'] = len(promoted)
+
+    def _save(self):
+        '''
+        Writes promoted files and their heats, if changed.
+        '''
+        now = time.monotonic()
+
+        with self._Lock:
+            if not self._Changed:
+                return
+
+            heats = {}
+            for path in self._Promoted:
+                heat, t = self._Heats.get(path, (0., now))
+                heats[path] = self._decay(heat, now - t)
+
+            self._Changed = False
+
+        tempPath = self._StatePath + '.tmp'
+        try:
+            os.makedirs(ospath.dirname(self._StatePath), exist_ok=True)
+            with open(tempPath, 'w') as f:
+                for path, heat in heats.items():
+                    f.write(json.dumps([path, heat]) + '\n')
+
+            os.replace(tempPath, self._StatePath)
+
+        except OSError as e:
+            with self._Lock:
+                self._Changed = True  # retry on next run
+
+            self.Stats['errors'] += 1
+            log.warning('tiering failed to save promoted files: %s', e)
+
+    def _get_best_root(self, path):
+        '''
+        Finds the root, other than the fast root, with the longest existing parent directory.
+        '''
+        dirPath = ospath.dirname(path)
+        best = None
+
+        for _, root in self._Mydfs._Roots:
+            if root == self._FastRoot:
+                continue
+
+            p = dirPath
+            while not ospath.isdir(root + p):
+                p = ospath.dirname(p)
+
+            if best is None or len(best[1]) < len(p):
+                best = (root, p)
+
+        root, _ = best
+        return (root, root + path)
+
+    def _get_temp_path(self, root):
+        dirPath = ospath.join(root, mydfs.STATE_NAME, 'tiering')
+        os.makedirs(dirPath, exist_ok=True)
+        return ospath.join(dirPath, uuid.uuid4().hex)
+
+    def _has_space(self, size):
+        return self.Reserve <= self._get_free_fraction(size)
+
+    def _get_free_fraction(self, size):
+        stat_ = os.statvfs(self._FastRoot)
+        total = stat_.f_blocks * stat_.f_frsize
+        if total == 0:
+            return 1.
+
+        return (stat_.f_bavail * stat_.f_frsize - size) / total
+
+    def _decay(self, heat, duration):
+        return heat * 0.5**(duration / self.HalfLife)
@@ -0,0 +1,418 @@
+'''
+Operation traces: records operations dispatched to `mydfs.Mydfs` and replays them against local roots.
+'''
+
+import mydfs
+import mydfs.cli
+import struct
+import json
+import threading
+import collections
+import argparse
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'MYDFSTRC'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sH')
+_STRING = struct.Struct('<BIH')  # type, id, length
+_OPERATION = struct.Struct('<BIHqqhq')  # type, id of op, thread, start ns, duration ns, errno, result
+_STRING_TYPE = 0
+_OPERATION_TYPE = 1
+
+# argument tags
+_NONE = 0
+_INT = 1  # q
+_FLOAT = 2  # d
+_STR = 3  # I id of string
+_BYTES = 4  # I length, content isn't recorded
+_TUPLE = 5  # B length, followed by items
+
+_INT_ARGUMENT = struct.Struct('<Bq')
+_FLOAT_ARGUMENT = struct.Struct('<Bd')
+_SIZE_ARGUMENT = struct.Struct('<BI')
+_TUPLE_ARGUMENT = struct.Struct('<BB')
+
+NO_RESULT = -1
+
+OPEN_OPS = {'open', 'create', 'opendir'}  # ops which return file handles
+FILE_HANDLE_ARGUMENTS = {
+    'getattr': 1,
+    'read': 3,
+    'write': 3,
+    'truncate': 2,
+    'flush': 1,
+    'fsync': 2,
+    'release': 1,
+    'readdir': 1,
+    'releasedir': 1,
+    'fsyncdir': 2,
+}  # {op: index of argument}
+
+# op, index of thread, start and duration in ns, errno or 0, file handle or NO_RESULT, arguments
+Record = collections.namedtuple('Record', ['Op', 'Thread', 'Start', 'Duration', 'Errno', 'Result', 'Arguments'])
+
+
+class Recorder:
+    '''
+    Appends operations to a compact binary trace.
+
+    - strings, including names of ops, are written once and referenced by id
+    - content of writes isn't recorded, only its length
+    - records are buffered and written in blocks
+    '''
+
+    def __init__(self, path, bufferSize=2**20):
+        '''
+        @param path       str; path of trace file
+        @param bufferSize int; number of bytes to buffer before writing
+        '''
+        self.Path = path
+        self.BufferSize = bufferSize
+
+        self._Lock = threading.Lock()
+        self._Buffer = bytearray(_HEADER.pack(MAGIC, VERSION))
+        self._Strings = {}  # {str: id}
+        self._Threads = {}  # {thread ident: index}
+        self._Start = time.perf_counter_ns()
+        self._File = open(path, 'wb')
+
+    def record(self, op, arguments, start, duration, errno, result):
+        '''
+        @param op        str
+        @param arguments tuple
+        @param start     int; `time.perf_counter_ns()` at start
+        @param duration  int; in ns
+        @param errno     int; 0 if successful
+        @param result    any
+        '''
+        with self._Lock:
+            if self._File is None:
+                return
+
+            buffer = self._Buffer
+            thread = self._Threads.setdefault(threading.get_ident(), len(self._Threads))
+            result = result if op in OPEN_OPS and isinstance(result, int) else NO_RESULT
+
+            encodedArguments = bytearray()
+            for argument in arguments:
+                self._encode(argument, encodedArguments)
+
+            buffer += _OPERATION.pack(_OPERATION_TYPE, self._get_string_id(op), thread, start - self._Start, duration,
+                                      errno, result)
+            buffer += _SIZE_ARGUMENT.pack(len(arguments), len(encodedArguments))
+            buffer += encodedArguments
+
+            if self.BufferSize <= len(buffer):
+                self._File.write(buffer)
+                buffer.clear()
+
+    def close(self):
+        with self._Lock:
+            if self._File is None:
+                return
+
+            self._File.write(self._Buffer)
+            self._Buffer.clear()
+            self._File.close()
+            self._File = None
+
+    def _encode(self, argument, buffer):
+        if argument is None:
+            buffer.append(_NONE)
+
+        elif isinstance(argument, bool):
+            buffer += _INT_ARGUMENT.pack(_INT, int(argument))
+
+        elif isinstance(argument, int):
+            if not (-2**63 <= argument < 2**63):
+                buffer.append(_NONE)
+                return
+
+            buffer += _INT_ARGUMENT.pack(_INT, argument)
+
+        elif isinstance(argument, float):
+            buffer += _FLOAT_ARGUMENT.pack(_FLOAT, argument)
+
+        elif isinstance(argument, str):
+            buffer += _SIZE_ARGUMENT.pack(_STR, self._get_string_id(argument))
+
+        elif isinstance(argument, (bytes, bytearray, memoryview)):
+            buffer += _SIZE_ARGUMENT.pack(_BYTES, len(argument))
+
+        elif isinstance(argument, tuple) and len(argument) < 256:
+            buffer += _TUPLE_ARGUMENT.pack(_TUPLE, len(argument))
+            for item in argument:
+                self._encode(item, buffer)
+
+        else:  # e.g. fuse_file_info
+            buffer.append(_NONE)
+
+    def _get_string_id(self, string):
+        r = self._Strings.get(string, None)
+        if r is None:
+            r = self._Strings[string] = len(self._Strings)
+            data = string.encode('utf-8', 'surrogateescape')
+            self._Buffer += _STRING.pack(_STRING_TYPE, r, len(data))
+            self._Buffer += data
+
+        return r
+
+
+def read_trace(path):
+    '''
+    @param path str; path of trace file
+    @return iter(Record)
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a trace of version {}: {}'.format(VERSION, repr(path)))
+
+    strings = {}  # {id: str}
+    offset = _HEADER.size
+    while offset < len(data):
+        if data[offset] == _STRING_TYPE:
+            _, id, n = _STRING.unpack_from(data, offset)
+            offset += _STRING.size
+            strings[id] = data[offset:offset + n].decode('utf-8', 'surrogateescape')
+            offset += n
+            continue
+
+        _, op, thread, start, duration, errno, result = _OPERATION.unpack_from(data, offset)
+        offset += _OPERATION.size
+        nArguments, _ = _SIZE_ARGUMENT.unpack_from(data, offset)
+        offset += _SIZE_ARGUMENT.size
+
+        arguments = []
+        for _ in range(nArguments):
+            argument, offset = _decode(data, offset, strings)
+            arguments.append(argument)
+
+        yield Record(strings[op], thread, start, duration, errno, result, tuple(arguments))
+
+
+def _decode(data, offset, strings):
+    '''
+    @return any, int; argument and offset after it
+    '''
+    tag = data[offset]
+
+    if tag == _INT:
+        _, r = _INT_ARGUMENT.unpack_from(data, offset)
+        return r, offset + _INT_ARGUMENT.size
+
+    if tag == _FLOAT:
+        _, r = _FLOAT_ARGUMENT.unpack_from(data, offset)
+        return r, offset + _FLOAT_ARGUMENT.size
+
+    if tag == _STR:
+        _, id = _SIZE_ARGUMENT.unpack_from(data, offset)
+        return strings[id], offset + _SIZE_ARGUMENT.size
+
+    if tag == _BYTES:
+        _, n = _SIZE_ARGUMENT.unpack_from(data, offset)
+        return bytes(n), offset + _SIZE_ARGUMENT.size
+
+    if tag == _TUPLE:
+        _, n = _TUPLE_ARGUMENT.unpack_from(data, offset)
+        offset += _TUPLE_ARGUMENT.size
+        r = []
+        for _ in range(n):
+            item, offset = _decode(data, offset, strings)
+            r.append(item)
+
+        return tuple(r), offset
+
+    return None, offset + 1
+
+
+def summarize(latencies):
+    '''
+    @param latencies [int]; in ns
+    @return {str: float}; count and percentiles in µs
+    '''
+    latencies = sorted(latencies)
+    n = len(latencies)
+
+    r = {'n': n}
+    if n == 0:
+        return r
+
+    for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.)):
+        r[name] = latencies[min(n - 1, int(q * n))] / 1e3
+
+    return r
+
+
+class Replayer:
+    '''
+    Replays a trace with one thread per recorded thread.
+
+    File handles are translated from the trace to the replay. An operation on a file handle waits for the operation
+    which returned it.
+    '''
+
+    def __init__(self, mydfs_, records, paced=True, timeout=10.):
+        '''
+        @param mydfs_  `mydfs.Mydfs`
+        @param records iter(Record)
+        @param paced   bool; whether to keep the original pacing, otherwise as fast as possible
+        @param timeout float; seconds to wait for a file handle
+        '''
+        self.Mydfs = mydfs_
+        self.Paced = paced
+        self.Timeout = timeout
+
+        self.Latencies = collections.defaultdict(list)  # {op: [ns]}
+        self.RecordedLatencies = collections.defaultdict(list)  # {op: [ns]}
+        self.Errors = collections.Counter()  # {op: count}
+
+        self._Records = sorted(records, key=lambda record: record.Start)
+        self._Lock = threading.Lock()
+        self._Dependencies = {}  # {index of record: index of record returning the file handle}
+        self._FileHandles = {}  # {index of record: file handle or None}
+        self._Events = {}  # {index of record: threading.Event}
+
+        # file handles are reused, so uses are matched with the latest open which returned before
+        events = []  # [(time, is open, index of record)]
+        for index, record in enumerate(self._Records):
+            if record.Op in OPEN_OPS and record.Result != NO_RESULT:
+                events.append((record.Start + record.Duration, True, index))
+                self._Events[index] = threading.Event()
+
+            argumentIndex = FILE_HANDLE_ARGUMENTS.get(record.Op, None)
+            if argumentIndex is not None and argumentIndex < len(record.Arguments):
+                events.append((record.Start, False, index))
+
+        current = {}  # {recorded file handle: index of record}
+        for _, isOpen, index in sorted(events):
+            record = self._Records[index]
+            if isOpen:
+                current[record.Result] = index
+                continue
+
+            dependency = current.get(record.Arguments[FILE_HANDLE_ARGUMENTS[record.Op]], None)
+            if dependency is not None:
+                self._Dependencies[index] = dependency
+
+    def run(self):
+        '''
+        - starts one thread per recorded thread
+          - for all records of thread
+            - if paced
+              - waits until start relative to first record
+            - translates file handle
+            - calls op and measures latency
+        - waits for threads
+
+        @return {str: {str: {str: float}}}; {op: {'replayed': summary, 'recorded': summary}}, see `summarize`
+        '''
+        threads = collections.defaultdict(list)  # {index of thread: [index of record]}
+        for index, record in enumerate(self._Records):
+            if record.Op in ('init', 'destroy'):
+                continue
+
+            threads[record.Thread].append(index)
+
+        origin = self._Records[0].Start if len(self._Records) != 0 else 0
+        start = time.perf_counter_ns()
+
+        workers = [
+            threading.Thread(target=self._run, args=(indices, start - origin), name='mydfs-replay', daemon=True)
+            for indices in threads.values()
+        ]
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        r = {}
+        for op in sorted(set(self.Latencies) | set(self.RecordedLatencies)):
+            r[op] = {
+                'replayed': dict(summarize(self.Latencies[op]), errors=self.Errors[op]),
+                'recorded': summarize(self.RecordedLatencies[op]),
+            }
+
+        return r
+
+    def _run(self, indices, offset):
+        for index in indices:
+            record = self._Records[index]
+
+            if self.Paced:
+                delay = (record.Start + offset - time.perf_counter_ns()) / 1e9
+                if 0 < delay:
+                    time.sleep(delay)
+
+            arguments = list(record.Arguments)
+            dependency = self._Dependencies.get(index, None)
+            if dependency is not None:
+                if not self._Events[dependency].wait(self.Timeout):
+                    log.warning('file handle of %s %s not available', record.Op, repr(record.Arguments))
+
+                fileHandle = self._FileHandles.get(dependency, None)
+                if fileHandle is None:  # open failed
+                    with self._Lock:
+                        self.Errors[record.Op] += 1
+
+                    continue
+
+                arguments[FILE_HANDLE_ARGUMENTS[record.Op]] = fileHandle
+
+            result = None
+            failed = False
+            t = time.perf_counter_ns()
+            try:
+                result = self.Mydfs(record.Op, *arguments)
+
+            except OSError:  # including fuse.FuseOSError
+                failed = True
+
+            except Exception:
+                failed = True
+                log.exception('replay of %s %s failed', record.Op, repr(record.Arguments))
+
+            duration = time.perf_counter_ns() - t
+
+            event = self._Events.get(index, None)
+            if event is not None:
+                self._FileHandles[index] = None if failed else result
+                event.set()
+
+            with self._Lock:
+                self.Latencies[record.Op].append(duration)
+                if record.Errno == 0:
+                    self.RecordedLatencies[record.Op].append(record.Duration)
+                if failed:
+                    self.Errors[record.Op] += 1
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs replay', description=__doc__.strip())
+
+    parser.add_argument('--fast', action='store_true', default=False,
+                        help='Replay as fast as possible instead of with the original pacing')
+    parser.add_argument('trace', help='Path of trace file')
+    mydfs.cli.add_roots_argument(parser)
+
+    args = parser.parse_args(arguments)
+
+    mydfs_ = mydfs.Mydfs(mydfs.cli.parse_roots(args.roots))
+    replayer = Replayer(mydfs_, read_trace(args.trace), paced=not args.fast)
+
+    mydfs_.init('/')
+    try:
+        results = replayer.run()
+
+    finally:
+        mydfs_.destroy('/')
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
@@ -0,0 +1,194 @@
+'''
+Warm-up of caches after mount: crawls the merged namespace breadth-first in the background.
+
+Each directory is scanned in all roots in parallel, see `mydfs.Mydfs._scan`, which fills
+- the listing cache, if given, see `mydfs.listing`
+- the shared cache with attributes of all entries and inexistence in other roots, if given, see `mydfs.sharedcache`
+- the inode map with the names in the mount, if given, see `mydfs.inodes`
+- the caches of the file systems of roots, in any case
+
+Hot paths are crawled first, then the whole namespace, until the time or entry budget is exhausted.
+'''
+
+import mydfs
+import mydfs.scheduler
+import os
+import threading
+import concurrent.futures
+import collections
+import logging
+import time
+
+ospath = os.path
+
+log = logging.getLogger(__name__)
+
+
+class Warmup:
+    '''
+    Crawls once, in a background thread.
+    '''
+
+    def __init__(self, paths=(), maxSeconds=None, maxEntries=None, jobs=4):
+        '''
+        @param paths      iter(str); paths of hot directories, crawled first
+        @param maxSeconds None or float; time budget
+        @param maxEntries None or int; budget of directory entries
+        @param jobs       int; number of directories scanned in parallel
+        '''
+        self.Paths = [ospath.normpath('/' + path.lstrip('/')) for path in paths]
+        self.MaxSeconds = maxSeconds
+        self.MaxEntries = maxEntries
+        self.Jobs = jobs
+
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Lock = threading.Lock()  # for stats
+        self._Mydfs = None
+        self._Thread = None
+        self._Stop = threading.Event()
+        self._Deadline = None
+
+    def start(self, mydfs_):
+        '''
+        Starts background thread.
+
+        @param mydfs_ `mydfs.Mydfs`
+        @return None
+        '''
+        self._Mydfs = mydfs_
+
+        self._Stop.clear()
+        self._Thread = threading.Thread(target=self._run, name='mydfs-warmup', daemon=True)
+        self._Thread.start()
+
+    def stop(self):
+        if self._Thread is None:
+            return
+
+        self._Stop.set()
+        self._Thread.join()
+        self._Thread = None
+
+    def run(self):
+        '''
+        - for all hot paths, then root
+          - crawls tree breadth-first, skipping directories crawled before
+        '''
+        start = time.monotonic()
+        self._Deadline = None if self.MaxSeconds is None else start + self.MaxSeconds
+
+        executor = self._make_executor(self.Jobs, 'mydfs-warmup')
+        rootExecutor = self._make_executor(len(self._Mydfs._Roots) * self.Jobs, 'mydfs-warmup-root')
+        with executor, rootExecutor:
+            visited = set()
+            for path in self.Paths + ['/']:
+                if not self._crawl(path, visited, executor, rootExecutor):
+                    break
+
+        self.Stats['durationMs'] = int((time.monotonic() - start) * 1e3)
+        log.info('warm-up: %d directories, %d entries in %.1f s%s', self.Stats['directories'], self.Stats['entries'],
+                 self.Stats['durationMs'] / 1e3, ', budget exhausted' if self.Stats['exhausted'] else '')
+
+    def _run(self):
+        mydfs.scheduler.set_priority(mydfs.scheduler.BACKGROUND)
+
+        try:
+            self.run()
+
+        except Exception:
+            log.exception('warm-up failed')
+
+    def _make_executor(self, nWorkers, name):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=nWorkers, thread_name_prefix=name,
+                                                     initializer=mydfs.scheduler.set_priority,
+                                                     initargs=(mydfs.scheduler.BACKGROUND, ))
+
+    def _crawl(self, path, visited, executor, rootExecutor):
+        '''
+        - while directories left
+          - scans directories of level in parallel
+          - remembers subdirectories as next level
+
+        @param path         str; path of directory in mount
+        @param visited      set(str)
+        @param executor     `concurrent.futures.Executor`; for directories
+        @param rootExecutor `concurrent.futures.Executor`; for roots
+        @return bool; whether to continue
+        '''
+        if path in visited or path == mydfs.VIRTUAL_PATH or path.startswith(mydfs.VIRTUAL_PATH + '/'):
+            return True
+
+        visited.add(path)
+        level = [path]
+
+        while len(level) != 0:
+            nextLevel = []
+            futures = [executor.submit(self._warm, p, rootExecutor) for p in level]
+            for p, future in zip(level, futures):
+                try:
+                    dirNames = future.result()
+
+                except OSError as e:
+                    with self._Lock:
+                        self.Stats['errors'] += 1
+                    log.debug('warm-up failed for %s: %s', repr(p), e)
+                    continue
+
+                for name in sorted(dirNames):
+                    childPath = ospath.join(p, name)
+                    if childPath not in visited:
+                        visited.add(childPath)
+                        nextLevel.append(childPath)
+
+            if not self._has_budget():
+                for future in futures:
+                    future.cancel()
+
+                return False
+
+            level = nextLevel
+
+        return True
+
+    def _warm(self, path, rootExecutor):
+        '''
+        @param path         str; path of directory in mount
+        @param rootExecutor `concurrent.futures.Executor`
+        @return set(str); names of directories
+        '''
+        if not self._has_budget():
+            return set()
+
+        mydfs_ = self._Mydfs
+
+        dirNames, fileIds, stripes = mydfs_._scan(path, executor=rootExecutor, fill=True)
+
+        if mydfs_.Inodes is not None:
+            entries = list(mydfs_._merge(path, fileIds, stripes))
+            counts = collections.Counter(name for _, _, name, _ in entries)
+            for mask, separator, name, _ in entries:
+                if 1 < counts[name]:  # diverged, see `mydfs.Mydfs._get_inode_key`
+                    name = mask + separator + name
+
+                mydfs_.Inodes.get(ospath.join(path, name))
+
+            for name in dirNames:
+                mydfs_.Inodes.get(ospath.join(path, name))
+
+        with self._Lock:
+            self.Stats['directories'] += 1
+            self.Stats['entries'] += len(dirNames) + len(set().union(*fileIds)) + len(stripes)
+
+        return dirNames
+
+    def _has_budget(self):
+        if self._Stop.is_set():
+            return False
+
+        if ((self._Deadline is not None and self._Deadline < time.monotonic())
+                or (self.MaxEntries is not None and self.MaxEntries <= self.Stats['entries'])):
+            self.Stats['exhausted'] = 1
+            return False
+
+        return True
@@ -0,0 +1,44 @@
+import mydfs_bench.mydfs_bench as mb
+import json
+import sys
+import argparse
+
+# parse arguments
+parser = argparse.ArgumentParser(prog='python -m mydfs_bench', description=mb.__doc__.strip())
+
+parser.add_argument('--roots', type=int, nargs='+', default=[1, 2, 4], help='Numbers of roots')
+parser.add_argument('--dir-sizes', type=int, nargs='+', default=[10, 1000], help='Numbers of files per directory')
+parser.add_argument('--depths', type=int, nargs='+', default=[1, 8], help='Depths of directory trees')
+parser.add_argument('--benchmarks', nargs='+', default=None, choices=list(mb.BENCHMARKS),
+                    help='Benchmarks to run, default all')
+parser.add_argument('-n', type=int, default=2000, help='Maximum number of operations per benchmark')
+parser.add_argument('--duration', type=float, default=2., help='Maximum seconds per benchmark')
+parser.add_argument('--base', default=None, help='Directory for trees, default on tmpfs')
+parser.add_argument('--output', metavar='path', default=None, help='Path to write results to as JSON')
+parser.add_argument('--baseline', metavar='path', default=None, help='Path of results to compare against')
+parser.add_argument('--threshold', type=float, default=0.1, help='Maximum relative loss of ops/s')
+
+args = parser.parse_args()
+#
+
+results = mb.run(nRootss=args.roots, dirSizes=args.dir_sizes, depths=args.depths, names=args.benchmarks, n=args.n,
+                 duration=args.duration, base=args.base)
+
+text = json.dumps(results, indent=2)
+if args.output is None:
+    print(text)
+
+else:
+    with open(args.output, 'w') as f:
+        f.write(text)
+
+if args.baseline is not None:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = mb.compare(results, baseline, threshold=args.threshold)
+    for scenario, name, old, new in regressions:
+        print('regression {} {}: {:.0f} -> {:.0f} ops/s'.format(scenario, name, old, new), file=sys.stderr)
+
+    if len(regressions) != 0:
+        sys.exit(1)
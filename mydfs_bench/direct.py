@@ -0,0 +1,144 @@
+'''
+Compares buffered I/O with direct I/O, see `mydfs.direct`, by throughput and by the fraction of the file left in the
+page cache.
+'''
+
+import mydfs
+import mydfs.direct
+import os
+import shutil
+import tempfile
+import json
+import sys
+import argparse
+import ctypes
+import ctypes.util
+import mmap
+import time
+
+ospath = os.path
+
+
+def run(fileSize=2**28, requestSize=2**20, offset=1000, base=None):
+    '''
+    - creates a single root
+    - for all modes
+      - writes file sequentially
+      - gets resident fraction
+      - drops file from page cache
+      - reads file sequentially
+      - gets resident fraction
+
+    @param fileSize    int
+    @param requestSize int
+    @param offset      int; of first request, unaligned by default
+    @param base        None or str; directory on a file system which supports direct I/O, not tmpfs
+    @return {str: {str: float}}; {mode: {name: value}}
+    '''
+    base = tempfile.gettempdir() if base is None else base
+    directory = tempfile.mkdtemp(prefix='mydfs_bench.', dir=base)
+    try:
+        root = ospath.join(directory, 'a')
+        os.mkdir(root)
+        data = os.urandom(requestSize)
+
+        r = {}
+        for mode, direct in (('buffered', None), ('direct', mydfs.direct.DirectPolicy(prefixes=['/']))):
+            mydfs_ = mydfs.Mydfs([('a', root)], direct=direct)
+            path = '/{}'.format(mode)
+            results = r[mode] = {}
+
+            fileHandle = mydfs_('create', path, 0o644)
+            try:
+                results['direct'] = len(mydfs_._DirectFileHandles) != 0
+
+                start = time.monotonic()
+                for requestOffset in range(offset, fileSize, requestSize):
+                    mydfs_('write', path, data[:(fileSize - requestOffset)], requestOffset, fileHandle)
+
+                mydfs_('fsync', path, 0, fileHandle)
+                results['writeMBps'] = (fileSize - offset) / (time.monotonic() - start) / 2**20
+
+            finally:
+                mydfs_('release', path, fileHandle)
+
+            realPath = root + path
+            results['residentAfterWrite'] = get_resident_fraction(realPath)
+            drop_cache(realPath)
+
+            fileHandle = mydfs_('open', path, os.O_RDONLY)
+            try:
+                start = time.monotonic()
+                for requestOffset in range(offset, fileSize, requestSize):
+                    mydfs_('read', path, requestSize, requestOffset, fileHandle)
+
+                results['readMBps'] = (fileSize - offset) / (time.monotonic() - start) / 2**20
+
+            finally:
+                mydfs_('release', path, fileHandle)
+
+            results['residentAfterRead'] = get_resident_fraction(realPath)
+
+    finally:
+        shutil.rmtree(directory)
+
+    return r
+
+
+def get_resident_fraction(path):
+    '''
+    @param path str
+    @return float; fraction of pages of file in page cache, see `mincore(2)`
+    '''
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return 0.
+
+        with mmap.mmap(file.fileno(), size, access=mmap.ACCESS_COPY) as map_:  # writable for ctypes, untouched
+            nPages = -(-size // mmap.PAGESIZE)
+            vector = (ctypes.c_ubyte * nPages)()
+            address = ctypes.c_char.from_buffer(map_)
+            try:
+                if libc.mincore(ctypes.c_void_p(ctypes.addressof(address)), ctypes.c_size_t(size), vector) != 0:
+                    e = ctypes.get_errno()
+                    raise OSError(e, os.strerror(e))
+
+            finally:
+                del address
+
+    r = sum(value & 1 for value in vector) / nPages
+    return r
+
+
+def drop_cache(path):
+    fileHandle = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fileHandle)
+        os.posix_fadvise(fileHandle, 0, 0, os.POSIX_FADV_DONTNEED)
+
+    finally:
+        os.close(fileHandle)
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs_bench.direct', description=__doc__.strip())
+
+    parser.add_argument('--file-size', type=float, default=256., help='Size of file in MB')
+    parser.add_argument('--request-size', type=int, default=2**20, help='Bytes per read and write')
+    parser.add_argument('--offset', type=int, default=1000, help='Offset of first request')
+    parser.add_argument('--base', default=None,
+                        help='Directory for the root, on a file system which supports direct I/O, default temporary')
+
+    args = parser.parse_args(arguments)
+
+    results = run(fileSize=int(args.file_size * 2**20), requestSize=args.request_size, offset=args.offset,
+                  base=args.base)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,342 @@
+'''
+Measures operations with one degraded root among healthy roots, by injecting latency, stalls and errors into the system
+calls `mydfs.Mydfs` makes on that root, see `Injector`.
+'''
+
+import mydfs
+import mydfs.striping
+import mydfs.direct
+import mydfs.sharedcache
+import mydfs.copying
+import mydfs.mapping
+import mydfs.dirty
+import mydfs_bench.mydfs_bench as mb
+import os
+import stat
+import shutil
+import tempfile
+import collections
+import errno
+import json
+import sys
+import argparse
+import math
+import random
+import threading
+import time
+
+ospath = os.path
+
+# {op: [name of function in `os`]}
+OPS = {
+    'open': ['open'],
+    'read': ['read', 'pread', 'preadv'],
+    'write': ['write', 'pwrite', 'pwritev'],
+    'lstat': ['lstat', 'stat'],
+    'listdir': ['listdir', 'scandir'],
+    'fsync': ['fsync', 'fdatasync'],
+}
+BY_PATH = {'open', 'lstat', 'listdir'}  # ops with path as first argument, others with file handle
+
+# modules using `os` on roots
+MODULES = [mydfs, mydfs.striping, mydfs.direct, mydfs.sharedcache, mydfs.copying, mydfs.mapping, mydfs.dirty]
+
+
+def fixed(seconds):
+    '''
+    @param seconds float
+    @return function(random.Random) -> float; latency in seconds
+    '''
+    return lambda random_: seconds
+
+
+def uniform(low, high):
+    return lambda random_: random_.uniform(low, high)
+
+
+def exponential(mean):
+    return lambda random_: random_.expovariate(1 / mean)
+
+
+def lognormal(median, sigma):
+    '''
+    Heavy tailed latency of a struggling disk.
+
+    @param median float; seconds
+    @param sigma  float; standard deviation of log of latency
+    '''
+    mu = math.log(median)
+    return lambda random_: random_.lognormvariate(mu, sigma)
+
+
+class Faults:
+    '''
+    Faults of a single root.
+    '''
+
+    def __init__(self, latency=None, stallProbability=0., stallDuration=1., errorProbability=0., errno_=errno.EIO,
+                 ops=None):
+        '''
+        @param latency          None or function(random.Random) -> float; seconds added to each call, see `fixed`
+        @param stallProbability float; probability of a call stalling
+        @param stallDuration    float; seconds a stall adds
+        @param errorProbability float; probability of a call failing
+        @param errno_           int; error number of failing calls
+        @param ops              None or iter(str); names of affected ops, see `OPS`, default all
+        '''
+        self.Latency = latency
+        self.StallProbability = stallProbability
+        self.StallDuration = stallDuration
+        self.ErrorProbability = errorProbability
+        self.Errno = errno_
+        self.Ops = set(OPS if ops is None else ops)
+
+
+class Injector:
+    '''
+    Replaces `os` and `os.path` in `MODULES` by proxies which inject faults into calls on roots.
+
+    Calls are attributed to roots by path or, for file handles, by the path they were opened with.
+    The replacement is process-wide, so all instances of `mydfs.Mydfs` are affected while installed.
+    Other subsystems, e.g. `mydfs.replication`, `mydfs.tiering` and `mydfs.scrub`, access roots without faults, and
+    so do page faults of memory mappings and copies within the kernel, e.g. `os.copy_file_range`.
+    '''
+
+    def __init__(self, roots, faults, seed=0):
+        '''
+        @param roots  iter((str, str)); (character, path to root), see `mydfs.Mydfs`
+        @param faults {str: Faults}; by character of root
+        @param seed   int
+        '''
+        self.Stats = collections.Counter()  # {name: count}
+
+        self._Faults = {ospath.realpath(root): faults[character] for character, root in roots if character in faults}
+        self._Roots = sorted(self._Faults, key=len, reverse=True)  # longest first
+        self._Random = random.Random(seed)
+        self._Lock = threading.Lock()
+        self._FileHandles = {}  # {file handle: real path of root}
+        self._Originals = []  # [(module, name, object)]
+
+        self._Os = _Proxy(os)
+        for op, names in OPS.items():
+            for name in names:
+                if hasattr(os, name):
+                    setattr(self._Os, name, self._wrap(op, getattr(os, name)))
+
+        self._Os.close = self._close
+
+        self._Path = _Proxy(ospath)
+        self._Path.exists = lambda path: self._test(path, self._Os.stat, None)
+        self._Path.lexists = lambda path: self._test(path, self._Os.lstat, None)
+        self._Path.isdir = lambda path: self._test(path, self._Os.stat, lambda stat_: stat.S_ISDIR(stat_.st_mode))
+        self._Path.isfile = lambda path: self._test(path, self._Os.stat, lambda stat_: stat.S_ISREG(stat_.st_mode))
+        self._Os.path = self._Path
+
+    def install(self):
+        for module in MODULES:
+            for name, proxy in (('os', self._Os), ('ospath', self._Path)):
+                if hasattr(module, name):
+                    self._Originals.append((module, name, getattr(module, name)))
+                    setattr(module, name, proxy)
+
+    def uninstall(self):
+        for module, name, original in reversed(self._Originals):
+            setattr(module, name, original)
+
+        self._Originals.clear()
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.uninstall()
+
+    def _wrap(self, op, function):
+        byPath = op in BY_PATH
+
+        def _call(target, *args, **kwargs):
+            root = self._get_root(target) if byPath else self._FileHandles.get(target, None)
+            if root is not None:
+                self._inject(root, op, target)
+
+            r = function(target, *args, **kwargs)
+
+            if op == 'open' and root is not None:
+                self._FileHandles[r] = root
+
+            return r
+
+        return _call
+
+    def _close(self, fileHandle):
+        self._FileHandles.pop(fileHandle, None)
+        return os.close(fileHandle)
+
+    def _test(self, path, function, predicate):
+        try:
+            stat_ = function(path)
+
+        except (OSError, ValueError):
+            return False
+
+        return True if predicate is None else predicate(stat_)
+
+    def _get_root(self, path):
+        if not isinstance(path, str):
+            return None
+
+        for root in self._Roots:
+            if path == root or path.startswith(root + '/'):
+                return root
+
+        return None
+
+    def _inject(self, root, op, target):
+        '''
+        - adds latency
+        - if stalling
+          - adds stall duration
+        - sleeps
+        - if failing
+          - raises error
+        '''
+        faults = self._Faults[root]
+        if op not in faults.Ops:
+            return
+
+        with self._Lock:
+            delay = 0. if faults.Latency is None else max(0., faults.Latency(self._Random))
+            stall = self._Random.random() < faults.StallProbability
+            fail = self._Random.random() < faults.ErrorProbability
+
+        if stall:
+            delay += faults.StallDuration
+
+        if delay != 0:
+            time.sleep(delay)
+
+        with self._Lock:
+            self.Stats[op] += 1
+            self.Stats['delayNs'] += int(delay * 1e9)
+            if stall:
+                self.Stats['stalls'] += 1
+            if fail:
+                self.Stats['errors'] += 1
+
+        if fail:
+            raise OSError(faults.Errno, os.strerror(faults.Errno), target if isinstance(target, str) else None)
+
+
+class _Proxy:
+    '''
+    Module with some functions replaced.
+    '''
+
+    def __init__(self, module):
+        self._Module = module
+
+    def __getattr__(self, name):
+        return getattr(self._Module, name)
+
+
+SCENARIOS = {
+    'healthy': None,
+    'slow': lambda: Faults(latency=lognormal(0.5e-3, 1.)),
+    'stalls': lambda: Faults(stallProbability=0.002, stallDuration=0.2),
+    'errors': lambda: Faults(errorProbability=0.02),
+}  # {name: None or function() -> Faults}
+
+
+def run(scenarios=('healthy', 'slow', 'stalls', 'errors'), nRoots=4, degraded='b', dirSize=100, depth=2,
+        names=('getattr', 'readdir', 'open_read_release', 'read', 'write'), n=2000, duration=2., base=None,
+        makeMydfs=mydfs.Mydfs, seed=0):
+    '''
+    - for all scenarios
+      - for all benchmarks, see `mydfs_bench.mydfs_bench.BENCHMARKS`
+        - creates tree on healthy roots
+        - injects faults of scenario into degraded root
+        - measures operations, counting errors
+
+    @param scenarios iter(str); see `SCENARIOS`
+    @param nRoots    int
+    @param degraded  str; character of degraded root
+    @param dirSize   int; see `mydfs_bench.mydfs_bench.make_tree`
+    @param depth     int; see `mydfs_bench.mydfs_bench.make_tree`
+    @param names     iter(str); names of benchmarks
+    @param n         int; see `mydfs_bench.mydfs_bench.measure`
+    @param duration  float; see `mydfs_bench.mydfs_bench.measure`
+    @param base      None or str; see `mydfs_bench.mydfs_bench.get_base_directory`
+    @param makeMydfs function([(str, str)]) -> mydfs.Mydfs
+    @param seed      int
+    @return {str: {str: {str: float}}}; {scenario: {benchmark: summary with errors}}
+    '''
+    base = mb.get_base_directory() if base is None else base
+
+    r = collections.OrderedDict()
+    for scenario in scenarios:
+        results = r[scenario] = collections.OrderedDict()
+        makeFaults = SCENARIOS[scenario]
+
+        for name in names:
+            directory = tempfile.mkdtemp(prefix='mydfs_bench.', dir=base)
+            try:
+                tree = mb.make_tree(directory, nRoots, dirSize, depth)
+                faults = {} if makeFaults is None else {degraded: makeFaults()}
+                mydfs_ = makeMydfs(tree.Roots)
+                mydfs_.init('/')
+                try:
+                    with Injector(tree.Roots, faults, seed=seed) as injector:
+                        errors = collections.Counter()
+                        operation = _count_errors(mb.BENCHMARKS[name](mydfs_, tree, random.Random(seed)), errors)
+                        results[name] = mb.summarize(mb.measure(operation, n, duration=duration))
+
+                    results[name]['errors'] = errors['errors']
+                    results[name]['injected'] = dict(injector.Stats)
+
+                finally:
+                    mydfs_.destroy('/')
+
+            finally:
+                shutil.rmtree(directory)
+
+    return r
+
+
+def _count_errors(operation, errors):
+
+    def _operation():
+        try:
+            operation()
+
+        except OSError:
+            errors['errors'] += 1
+
+    return _operation
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs_bench.faults', description=__doc__.strip())
+
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help='Faults of degraded root')
+    parser.add_argument('--roots', type=int, default=4, help='Number of roots')
+    parser.add_argument('--degraded', metavar='character', default='b', help='Character of degraded root')
+    parser.add_argument('--dir-size', type=int, default=100, help='Number of files per directory')
+    parser.add_argument('--depth', type=int, default=2, help='Depth of directory tree')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(mb.BENCHMARKS),
+                        default=['getattr', 'readdir', 'open_read_release', 'read', 'write'], help='Benchmarks to run')
+    parser.add_argument('-n', type=int, default=2000, help='Maximum number of operations per benchmark')
+    parser.add_argument('--duration', type=float, default=2., help='Maximum seconds per benchmark')
+    parser.add_argument('--base', default=None, help='Directory for roots, default on tmpfs')
+
+    args = parser.parse_args(arguments)
+
+    results = run(scenarios=args.scenarios, nRoots=args.roots, degraded=args.degraded, dirSize=args.dir_size,
+                  depth=args.depth, names=args.benchmarks, n=args.n, duration=args.duration, base=args.base)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
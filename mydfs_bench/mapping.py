@@ -0,0 +1,101 @@
+'''
+Compares reads from memory mappings, see `mydfs.mapping`, with reads by syscall across request sizes.
+'''
+
+import mydfs
+import mydfs_bench.mydfs_bench as mb
+import os
+import shutil
+import tempfile
+import json
+import sys
+import argparse
+import random
+
+ospath = os.path
+
+
+def run(requestSizes=(2**12, 2**14, 2**17, 2**20), fileSize=2**26, n=2000, duration=2., base=None, seed=0):
+    '''
+    - creates a single root with a single file
+    - for all modes
+      - for all request sizes
+        - for sequential and random offsets
+          - measures reads
+
+    @param requestSizes iter(int)
+    @param fileSize     int
+    @param n            int; see `mydfs_bench.mydfs_bench.measure`
+    @param duration     float; see `mydfs_bench.mydfs_bench.measure`
+    @param base         None or str; see `mydfs_bench.mydfs_bench.get_base_directory`
+    @param seed         int
+    @return {str: {str: {str: {str: float}}}}; {mode: {request size: {pattern: summary}}}
+    '''
+    base = mb.get_base_directory() if base is None else base
+    directory = tempfile.mkdtemp(prefix='mydfs_bench.', dir=base)
+    try:
+        root = ospath.join(directory, 'a')
+        os.mkdir(root)
+        with open(ospath.join(root, 'file'), 'wb') as f:
+            f.write(os.urandom(fileSize))
+
+        r = {}
+        for mode, mapThreshold in (('syscall', None), ('mmap', 0)):
+            mydfs_ = mydfs.Mydfs([('a', root)], mapThreshold=mapThreshold)
+            fileHandle = mydfs_('open', '/file', os.O_RDONLY)
+            try:
+                results = r[mode] = {}
+                for requestSize in requestSizes:
+                    nOffsets = fileSize // requestSize
+                    results[str(requestSize)] = {
+                        pattern: mb.summarize(
+                            mb.measure(_get_operation(mydfs_, fileHandle, requestSize, nOffsets, pattern, seed), n,
+                                       duration=duration))
+                        for pattern in ('sequential', 'random')
+                    }
+
+            finally:
+                mydfs_('release', '/file', fileHandle)
+
+    finally:
+        shutil.rmtree(directory)
+
+    return r
+
+
+def _get_operation(mydfs_, fileHandle, requestSize, nOffsets, pattern, seed):
+    random_ = random.Random(seed)
+    state = [0]
+
+    def _operation():
+        if pattern == 'random':
+            i = random_.randrange(nOffsets)
+        else:
+            i = state[0] % nOffsets
+            state[0] += 1
+
+        mydfs_('read', '/file', requestSize, i * requestSize, fileHandle)
+
+    return _operation
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs_bench.mapping', description=__doc__.strip())
+
+    parser.add_argument('--request-sizes', type=int, nargs='+', default=[2**12, 2**14, 2**17, 2**20],
+                        help='Bytes per read')
+    parser.add_argument('--file-size', type=float, default=64., help='Size of file in MB')
+    parser.add_argument('-n', type=int, default=2000, help='Maximum number of reads per measurement')
+    parser.add_argument('--duration', type=float, default=2., help='Maximum seconds per measurement')
+    parser.add_argument('--base', default=None, help='Directory for the root, default on tmpfs')
+
+    args = parser.parse_args(arguments)
+
+    results = run(requestSizes=args.request_sizes, fileSize=int(args.file_size * 2**20), n=args.n,
+                  duration=args.duration, base=args.base)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,345 @@
+'''
+Microbenchmarks of `mydfs.Mydfs` operations, called directly without a FUSE mount.
+'''
+
+import mydfs
+import os
+import shutil
+import tempfile
+import collections
+import itertools as it
+import logging
+import random
+import time
+
+ospath = os.path
+
+Tree = collections.namedtuple('Tree', ['Roots', 'FilePaths', 'DirPaths'])  # [(character, path)], [str], [str]
+
+BENCHMARKS = collections.OrderedDict()  # {name: function(mydfs.Mydfs, Tree, random.Random) -> function()}
+
+_legacyLog = logging.getLogger('fuse.log-mixin')
+
+
+def benchmark(name):
+    '''
+    Decorator to register a benchmark.
+
+    The decorated function prepares a single operation and returns a function which performs it.
+    '''
+
+    def _benchmark(f):
+        BENCHMARKS[name] = f
+        return f
+
+    return _benchmark
+
+
+def get_base_directory():
+    '''
+    @return str; directory on tmpfs if available
+    '''
+    if ospath.isdir('/dev/shm'):
+        return '/dev/shm'
+
+    return tempfile.gettempdir()
+
+
+def make_tree(base, nRoots, dirSize, depth, fileSize=4096):
+    '''
+    Creates roots containing a chain of `depth` nested directories with `dirSize` files each.
+
+    - every `nRoots + 1`th file is replicated to all roots with the same modification time
+    - other files are spread round-robin
+
+    @param base     str; path of directory to create roots in
+    @param nRoots   int
+    @param dirSize  int; number of files per directory
+    @param depth    int; number of nested directories
+    @param fileSize int
+    @return Tree
+    '''
+    roots = []
+    for i in range(nRoots):
+        character = chr(ord('a') + i)
+        path = ospath.join(base, character)
+        os.mkdir(path)
+        roots.append((character, path))
+
+    content = os.urandom(fileSize)
+    filePaths = []
+    dirPaths = []
+
+    dirPath = ''
+    for level in range(depth):
+        dirPath = '{}/d{}'.format(dirPath, level)
+        dirPaths.append(dirPath)
+
+        for _, root in roots:
+            os.mkdir(root + dirPath)
+
+        for j in range(dirSize):
+            path = '{}/f{}'.format(dirPath, j)
+            filePaths.append(path)
+
+            if j % (nRoots + 1) == nRoots:
+                _, root = roots[0]
+                with open(root + path, 'wb') as f:
+                    f.write(content)
+
+                for _, nRoot in roots[1:]:
+                    shutil.copy2(root + path, nRoot + path)
+
+            else:
+                _, root = roots[j % (nRoots + 1)]
+                with open(root + path, 'wb') as f:
+                    f.write(content)
+
+    return Tree(roots, filePaths, dirPaths)
+
+
+def measure(operation, n, duration=None):
+    '''
+    @param operation function()
+    @param n         int; maximum number of operations
+    @param duration  None or float; maximum seconds
+    @return [int]; latencies in ns
+    '''
+    r = []
+    perf_counter_ns = time.perf_counter_ns
+    end = None if duration is None else time.monotonic() + duration
+
+    for i in range(n):
+        t = perf_counter_ns()
+        operation()
+        r.append(perf_counter_ns() - t)
+
+        if end is not None and i % 64 == 0 and end < time.monotonic():
+            break
+
+    return r
+
+
+def summarize(latencies):
+    '''
+    @param latencies [int]; in ns
+    @return {str: float}; operations per second and percentiles in µs
+    '''
+    latencies = sorted(latencies)
+    n = len(latencies)
+    total = sum(latencies)
+
+    r = {'n': n, 'ops': n / (total / 1e9) if total != 0 else 0.}
+    for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.)):
+        r[name] = latencies[min(n - 1, int(q * n))] / 1e3
+
+    return r
+
+
+def run(nRootss=(1, 2, 4), dirSizes=(10, 1000), depths=(1, 8), names=None, n=2000, duration=2., base=None,
+        makeMydfs=mydfs.Mydfs, seed=0):
+    '''
+    Runs benchmarks for all combinations of tree parameters.
+
+    @param nRootss   iter(int)
+    @param dirSizes  iter(int)
+    @param depths    iter(int)
+    @param names     None or iter(str); names of benchmarks, see `BENCHMARKS`
+    @param n         int; maximum number of operations per benchmark
+    @param duration  float; maximum seconds per benchmark
+    @param base      None or str; path of directory for trees, defaults to `get_base_directory()`
+    @param makeMydfs function([(str, str)]) -> mydfs.Mydfs
+    @param seed      int
+    @return {str: {str: {str: float}}}; {scenario: {benchmark: summary}}, see `summarize`
+    '''
+    if names is None:
+        names = list(BENCHMARKS)
+
+    if base is None:
+        base = get_base_directory()
+
+    r = collections.OrderedDict()
+
+    for nRoots, dirSize, depth in it.product(nRootss, dirSizes, depths):
+        scenario = 'roots={},dir={},depth={}'.format(nRoots, dirSize, depth)
+        results = r[scenario] = collections.OrderedDict()
+
+        for name in names:
+            directory = tempfile.mkdtemp(prefix='mydfs_bench.', dir=base)
+            try:
+                tree = make_tree(directory, nRoots, dirSize, depth)
+                mydfs_ = makeMydfs(tree.Roots)
+                mydfs_.init('/')
+                try:
+                    operation = BENCHMARKS[name](mydfs_, tree, random.Random(seed))
+                    results[name] = summarize(measure(operation, n, duration=duration))
+
+                finally:
+                    mydfs_.destroy('/')
+
+            finally:
+                shutil.rmtree(directory)
+
+    return r
+
+
+def compare(results, baseline, threshold=0.1):
+    '''
+    @param results   {str: {str: {str: float}}}; see `run`
+    @param baseline  {str: {str: {str: float}}}; see `run`
+    @param threshold float; maximum relative loss of operations per second
+    @return [(str, str, float, float)]; (scenario, benchmark, ops of baseline, ops) of regressions
+    '''
+    r = []
+
+    for scenario, summaries in results.items():
+        for name, summary in summaries.items():
+            old = baseline.get(scenario, {}).get(name, None)
+            if old is None:
+                continue
+
+            if summary['ops'] < old['ops'] * (1 - threshold):
+                r.append((scenario, name, old['ops'], summary['ops']))
+
+    return r
+
+
+@benchmark('getattr')
+def _getattr(mydfs_, tree, random):
+    paths = tree.FilePaths
+
+    def _operation():
+        mydfs_.getattr(random.choice(paths))
+
+    return _operation
+
+
+@benchmark('readdir')
+def _readdir(mydfs_, tree, random):
+    path = tree.DirPaths[-1]
+
+    def _operation():
+        mydfs_.readdir(path, None)
+
+    return _operation
+
+
+@benchmark('open_read_release')
+def _open_read_release(mydfs_, tree, random):
+    paths = tree.FilePaths
+
+    def _operation():
+        path = random.choice(paths)
+        fileHandle = mydfs_.open(path, os.O_RDONLY)
+        mydfs_.read(path, 4096, 0, fileHandle)
+        mydfs_.release(path, fileHandle)
+
+    return _operation
+
+
+@benchmark('read')
+def _read(mydfs_, tree, random):
+    path = tree.FilePaths[-1]
+    fileHandle = mydfs_.open(path, os.O_RDONLY)
+
+    def _operation():
+        mydfs_.read(path, 4096, 0, fileHandle)
+
+    return _operation
+
+
+@benchmark('write')
+def _write(mydfs_, tree, random):
+    path = tree.FilePaths[-1]
+    fileHandle = mydfs_.open(path, os.O_WRONLY)
+    data = os.urandom(4096)
+
+    def _operation():
+        mydfs_.write(path, data, 0, fileHandle)
+
+    return _operation
+
+
+@benchmark('create_release_unlink')
+def _create_release_unlink(mydfs_, tree, random):
+    path = ospath.join(tree.DirPaths[-1], 'new')
+
+    def _operation():
+        fileHandle = mydfs_.create(path, 0o644)
+        mydfs_.release(path, fileHandle)
+        mydfs_.unlink(path)
+
+    return _operation
+
+
+@benchmark('rename')
+def _rename(mydfs_, tree, random):
+    paths = [tree.FilePaths[-1], tree.FilePaths[-1] + '.renamed']
+
+    def _operation():
+        mydfs_.rename(paths[0], paths[1])
+        paths.reverse()
+
+    return _operation
+
+
+def _legacy_dispatch(mydfs_, op, path, *args):
+    '''
+    Dispatches like `fuse.LoggingMixIn.__call__` to the decorated method, for comparison with `mydfs.Mydfs.__call__`.
+    '''
+    _legacyLog.debug('-> %s %s %s', op, path, repr(args))
+    ret = '[Unhandled Exception]'
+    try:
+        ret = getattr(mydfs_, op)(path, *args)
+        return ret
+
+    except OSError as e:
+        ret = str(e)
+        raise
+
+    finally:
+        _legacyLog.debug('<- %s %s', op, repr(ret))
+
+
+@benchmark('dispatch_getattr')
+def _dispatch_getattr(mydfs_, tree, random):
+    path = tree.FilePaths[-1]
+
+    def _operation():
+        mydfs_('getattr', path, None)
+
+    return _operation
+
+
+@benchmark('legacy_dispatch_getattr')
+def _legacy_dispatch_getattr(mydfs_, tree, random):
+    path = tree.FilePaths[-1]
+
+    def _operation():
+        _legacy_dispatch(mydfs_, 'getattr', path, None)
+
+    return _operation
+
+
+@benchmark('dispatch_write')
+def _dispatch_write(mydfs_, tree, random):
+    path = tree.FilePaths[-1]
+    fileHandle = mydfs_.open(path, os.O_WRONLY)
+    data = os.urandom(2**17)
+
+    def _operation():
+        mydfs_('write', path, data, 0, fileHandle)
+
+    return _operation
+
+
+@benchmark('legacy_dispatch_write')
+def _legacy_dispatch_write(mydfs_, tree, random):
+    path = tree.FilePaths[-1]
+    fileHandle = mydfs_.open(path, os.O_WRONLY)
+    data = os.urandom(2**17)
+
+    def _operation():
+        _legacy_dispatch(mydfs_, 'write', path, data, 0, fileHandle)
+
+    return _operation
@@ -0,0 +1,115 @@
+'''
+Counts operations called by the kernel for a stat-heavy workload on a mount per cache profile, see
+`mydfs.cli.CACHE_PROFILES`. Requires FUSE.
+'''
+
+import mydfs
+import mydfs.cli
+import mydfs_bench.mydfs_bench as mb
+import os
+import shutil
+import subprocess
+import tempfile
+import json
+import sys
+import argparse
+import time
+
+ospath = os.path
+
+
+def count_upcalls(profile, tree, mountPath, rounds, timeout=10.):
+    '''
+    - mounts roots with cache profile
+    - for all rounds
+      - walks mount, getting attributes and reading files
+    - reads statistics from virtual file, see `mydfs.Mydfs.getattr`
+    - unmounts
+
+    @param profile   str; see `mydfs.cli.CACHE_PROFILES`
+    @param tree      `mydfs_bench.mydfs_bench.Tree`
+    @param mountPath str; path of empty directory
+    @param rounds    int
+    @param timeout   float; seconds to wait for mount
+    @return {str: int}; {op: count}
+    '''
+    arguments = [sys.executable, '-m', 'mydfs', '--cache-profile', profile]
+    arguments.extend('{}={}'.format(character, root) for character, root in tree.Roots)
+    arguments.append(mountPath)
+
+    process = subprocess.Popen(arguments)
+    try:
+        end = time.monotonic() + timeout
+        while not ospath.ismount(mountPath):
+            if process.poll() is not None or end < time.monotonic():
+                raise RuntimeError('mount failed')
+
+            time.sleep(0.05)
+
+        for _ in range(rounds):
+            _walk(mountPath)
+
+        with open(ospath.join(mountPath, mydfs.STATE_NAME, 'stats')) as f:
+            stats = json.load(f)
+
+    finally:
+        subprocess.run(['fusermount', '-u', mountPath])
+        process.wait()
+
+    r = {op: s['count'] for op, s in stats['ops'].items()}
+    return r
+
+
+def _walk(path):
+    for dirPath, dirNames, fileNames in os.walk(path):
+        for name in dirNames + fileNames:
+            os.stat(ospath.join(dirPath, name))
+
+        for name in fileNames:
+            with open(ospath.join(dirPath, name), 'rb') as f:
+                f.read()
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(prog='python -m mydfs_bench.upcalls', description=__doc__.strip())
+
+    parser.add_argument('--profiles', nargs='+', choices=list(mydfs.cli.CACHE_PROFILES),
+                        default=['strict', 'default', 'metadata', 'aggressive'], help='Cache profiles to compare')
+    parser.add_argument('--roots', type=int, default=2, help='Number of roots')
+    parser.add_argument('--dir-size', type=int, default=100, help='Number of files per directory')
+    parser.add_argument('--depth', type=int, default=3, help='Depth of directory tree')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of walks per mount')
+    parser.add_argument('--base', default=None, help='Directory for trees, default on tmpfs')
+    parser.add_argument('--check', action='store_true', default=False,
+                        help='Fail unless each profile causes fewer upcalls than the one before')
+
+    args = parser.parse_args(arguments)
+
+    base = mb.get_base_directory() if args.base is None else args.base
+
+    results = {}
+    for profile in args.profiles:
+        directory = tempfile.mkdtemp(prefix='mydfs_bench.', dir=base)
+        try:
+            tree = mb.make_tree(directory, args.roots, args.dir_size, args.depth)
+            mountPath = ospath.join(directory, 'mount')
+            os.mkdir(mountPath)
+
+            results[profile] = count_upcalls(profile, tree, mountPath, args.rounds)
+
+        finally:
+            shutil.rmtree(directory)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.check:
+        totals = [sum(results[profile].values()) for profile in args.profiles]
+        if any(previous <= total for previous, total in zip(totals, totals[1:])):
+            print('upcalls not decreasing: {}'.format(totals), file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
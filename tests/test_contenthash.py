@@ -0,0 +1,85 @@
+import mydfs
+import mydfs.contenthash
+import os
+import time
+import pytest
+
+TIMEOUT = 10.
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+def _make(tmp_path, roots):
+    r = mydfs.Mydfs(roots, contentIndex=mydfs.contenthash.ContentIndex(str(tmp_path / 'content.sqlite')))
+    r.init('/')
+    return r
+
+
+def _write(tmp_path, character, name, content, mtime):
+    (tmp_path / character / name).write_bytes(content)
+    os.utime(tmp_path / character / name, ns=(mtime, mtime))
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_equal_content_merges(tmp_path, roots):
+    _write(tmp_path, 'a', 'x', b'content', 10**9)
+    _write(tmp_path, 'b', 'x', b'content', 2 * 10**9)  # e.g. copied without timestamps
+    _write(tmp_path, 'a', 'y', b'content', 10**9)
+    _write(tmp_path, 'b', 'y', b'CONTENT', 2 * 10**9)  # same size
+
+    mydfs_ = _make(tmp_path, roots)
+    try:
+        index = mydfs_.ContentIndex
+        assert sorted(mydfs_('readdir', '/', None)) == ['.b_x', '.b_y', 'a._x', 'a._y']  # hashes unknown
+        _wait_for(lambda: index.Stats['hashed'] == 4)
+
+        assert sorted(mydfs_('readdir', '/', None)) == ['.b_y', 'a._y', 'ab_x']
+
+        fileHandle = mydfs_('open', '/ab_x', os.O_RDONLY)
+        try:
+            assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'content'
+
+        finally:
+            mydfs_('release', '/ab_x', fileHandle)
+
+        _write(tmp_path, 'b', 'x', b'changed', 3 * 10**9)  # new version, hash unknown
+        assert sorted(mydfs_('readdir', '/', None)) == ['.b_x', '.b_y', 'a._x', 'a._y']
+
+    finally:
+        mydfs_.destroy('/')
+
+
+def test_hashes_persist(tmp_path, roots):
+    _write(tmp_path, 'a', 'x', b'content', 10**9)
+    _write(tmp_path, 'b', 'x', b'content', 2 * 10**9)
+
+    mydfs_ = _make(tmp_path, roots)
+    try:
+        mydfs_('readdir', '/', None)
+        _wait_for(lambda: mydfs_.ContentIndex.Stats['hashed'] == 2)
+
+    finally:
+        mydfs_.destroy('/')
+
+    mydfs_ = _make(tmp_path, roots)
+    try:
+        assert mydfs_('readdir', '/', None) == ['ab_x']
+        assert mydfs_.ContentIndex.Stats['hits'] == 2
+        assert mydfs_.ContentIndex.Stats['hashed'] == 0
+
+    finally:
+        mydfs_.destroy('/')
@@ -0,0 +1,80 @@
+import mydfs
+import mydfs.control
+import mydfs.listing
+import mydfs.tiering
+import fuse
+import os
+import pytest
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    r = mydfs.Mydfs(roots, listingCache=mydfs.listing.ListingCache(),
+                    tiering=mydfs.tiering.Tiering('a', interval=3600.), controller=mydfs.control.Controller())
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def test_set(mydfs_):
+    controller = mydfs_.Controller
+
+    assert controller.execute('set listingCache.ttl 60') == '10.0 -> 60.0'
+    assert mydfs_.ListingCache.Ttl == 60.
+
+    controller.execute('set tiering.reserve 0')
+    controller.execute('set tiering.rate none')
+    controller.execute('set logSampling 1')
+    assert (mydfs_.Tiering.Reserve, mydfs_.Tiering._Limiter.Rate, mydfs_.LogSampling) == (0., None, 1.)
+    assert controller.Stats['commands'] == 4
+
+
+@pytest.mark.parametrize('line', [
+    'set listingCache.ttl 0',
+    'set listingCache.ttl -1',
+    'set listingCache.ttl nan',
+    'set listingCache.ttl inf',
+    'set listingCache.ttl x',
+    'set listingCache.maxEntries 0',
+    'set tiering.halfLife 0',
+    'set tiering.interval -10',
+    'set tiering.reserve 1',
+    'set tiering.reserve -0.1',
+    'set tiering.maxMoves -1',
+    'set tiering.rate 0',
+    'set logSampling 2',
+    'set mapThreshold 0',
+    'set listingCache.ttl',
+    'set nope 1',
+    'set sharedCache.ttl 60',  # not enabled
+    'bogus',
+])
+def test_bad_input(mydfs_, line):
+    controller = mydfs_.Controller
+    before = controller.render()
+
+    with pytest.raises(ValueError):
+        controller.execute(line)
+
+    assert controller.render().startswith(before.rstrip(b'\n'))  # settings unchanged, failure appended
+    assert controller.Stats['failed'] == 1
+    assert controller.Stats['commands'] == 0
+
+
+def test_bad_input_fails_write(mydfs_):
+    fileHandle = mydfs_('open', mydfs.CONTROL_PATH, os.O_WRONLY)
+    try:
+        with pytest.raises(fuse.FuseOSError) as info:
+            mydfs_('write', mydfs.CONTROL_PATH, b'set tiering.halfLife 60\nset tiering.reserve 1.5\n', 0, fileHandle)
+
+    finally:
+        mydfs_('release', mydfs.CONTROL_PATH, fileHandle)
+
+    assert info.value.errno == fuse.EINVAL
+    assert mydfs_.Tiering.HalfLife == 60.  # all lines are executed
+    assert mydfs_.Tiering.Reserve == 0.1
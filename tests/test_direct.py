@@ -0,0 +1,80 @@
+import mydfs.direct
+import os
+import random
+import pytest
+
+ALIGNMENT = mydfs.direct.ALIGNMENT
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'file')
+
+
+@pytest.fixture(params=[False, True], ids=['buffered', 'direct'])
+def fileHandle(request, path):
+    r = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if request.param and not mydfs.direct.enable(r):
+        os.close(r)
+        pytest.skip('direct I/O not supported by file system of tmp_path')
+
+    yield r
+    os.close(r)
+
+
+def _fill(path, content):
+    with open(path, 'wb') as file:  # without direct I/O
+        file.write(content)
+
+
+def _cases():
+    yield (0, 1)
+    yield (1, 1)
+    yield (ALIGNMENT - 1, 2)  # crosses block boundary
+    yield (0, ALIGNMENT)
+    yield (ALIGNMENT, ALIGNMENT)
+    yield (100, ALIGNMENT)  # unaligned head and tail in different blocks
+    yield (100, 100)  # unaligned head and tail in same block
+    yield (ALIGNMENT - 10, 3 * ALIGNMENT + 20)
+
+
+@pytest.mark.parametrize('offset, size', list(_cases()))
+def test_write_keeps_neighbours(path, fileHandle, offset, size):
+    initial = random.Random(0).randbytes(5 * ALIGNMENT + 123)
+    _fill(path, initial)
+
+    data = random.Random(1).randbytes(size)
+    assert mydfs.direct.write(fileHandle, data, offset) == size
+
+    expected = bytearray(initial)
+    expected[offset:(offset + size)] = data
+    assert os.fstat(fileHandle).st_size == len(expected)
+    assert mydfs.direct.read(fileHandle, len(expected) + ALIGNMENT, 0) == expected
+
+
+@pytest.mark.parametrize('offset, size', list(_cases()))
+def test_write_beyond_end_keeps_size(path, fileHandle, offset, size):
+    initial = b'x' * 10
+    _fill(path, initial)
+
+    data = b'y' * size
+    mydfs.direct.write(fileHandle, data, offset)
+
+    expected = bytearray(initial)
+    expected.extend(bytes(max(0, offset - len(expected))))
+    expected[offset:(offset + size)] = data
+    assert os.fstat(fileHandle).st_size == len(expected)  # not padded to alignment
+    assert mydfs.direct.read(fileHandle, len(expected) + ALIGNMENT, 0) == expected
+
+
+def test_read(path, fileHandle):
+    content = random.Random(2).randbytes(3 * ALIGNMENT + 17)
+    _fill(path, content)
+
+    random_ = random.Random(3)
+    for _ in range(200):
+        offset = random_.randrange(len(content) + ALIGNMENT)
+        size = random_.randrange(2 * ALIGNMENT)
+        assert mydfs.direct.read(fileHandle, size, offset) == content[offset:(offset + size)]
+
+    assert mydfs.direct.read(fileHandle, 0, 5) == b''
@@ -0,0 +1,104 @@
+import mydfs
+import mydfs.dirty
+import os
+import pytest
+
+BLOCK_SIZE = 4096
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    dirty = mydfs.dirty.DirtyJournal(str(tmp_path / 'dirty.journal'), blockSize=BLOCK_SIZE, interval=3600.)
+    r = mydfs.Mydfs(roots, dirty=dirty)
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _reload(tmp_path):
+    r = mydfs.dirty.DirtyJournal(str(tmp_path / 'dirty.journal'), blockSize=BLOCK_SIZE)
+    r.stop()
+    return r
+
+
+def test_resync_copies_dirty_blocks(tmp_path, mydfs_):
+    content = bytes(range(256)) * 64
+    (tmp_path / 'a' / 'x').write_bytes(content)
+    (tmp_path / 'b' / 'x').write_bytes(content[:BLOCK_SIZE] + bytes(len(content) - BLOCK_SIZE))
+    os.utime(tmp_path / 'b' / 'x', ns=(0, 0))
+
+    mydfs_.Dirty.mark('b', '/x', BLOCK_SIZE, len(content) - BLOCK_SIZE)
+    mydfs_.Dirty.run_once()
+
+    assert (tmp_path / 'b' / 'x').read_bytes() == content
+    assert os.stat(tmp_path / 'b' / 'x').st_mtime_ns == os.stat(tmp_path / 'a' / 'x').st_mtime_ns
+    assert len(mydfs_.Dirty) == 0
+    assert len(_reload(tmp_path)) == 0
+
+
+@pytest.mark.parametrize('removeSource', [False, True])
+def test_removed_replica_is_forgotten(tmp_path, mydfs_, removeSource):
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+    (tmp_path / 'b' / 'x').write_bytes(b'other')
+    mydfs_.Dirty.mark_all('b', '/x')
+
+    os.unlink(tmp_path / 'b' / 'x')
+    if removeSource:
+        os.unlink(tmp_path / 'a' / 'x')
+
+    mydfs_.Dirty.run_once()
+
+    assert not (tmp_path / 'b' / 'x').exists()  # not recreated
+    assert len(mydfs_.Dirty) == 0
+    assert mydfs_.Dirty.Stats['forgotten'] == 1
+    assert mydfs_.Dirty.Stats['errors'] == 0
+    assert len(_reload(tmp_path)) == 0
+
+
+def test_rename_keeps_dirty_ranges(tmp_path, mydfs_):
+    content = bytes(range(256)) * 32
+    (tmp_path / 'a' / 'x').write_bytes(content)
+    (tmp_path / 'b' / 'x').write_bytes(bytes(len(content)))
+    os.utime(tmp_path / 'b' / 'x', ns=(0, 0))
+    mydfs_.Dirty.mark('b', '/x', 0, len(content))
+
+    mydfs_('rename', '/x', '/y')
+    assert not mydfs_.Dirty.is_dirty('b', '/x')
+    assert mydfs_.Dirty.is_dirty('b', '/y')
+    assert _reload(tmp_path).is_dirty('b', '/y')
+
+    mydfs_.Dirty.run_once()
+
+    assert (tmp_path / 'b' / 'y').read_bytes() == content
+    assert mydfs_.Dirty.Stats['forgotten'] == 0
+    assert len(mydfs_.Dirty) == 0
+
+
+def test_rename_of_directory_keeps_dirty_ranges(tmp_path, mydfs_):
+    for character in 'ab':
+        (tmp_path / character / 'd').mkdir()
+        (tmp_path / character / 'd' / 'x').write_bytes(b'content')
+
+    mydfs_.Dirty.mark_all('b', '/d/x')
+    mydfs_('rename', '/d', '/e')
+
+    assert mydfs_.Dirty.is_dirty('b', '/e/x')
+    assert len(mydfs_.Dirty) == 1
+
+
+def test_rename_in_some_roots(tmp_path, mydfs_):
+    for character in 'ab':
+        (tmp_path / character / 'x').write_bytes(b'content')
+
+    mydfs_.Dirty.mark_all('a', '/x')
+    mydfs_.Dirty.mark_all('b', '/x')
+    mydfs_('rename', '/a._x', '/a._y')  # only in first root
+
+    assert mydfs_.Dirty.is_dirty('a', '/y')
+    assert not mydfs_.Dirty.is_dirty('a', '/x')
+    assert mydfs_.Dirty.is_dirty('b', '/x')
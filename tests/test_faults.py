@@ -0,0 +1,83 @@
+import mydfs
+import mydfs.dirty
+import mydfs_bench.faults as faults
+import os
+import errno
+import pytest
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        (tmp_path / character / 'x').write_bytes(b'content')
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+@pytest.fixture(params=[False, True], ids=['untracked', 'tracked'])
+def mydfs_(request, tmp_path, roots):
+    dirty = None
+    if request.param:
+        dirty = mydfs.dirty.DirtyJournal(str(tmp_path / 'dirty.journal'), interval=3600.)
+
+    r = mydfs.Mydfs(roots, dirty=dirty)
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _failing(ops):
+    return faults.Faults(errorProbability=1., ops=ops)
+
+
+def _get_errors(mydfs_, character):
+    return mydfs_.Statistics.get({})['roots'].get(character, {}).get('errors', 0)
+
+
+@pytest.mark.parametrize('degraded', ['a', 'b', 'ab'])
+def test_read_from_degraded_root(roots, mydfs_, degraded):
+    with faults.Injector(roots, {c: _failing(['read']) for c in degraded}) as injector:  # attributed on open
+        fileHandle = mydfs_('open', '/ab_x', os.O_RDONLY)
+        try:
+            if 'a' not in degraded:  # first root is preferred
+                assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'content'
+
+            else:
+                with pytest.raises(OSError) as info:
+                    mydfs_('read', '/ab_x', 100, 0, fileHandle)
+
+                assert info.value.errno == errno.EIO
+
+        finally:
+            mydfs_('release', '/ab_x', fileHandle)
+
+    assert injector.Stats['errors'] == (1 if 'a' in degraded else 0)  # no failover to other replicas
+
+
+def test_write_to_degraded_root(tmp_path, roots, mydfs_):
+    with faults.Injector(roots, {'b': _failing(['write'])}):
+        fileHandle = mydfs_('open', '/ab_x', os.O_RDWR)
+        try:
+            if mydfs_.Dirty is None:  # fails
+                with pytest.raises(OSError) as info:
+                    mydfs_('write', '/ab_x', b'C', 0, fileHandle)
+
+                assert info.value.errno == errno.EIO
+                return
+
+            assert mydfs_('write', '/ab_x', b'C', 0, fileHandle) == 1  # succeeds and marks replica dirty
+            assert mydfs_.Dirty.is_dirty('b', '/x')
+            assert not mydfs_.Dirty.is_dirty('a', '/x')
+            assert (tmp_path / 'b' / 'x').read_bytes() == b'content'
+            assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'Content'
+            assert _get_errors(mydfs_, 'b') == 1
+
+        finally:
+            mydfs_('release', '/ab_x', fileHandle)
+
+    mydfs_.Dirty.run_once()
+    assert (tmp_path / 'b' / 'x').read_bytes() == b'Content'
+    assert len(mydfs_.Dirty) == 0
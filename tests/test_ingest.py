@@ -0,0 +1,72 @@
+import mydfs
+import mydfs.ingest
+import os
+import pytest
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+@pytest.fixture
+def source(tmp_path):
+    r = tmp_path / 'source'
+    (r / 'd').mkdir(parents=True)
+    (r / 'd' / 'x').write_bytes(b'content')
+    (r / 'y').write_bytes(b'other')
+    os.symlink('y', r / 'l')
+
+    os.utime(r / 'l', ns=(10**9, 10**9), follow_symlinks=False)
+    os.utime(r / 'd', ns=(2 * 10**9, 2 * 10**9))
+    return r
+
+
+def _get_characters(tmp_path, path):
+    return ''.join(character for character in 'abc' if os.path.lexists(tmp_path / character / path))
+
+
+def test_mask_lays_out(tmp_path, roots, source):
+    stats = mydfs.ingest.Ingest(mydfs.Mydfs(roots), mask='ab.').run(str(source), '/t')
+
+    assert stats['errors'] == 0
+    assert stats['copies'] == 3 * 2
+    for path in ['t', 't/d', 't/d/x', 't/y', 't/l']:
+        assert _get_characters(tmp_path, path) == 'ab'
+
+    for character in 'ab':
+        assert (tmp_path / character / 't' / 'd' / 'x').read_bytes() == b'content'
+        assert os.readlink(tmp_path / character / 't' / 'l') == 'y'
+        assert os.lstat(tmp_path / character / 't' / 'l').st_mtime_ns == 10**9
+        assert os.stat(tmp_path / character / 't' / 'd').st_mtime_ns == 2 * 10**9
+        assert os.listdir(tmp_path / character / mydfs.STATE_NAME / 'ingest') == []
+
+    mydfs_ = mydfs.Mydfs(roots)
+    assert sorted(mydfs_('readdir', '/t', None)) == ['ab._l', 'ab._y', 'd']
+
+
+def test_new_tree_in_single_root(tmp_path, roots, source):
+    (tmp_path / 'b' / 'existing').mkdir()
+
+    mydfs.ingest.Ingest(mydfs.Mydfs(roots)).run(str(source), '/existing/t')
+
+    for path in ['existing/t', 'existing/t/d/x', 'existing/t/y', 'existing/t/l']:
+        assert _get_characters(tmp_path, path) == 'b'
+
+
+def test_dry_run(tmp_path, roots, source):
+    stats = mydfs.ingest.Ingest(mydfs.Mydfs(roots), mask='a.c', dryRun=True).run(str(source), '/t')
+
+    assert stats['copies'] == 0
+    assert _get_characters(tmp_path, 't') == ''
+
+
+@pytest.mark.parametrize('mask', ['ab', 'abcd', 'xbc', '...'])
+def test_invalid_mask(roots, mask):
+    with pytest.raises(ValueError):
+        mydfs.ingest.Ingest(mydfs.Mydfs(roots), mask=mask)
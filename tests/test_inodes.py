@@ -0,0 +1,127 @@
+import mydfs
+import mydfs.inodes
+import mydfs_bench.mydfs_bench as mb
+import mydfs_bench.upcalls
+import os
+import shutil
+import sqlite3
+import pytest
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    r = mydfs.Mydfs(roots, inodes=mydfs.inodes.InodeMap(str(tmp_path / 'inodes.sqlite'), batchSize=1))
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _count_rows(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'inodes.sqlite'))
+    try:
+        r, = connection.execute('SELECT COUNT(*) FROM inodes').fetchone()
+
+    finally:
+        connection.close()
+
+    return r
+
+
+def test_same_inode_per_file(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+    inode = mydfs_('getattr', '/a._x')['st_ino']
+
+    shutil.copy2(tmp_path / 'a' / 'x', tmp_path / 'b' / 'x')  # replica added
+    mydfs_.invalidate('/x')
+
+    assert mydfs_('readdir', '/', None) == ['ab_x']
+    assert mydfs_('getattr', '/ab_x')['st_ino'] == inode
+    assert mydfs_('getattr', '/x')['st_ino'] == inode
+    assert _count_rows(tmp_path) == 1
+
+
+def test_diverged_replicas_have_different_inodes(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'x').write_bytes(b'one')
+    (tmp_path / 'b' / 'x').write_bytes(b'twotwo')
+    os.utime(tmp_path / 'b' / 'x', ns=(0, 0))
+
+    assert sorted(mydfs_('readdir', '/', None)) == ['.b_x', 'a._x']
+    attributes = [mydfs_('getattr', name) for name in ('/a._x', '/.b_x')]
+    assert [a['st_size'] for a in attributes] == [3, 6]
+    assert attributes[0]['st_ino'] != attributes[1]['st_ino']
+
+    for character in 'ab':  # subset of replicas
+        (tmp_path / character / 'y').write_bytes(b'content')
+        os.utime(tmp_path / character / 'y', ns=(0, 0))
+
+    assert len({mydfs_('getattr', name)['st_ino'] for name in ('/ab_y', '/a._y', '/.b_y')}) == 3
+
+
+def test_root_views_have_own_inodes(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+
+    inode = mydfs_('getattr', '/x')['st_ino']
+    assert mydfs_('getattr', mydfs.ROOTS_PATH + '/a/x')['st_ino'] != inode
+
+
+def test_unlink_keeps_inode_while_replicas_are_left(tmp_path, mydfs_):
+    for character in 'ab':
+        (tmp_path / character / 'x').write_bytes(b'content')
+        os.utime(tmp_path / character / 'x', ns=(0, 0))
+
+    inode = mydfs_('getattr', '/ab_x')['st_ino']
+    mydfs_('getattr', '/a._x')
+
+    mydfs_('unlink', '/a._x')
+    assert mydfs_('getattr', '/.b_x')['st_ino'] == inode  # now denotes all replicas
+    assert _count_rows(tmp_path) == 1
+
+    mydfs_('unlink', '/.b_x')
+    assert _count_rows(tmp_path) == 0
+
+
+def test_rename(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'd').mkdir()
+    (tmp_path / 'a' / 'd' / 'x').write_bytes(b'content')
+
+    directoryInode = mydfs_('getattr', '/d')['st_ino']
+    inode = mydfs_('getattr', '/d/a._x')['st_ino']
+    mydfs_('rename', '/d/a._x', '/d/a._y')
+    assert mydfs_('getattr', '/d/y')['st_ino'] == inode
+
+    mydfs_('rename', '/d', '/e')
+    assert mydfs_('getattr', '/e')['st_ino'] == directoryInode
+    assert mydfs_('getattr', '/e/a._y')['st_ino'] == inode
+    assert _count_rows(tmp_path) == 2
+
+
+def test_persisted(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+    inode = mydfs_('getattr', '/x')['st_ino']
+    mydfs_.destroy('/')
+
+    mydfs_.Inodes = mydfs.inodes.InodeMap(str(tmp_path / 'inodes.sqlite'))
+    mydfs_.init('/')
+    assert mydfs_('getattr', '/a._x')['st_ino'] == inode
+
+
+@pytest.mark.skipif(not (os.path.exists('/dev/fuse') and shutil.which('fusermount')), reason='requires FUSE')
+def test_cache_profiles_reduce_upcalls(tmp_path):
+    '''
+    Mounts, see `mydfs_bench.upcalls`.
+    '''
+    results = {}
+    for profile in ('strict', 'metadata'):
+        directory = tmp_path / profile
+        directory.mkdir()
+        tree = mb.make_tree(str(directory), 2, 20, 2)
+        (directory / 'mount').mkdir()
+        results[profile] = mydfs_bench.upcalls.count_upcalls(profile, tree, str(directory / 'mount'), 3)
+
+    assert results['metadata'].get('getattr', 0) < results['strict']['getattr']
+    assert sum(results['metadata'].values()) < sum(results['strict'].values())
@@ -0,0 +1,122 @@
+import mydfs
+import mydfs.listing
+import os
+import pytest
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character / 'd' / 'e' / 'f').mkdir(parents=True)
+        (tmp_path / character / 'd' / 'x').write_bytes(b'content')
+        os.utime(tmp_path / character / 'd' / 'x', ns=(0, 0))
+        roots.append((character, str(tmp_path / character)))
+
+    r = mydfs.Mydfs(roots, listingCache=mydfs.listing.ListingCache(ttl=3600.))
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _list_all(mydfs_):
+    for path in ['/', '/d', '/d/e', '/d/e/f']:
+        mydfs_('readdir', path, None)
+
+    assert all(path in mydfs_.ListingCache for path in ['/', '/d', '/d/e', '/d/e/f'])
+
+
+@pytest.mark.parametrize('op, args', [
+    ('create', ('/d/y', 0o644)),
+    ('mkdir', ('/d/y', 0o755)),
+    ('unlink', ('/d/ab_x', )),
+    ('link', ('/d/ab_y', '/d/ab_x')),
+    ('symlink', ('/d/y', '/d/ab_x')),
+    ('truncate', ('/d/ab_x', 1)),
+    ('chmod', ('/d/ab_x', 0o600)),
+    ('utimens', ('/d/ab_x', (1, 1))),
+])
+def test_mutation_invalidates_parent(mydfs_, op, args):
+    _list_all(mydfs_)
+
+    r = mydfs_(op, *args)
+    if op == 'create':
+        mydfs_('release', args[0], r)
+
+    cache = mydfs_.ListingCache
+    assert '/d' not in cache
+    assert all(path in cache for path in ['/', '/d/e', '/d/e/f'])
+
+    names = mydfs_('readdir', '/d', None)
+    assert ('ab_x' in names) == (op != 'unlink')
+
+
+def test_rename_invalidates_tree(mydfs_):
+    _list_all(mydfs_)
+
+    mydfs_('rename', '/d/e', '/g')
+
+    cache = mydfs_.ListingCache
+    assert not any(path in cache for path in ['/', '/d', '/d/e', '/d/e/f'])
+    assert mydfs_('readdir', '/g', None) == ['f']
+    assert 'e' not in mydfs_('readdir', '/d', None)
+
+
+def test_rmdir_invalidates_tree(mydfs_):
+    _list_all(mydfs_)
+
+    mydfs_('rmdir', '/d/e/f')
+
+    cache = mydfs_.ListingCache
+    assert not any(path in cache for path in ['/d/e', '/d/e/f'])
+    assert all(path in cache for path in ['/', '/d'])
+    assert mydfs_('readdir', '/d/e', None) == []
+
+
+@pytest.mark.parametrize('invalidate', [
+    lambda cache: cache.invalidate('/d'),
+    lambda cache: cache.invalidate_tree('/'),
+    lambda cache: cache.flush(),
+], ids=['invalidate', 'invalidate_tree', 'flush'])
+def test_fill_overlapping_invalidation_is_discarded(invalidate):
+    cache = mydfs.listing.ListingCache()
+
+    token = cache.begin('/d')
+    otherToken = cache.begin('/d')
+    invalidate(cache)
+    cache.end(token, 'stale')
+    assert '/d' not in cache
+    assert cache.Stats['discarded'] == 1
+
+    token = cache.begin('/d')  # after invalidation
+    cache.end(otherToken, 'stale')
+    cache.end(token, 'scan')
+    assert cache.get('/d') == 'scan'
+    assert cache.Stats['discarded'] == 2
+    assert cache._Filling == {}
+
+
+def test_fill_of_other_directory_is_kept():
+    cache = mydfs.listing.ListingCache()
+
+    token = cache.begin('/de')
+    cache.invalidate_tree('/d')
+    cache.end(token, 'scan')
+
+    assert cache.get('/de') == 'scan'
+
+
+def test_expiry_and_eviction():
+    cache = mydfs.listing.ListingCache(maxEntries=2, ttl=3600.)
+    for path in ['/a', '/b']:
+        cache.end(cache.begin(path), path)
+
+    assert cache.get('/a') == '/a'  # most recently used
+    cache.end(cache.begin('/c'), '/c')
+    assert '/b' not in cache
+    assert cache.Stats['evictions'] == 1
+
+    cache.Ttl = 0.
+    assert cache.get('/a') is None
+    assert cache.Stats['expired'] == 1
+    assert '/a' not in cache
@@ -0,0 +1,78 @@
+import mydfs
+import mydfs.inodes
+import mydfs.lowlevel
+import os
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def operations(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    mydfs_ = mydfs.Mydfs(roots, inodes=mydfs.inodes.InodeMap(str(tmp_path / 'inodes.sqlite')))
+    mydfs_.init('/')
+    r = mydfs.lowlevel.Operations(mydfs_, jobs=1)
+    yield r
+    r.shutdown()
+    mydfs_.destroy('/')
+
+
+def test_executor_of_masked_path(tmp_path, operations):
+    executors = operations._Executors
+    a, b = str(tmp_path / 'a'), str(tmp_path / 'b')
+
+    assert operations._get_executor(path='/d/ab_x') is executors[a]
+    assert operations._get_executor(path='/d/.b_x') is executors[b]
+    assert operations._get_executor(path=mydfs.ROOTS_PATH + '/b/d/x') is executors[b]
+
+
+def test_executor_of_unmasked_path_is_shared(tmp_path, operations):
+    (tmp_path / 'b' / 'x').write_bytes(b'content')  # only in second root
+
+    for path in ['/x', '/', mydfs.VIRTUAL_PATH + '/stats', None]:
+        executor = operations._get_executor(path=path)
+        assert executor is operations._SharedExecutor
+        assert executor not in operations._Executors.values()
+
+
+def test_executor_of_open_file(tmp_path, operations):
+    (tmp_path / 'b' / 'x').write_bytes(b'content')
+
+    fileHandle = operations.Mydfs('open', '/x', os.O_RDONLY)
+    try:
+        assert operations._get_executor(fileHandle=fileHandle) is operations._Executors[str(tmp_path / 'b')]
+
+    finally:
+        operations.Mydfs('release', '/x', fileHandle)
+
+
+def test_diverged_replicas_resolve_to_own_paths(tmp_path, operations):
+    (tmp_path / 'a' / 'x').write_bytes(b'one')
+    (tmp_path / 'b' / 'x').write_bytes(b'twotwo')
+    os.utime(tmp_path / 'b' / 'x', ns=(0, 0))
+
+    mydfs_ = operations.Mydfs
+    names = mydfs_('readdir', '/', None)
+    assert sorted(names) == ['.b_x', 'a._x']
+
+    async def _lookup_all():
+        return [await operations._lookup('/' + name) for name in names * 2]  # lookup again
+
+    inodes = [attributes['st_ino'] for attributes in asyncio.run(_lookup_all())]
+    assert inodes[:2] == inodes[2:]
+    assert inodes[0] != inodes[1]
+
+    for inode, name in zip(inodes, names):
+        path = operations._get_path(inode)
+        assert path == '/' + name
+
+        fileHandle = mydfs_('open', path, os.O_RDONLY)
+        try:
+            assert mydfs_('read', path, 100, 0, fileHandle) == (b'one' if name == 'a._x' else b'twotwo')
+
+        finally:
+            mydfs_('release', path, fileHandle)
@@ -0,0 +1,116 @@
+import mydfs
+import mydfs.dirty
+import mydfs.mapping
+import os
+import pytest
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    dirty = mydfs.dirty.DirtyJournal(str(tmp_path / 'dirty.journal'), interval=3600.)
+    r = mydfs.Mydfs(roots, mapThreshold=1, dirty=dirty)
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _get_mapped_reads(mydfs_, character):
+    return mydfs_.Statistics.get({})['roots'].get(character, {}).get('mappedReads', 0)
+
+
+def test_remaps_on_growth(tmp_path):
+    path = tmp_path / 'x'
+    path.write_bytes(b'content')
+
+    fileHandle = os.open(path, os.O_RDONLY)
+    mapping = mydfs.mapping.Mapping(fileHandle)
+    try:
+        assert mapping.read(100, 0) == b'content'
+        assert mapping.read(100, 100) == b''
+
+        with open(path, 'ab') as file:
+            file.write(b' and more')
+
+        assert mapping.read(100, 4) == b'ent and more'
+        assert mapping._Size == 16
+
+        mapping.close()
+        assert mapping.read(100, 0) is None
+
+    finally:
+        mapping.close()
+        os.close(fileHandle)
+
+
+def test_empty_file(tmp_path):
+    (tmp_path / 'x').write_bytes(b'')
+
+    fileHandle = os.open(tmp_path / 'x', os.O_RDONLY)
+    mapping = mydfs.mapping.Mapping(fileHandle)
+    try:
+        assert mapping.read(100, 0) is None  # falls back to read
+
+    finally:
+        mapping.close()
+        os.close(fileHandle)
+
+
+def test_truncate_closes_mapping(tmp_path, mydfs_):
+    for character in 'ab':
+        (tmp_path / character / 'x').write_bytes(b'content')
+        os.utime(tmp_path / character / 'x', ns=(0, 0))
+
+    fileHandle = mydfs_('open', '/ab_x', os.O_RDONLY)
+    try:
+        mapping = mydfs_._Mappings[fileHandle]
+        assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'content'
+        assert _get_mapped_reads(mydfs_, 'a') == 1
+
+        mydfs_('truncate', '/ab_x', 3)
+        assert mapping._Closed
+        assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'con'
+        assert _get_mapped_reads(mydfs_, 'a') == 1
+
+    finally:
+        mydfs_('release', '/ab_x', fileHandle)
+
+    assert fileHandle not in mydfs_._Mappings
+
+
+def test_release_closes_mapping(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+
+    fileHandle = mydfs_('open', '/x', os.O_RDONLY)
+    mapping = mydfs_._Mappings[fileHandle]
+    assert mydfs_('read', '/x', 100, 0, fileHandle) == b'content'
+    mydfs_('release', '/x', fileHandle)
+
+    assert mapping._Closed
+    assert mapping._Map is None
+    assert fileHandle not in mydfs_._Mappings
+
+
+def test_resync_closes_mapping(tmp_path, mydfs_):
+    (tmp_path / 'a' / 'x').write_bytes(b'dirty and longer')  # preferred, mapped
+    (tmp_path / 'b' / 'x').write_bytes(b'content')
+    mydfs_.Dirty.mark_all('a', '/x')
+
+    fileHandle = mydfs_('open', '/ab_x', os.O_RDONLY)
+    try:
+        mapping = mydfs_._Mappings[fileHandle]
+        assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'content'  # dirty, not mapped
+        assert _get_mapped_reads(mydfs_, 'a') == 0
+
+        mydfs_.Dirty.run_once()
+        assert len(mydfs_.Dirty) == 0
+        assert (tmp_path / 'a' / 'x').read_bytes() == b'content'
+        assert mapping._Closed
+        assert mydfs_('read', '/ab_x', 100, 0, fileHandle) == b'content'
+
+    finally:
+        mydfs_('release', '/ab_x', fileHandle)
@@ -0,0 +1,105 @@
+import mydfs
+import mydfs.placement
+import pytest
+
+ROOTS = [('a', '/roots/a'), ('b', '/roots/b'), ('c', '/roots/c')]
+
+
+def _load(tmp_path, content):
+    path = tmp_path / 'placement'
+    path.write_text(content)
+    return mydfs.placement.load(str(path))
+
+
+def test_load(tmp_path):
+    policy = _load(tmp_path, '''
+# path prefix, number of replicas, preferred roots
+/tmp        1  c
+/projects/  2  ab  # trailing slash
+
+/           3
+''')
+
+    assert policy.Rules == {'/tmp': (1, 'c'), '/projects': (2, 'ab'), '/': (3, '')}
+
+
+@pytest.mark.parametrize('line', [
+    '/tmp',
+    '/tmp 1 c d',
+    '/tmp one c',
+    '/tmp 0 c',
+    'tmp 1 c',
+])
+def test_load_rejects_bad_rules(tmp_path, line):
+    with pytest.raises(ValueError):
+        _load(tmp_path, '/ 1\n' + line + '\n')
+
+
+def test_load_reports_line(tmp_path):
+    with pytest.raises(ValueError) as info:
+        _load(tmp_path, '# comment\n/ 1\n/tmp one\n')
+
+    assert ':3:' in str(info.value)
+
+
+def test_check_rejects_unknown_roots():
+    policy = mydfs.placement.PlacementPolicy([('/tmp', 1, 'd')])
+
+    with pytest.raises(ValueError):
+        policy.check('abc')
+
+    with pytest.raises(ValueError):
+        mydfs.Mydfs([('a', '/roots/a')], placement=policy)
+
+
+def test_longest_prefix_applies():
+    policy = mydfs.placement.PlacementPolicy([('/', 1, 'a'), ('/p', 1, 'b'), ('/p/q', 1, 'c')])
+
+    assert policy.get_roots('/x', ROOTS) == ['/roots/a']
+    assert policy.get_roots('/p', ROOTS) == ['/roots/b']
+    assert policy.get_roots('/p/x', ROOTS) == ['/roots/b']
+    assert policy.get_roots('/p/q/r/x', ROOTS) == ['/roots/c']
+    assert policy.get_roots('/pq/x', ROOTS) == ['/roots/a']  # whole names only
+
+
+def test_no_rule_applies():
+    policy = mydfs.placement.PlacementPolicy([('/p', 1, 'b')])
+
+    assert policy.get_roots('/x', ROOTS) is None
+    assert policy.get_roots('/', ROOTS) is None
+
+
+@pytest.mark.parametrize('nReplicas, preferred, expected', [
+    (1, 'c', ['/roots/c']),
+    (2, 'c', ['/roots/c', '/roots/a']),
+    (3, 'cb', ['/roots/c', '/roots/b', '/roots/a']),
+    (2, '', ['/roots/a', '/roots/b']),
+    (5, 'b', ['/roots/b', '/roots/a', '/roots/c']),  # more replicas than roots
+])
+def test_preferred_roots_fill_up(nReplicas, preferred, expected):
+    policy = mydfs.placement.PlacementPolicy([('/', nReplicas, preferred)])
+
+    assert policy.get_roots('/x', ROOTS) == expected
+
+
+def test_mydfs_creates_by_policy(tmp_path):
+    roots = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    policy = mydfs.placement.PlacementPolicy([('/', 1, 'b'), ('/d', 2, 'c')])
+    mydfs_ = mydfs.Mydfs(roots, placement=policy)
+    mydfs_.init('/')
+    try:
+        mydfs_('mkdir', '/d', 0o755)
+        mydfs_('mkdir', '/e', 0o755)
+        fileHandle = mydfs_('create', '/d/x', 0o644)
+        mydfs_('release', '/d/x', fileHandle)
+
+    finally:
+        mydfs_.destroy('/')
+
+    assert [(tmp_path / character / 'd').is_dir() for character in 'abc'] == [True, False, True]
+    assert [(tmp_path / character / 'd' / 'x').is_file() for character in 'abc'] == [True, False, True]
+    assert [(tmp_path / character / 'e').is_dir() for character in 'abc'] == [False, True, False]
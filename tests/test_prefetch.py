@@ -0,0 +1,134 @@
+import mydfs
+import mydfs.listing
+import mydfs.prefetch
+import time
+import pytest
+
+TIMEOUT = 10.
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'ab':
+        for index in range(5):
+            (tmp_path / character / 'd{}'.format(index)).mkdir(parents=True)
+
+        for index in range(2):
+            (tmp_path / character / 'd0' / 'e{}'.format(index)).mkdir()
+
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+@pytest.fixture
+def make_mydfs(roots):
+    instances = []
+
+    def _make(prefetcher):
+        r = mydfs.Mydfs(roots, listingCache=mydfs.listing.ListingCache(ttl=3600.), prefetcher=prefetcher)
+        r.init('/')
+        instances.append(r)
+        return r
+
+    yield _make
+
+    for instance in instances:
+        instance.destroy('/')
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _get_next(prefetcher):
+    return list(reversed(prefetcher._Pending))  # see `mydfs.prefetch.Prefetcher._run`
+
+
+def test_newest_first(make_mydfs):
+    prefetcher = mydfs.prefetch.Prefetcher(jobs=0)  # started below
+    mydfs_ = make_mydfs(prefetcher)
+
+    mydfs_('readdir', '/', None)
+    assert _get_next(prefetcher) == ['/d0', '/d1', '/d2', '/d3', '/d4']
+
+    mydfs_('readdir', '/d0', None)  # descends before prefetched
+    assert _get_next(prefetcher) == ['/d0/e0', '/d0/e1', '/d1', '/d2', '/d3', '/d4']
+    assert prefetcher.Stats['late'] == 1
+
+    scanned = []
+    scan = mydfs_._scan
+
+    def _scan(path, *args, **kwargs):
+        scanned.append(path)
+        return scan(path, *args, **kwargs)
+
+    mydfs_._scan = _scan
+    prefetcher.Jobs = 1
+    prefetcher.start(mydfs_)
+    _wait_for(lambda: prefetcher.Stats['prefetched'] == 6)
+
+    assert scanned == ['/d0/e0', '/d0/e1', '/d1', '/d2', '/d3', '/d4']
+    assert prefetcher.Stats['scheduled'] == 7
+
+
+def test_drops_oldest_beyond_max_pending(make_mydfs):
+    prefetcher = mydfs.prefetch.Prefetcher(jobs=0, maxPending=3)
+    mydfs_ = make_mydfs(prefetcher)
+
+    mydfs_('readdir', '/', None)
+
+    assert _get_next(prefetcher) == ['/d0', '/d1', '/d2']
+    assert prefetcher.Stats['dropped'] == 2
+
+    mydfs_('readdir', '/d0', None)
+
+    assert _get_next(prefetcher) == ['/d0/e0', '/d0/e1', '/d1']
+    assert prefetcher.Stats['dropped'] == 3
+
+
+def test_limits_per_directory(make_mydfs):
+    prefetcher = mydfs.prefetch.Prefetcher(jobs=0, maxPerDirectory=2)
+    mydfs_ = make_mydfs(prefetcher)
+
+    mydfs_('readdir', '/', None)
+
+    assert _get_next(prefetcher) == ['/d0', '/d1']
+    assert prefetcher.Stats['scheduled'] == 2
+
+
+def test_drops_beyond_max_age(make_mydfs):
+    prefetcher = mydfs.prefetch.Prefetcher(jobs=2, maxAge=0.)
+    mydfs_ = make_mydfs(prefetcher)
+
+    mydfs_('readdir', '/', None)
+    _wait_for(lambda: prefetcher.Stats['expired'] == 5)
+
+    assert prefetcher.Stats['prefetched'] == 0
+    assert prefetcher.Stats['pending'] == 0
+    assert '/d0' not in mydfs_.ListingCache
+
+
+def test_counts_hits(make_mydfs):
+    prefetcher = mydfs.prefetch.Prefetcher(jobs=2)
+    mydfs_ = make_mydfs(prefetcher)
+
+    mydfs_('readdir', '/', None)
+    _wait_for(lambda: prefetcher.Stats['prefetched'] == 5)
+    assert all('/d{}'.format(index) in mydfs_.ListingCache for index in range(5))
+
+    mydfs_('readdir', '/d1', None)
+    mydfs_('readdir', '/d1', None)  # counted once
+    mydfs_('mkdir', '/d2/new', 0o755)  # invalidates
+    mydfs_('readdir', '/d2', None)
+
+    stats = prefetcher.Stats
+    assert (stats['hits'], stats['misses'], stats['hitRatePermille']) == (1, 1, 200)
+
+    scheduled = prefetcher.Stats['scheduled']
+    mydfs_('readdir', '/', None)  # subdirectories are cached
+    assert prefetcher.Stats['scheduled'] == scheduled
@@ -0,0 +1,73 @@
+import mydfs
+import mydfs.query
+import io
+import os
+import pytest
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'ab':
+        (tmp_path / character / 'd').mkdir(parents=True)
+        (tmp_path / character / 'x').write_bytes(b'content')
+        os.utime(tmp_path / character / 'x', ns=(0, 0))
+        r.append((character, str(tmp_path / character)))
+
+    (tmp_path / 'b' / 'd' / 'y').write_bytes(b'yy')
+    (tmp_path / 'a' / 'd' / 'z').write_bytes(b'zzz')
+
+    mydfs_ = mydfs.Mydfs(r, stripeThreshold=1, stripeChunkSize=4096)
+    mydfs_.init('/')
+    try:
+        fileHandle = mydfs_('create', '/s', 0o644)
+        mydfs_('truncate', '/s', 10000, fileHandle)
+        mydfs_('release', '/s', fileHandle)
+
+    finally:
+        mydfs_.destroy('/')
+
+    return r
+
+
+def _run(function, roots, *args):
+    output = io.StringIO()
+    r = function(mydfs.query.Walker(mydfs.Mydfs(roots)), *(args + (output, )))
+    return output.getvalue().splitlines(), r
+
+
+def test_ls(roots):
+    assert _run(mydfs.query.ls, roots, '/', False)[0] == ['d/', 'ab_x', 'ab~s']
+    assert _run(mydfs.query.ls, roots, '/', True)[0] == ['d/', '7\tab_x', '10000\tab~s']
+    assert _run(mydfs.query.ls, roots, '/d', False)[0] == ['.b_y', 'a._z']
+
+
+@pytest.mark.parametrize('maskPattern, namePattern, expected', [
+    (None, None, ['/ab_x', '/ab~s', '/d/.b_y', '/d/a._z']),
+    ('.b', None, ['/d/.b_y']),
+    ('a?', None, ['/ab_x', '/ab~s', '/d/a._z']),
+    (None, '[xz]', ['/ab_x', '/d/a._z']),
+    ('ab', 's', ['/ab~s']),
+])
+def test_find(roots, maskPattern, namePattern, expected):
+    assert _run(mydfs.query.find, roots, '/', maskPattern, namePattern, False)[0] == expected
+
+
+def test_find_long(roots):
+    assert _run(mydfs.query.find, roots, '/d', None, None, True)[0] == ['2\t/d/.b_y', '3\t/d/a._z']
+
+
+def test_du(roots):
+    lines, r = _run(mydfs.query.du, roots, '/', None, None)
+
+    assert lines == ['.b\t1\t2', 'a.\t1\t3', 'ab\t2\t10007']
+    assert dict(r) == {'.b': [1, 2], 'a.': [1, 3], 'ab': [2, 10007]}
+
+    assert _run(mydfs.query.du, roots, '/', 'a*', 'x')[0] == ['ab\t1\t7']
+
+
+def test_main(roots, capsys):
+    r = mydfs.query.main(['--path', '/d', '--mask', '.b', 'du'] + ['{}={}'.format(*root) for root in roots])
+
+    assert r == 0
+    assert capsys.readouterr().out.splitlines() == ['.b\t1\t2']
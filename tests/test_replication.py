@@ -0,0 +1,135 @@
+import mydfs
+import mydfs.copying
+import mydfs.replication
+import os
+import time
+import pytest
+
+TIMEOUT = 10.
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    r = mydfs.Mydfs(roots, replicator=mydfs.replication.Replicator(interval=3600.))  # runs when scheduled
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _write(tmp_path, characters, name, content):
+    for character in characters:
+        (tmp_path / character / name).write_bytes(content)
+        os.utime(tmp_path / character / name, ns=(0, 0))
+
+
+def _get_characters(tmp_path, name):
+    return ''.join(character for character in 'abc' if (tmp_path / character / name).exists())
+
+
+def _get_temp_paths(tmp_path):
+    return [p for character in 'abc' for p in (tmp_path / character / mydfs.STATE_NAME).glob('replication/*')]
+
+
+@pytest.mark.parametrize('new, name', [('/abc_x', 'x'), ('/ab._y', 'y')])
+def test_wider_mask_copies(tmp_path, mydfs_, new, name):
+    _write(tmp_path, 'a', 'x', b'content')
+    replicator = mydfs_.Replicator
+
+    mydfs_('rename', '/a.._x', new)
+    _wait_for(lambda: replicator.Stats['pending'] == 0)
+
+    expected = new[1:-2].replace('.', '')
+    assert _get_characters(tmp_path, name) == expected
+    assert all((tmp_path / character / name).read_bytes() == b'content' for character in expected)
+    assert _get_characters(tmp_path, 'x') == ('' if name != 'x' else expected)
+    assert replicator.Stats['copies'] == len(expected) - 1
+    assert replicator.Stats['copiedBytes'] == 7 * (len(expected) - 1)
+    assert _get_temp_paths(tmp_path) == []
+
+
+def test_narrower_mask_drops(tmp_path, mydfs_):
+    _write(tmp_path, 'abc', 'x', b'content')
+    replicator = mydfs_.Replicator
+
+    mydfs_('rename', '/abc_x', '/a.._x')
+    _wait_for(lambda: replicator.Stats['pending'] == 0)
+
+    assert _get_characters(tmp_path, 'x') == 'a'
+    assert replicator.Stats['drops'] == 2
+    assert replicator.Stats['copies'] == 0
+    assert mydfs_('readdir', '/', None) == ['a.._x']
+
+
+def test_last_replicas_are_kept(tmp_path, mydfs_):
+    _write(tmp_path, 'ab', 'x', b'content')
+    replicator = mydfs_.Replicator
+
+    replicator.schedule('/x', [], [str(tmp_path / character) for character in 'abc'])
+    _wait_for(lambda: replicator.Stats['pending'] == 0)
+
+    assert _get_characters(tmp_path, 'x') == 'ab'
+    assert replicator.Stats['dropsSkipped'] == 1
+    assert replicator.Stats['drops'] == 0
+
+
+def test_aborts_while_open_for_writing(tmp_path, mydfs_):
+    _write(tmp_path, 'a', 'x', b'content')
+    replicator = mydfs_.Replicator
+
+    fileHandle = mydfs_('open', '/x', os.O_RDWR)
+    try:
+        mydfs_('rename', '/a.._x', '/ab._x')
+        _wait_for(lambda: replicator.Stats['retries'] == 1)
+
+        assert _get_characters(tmp_path, 'x') == 'a'
+        assert replicator.Stats['pending'] == 1
+        assert replicator.Stats['aborted'] == 1
+
+    finally:
+        mydfs_('release', '/x', fileHandle)
+
+    replicator.trigger()
+    _wait_for(lambda: replicator.Stats['pending'] == 0)
+
+    assert _get_characters(tmp_path, 'x') == 'ab'
+    assert _get_temp_paths(tmp_path) == []
+
+
+def test_aborts_if_source_changed(tmp_path, mydfs_, monkeypatch):
+    _write(tmp_path, 'a', 'x', b'content')
+    replicator = mydfs_.Replicator
+    copy_file = mydfs.copying.copy_file
+
+    def _copy_file(*args, **kwargs):
+        r = copy_file(*args, **kwargs)
+        if replicator.Stats['aborted'] == 0:  # written to while copying
+            with open(tmp_path / 'a' / 'x', 'ab') as file:
+                file.write(b' changed')
+
+        return r
+
+    monkeypatch.setattr(mydfs.copying, 'copy_file', _copy_file)
+
+    mydfs_('rename', '/a.._x', '/ab._x')
+    _wait_for(lambda: replicator.Stats['retries'] == 1)
+
+    assert _get_characters(tmp_path, 'x') == 'a'
+    assert replicator.Stats['aborted'] == 1
+    assert _get_temp_paths(tmp_path) == []
+
+    replicator.trigger()
+    _wait_for(lambda: replicator.Stats['pending'] == 0)
+
+    assert (tmp_path / 'b' / 'x').read_bytes() == b'content changed'
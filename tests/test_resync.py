@@ -0,0 +1,110 @@
+import mydfs
+import mydfs.resync
+import os
+import json
+import pytest
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+def _write(tmp_path, character, name, content, mtime):
+    path = tmp_path / character / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def _read_all(tmp_path, name):
+    return [(tmp_path / character / name).read_bytes() for character in 'abc']
+
+
+@pytest.mark.parametrize('policy, rootCharacter, expected', [
+    ('newest', None, b'new'),
+    ('largest', None, b'largest'),
+    ('root', 'c', b'other'),
+    ('root', None, None),
+])
+def test_policy(tmp_path, roots, policy, rootCharacter, expected):
+    _write(tmp_path, 'a', 'x', b'largest', 10**9)
+    _write(tmp_path, 'b', 'x', b'new', 3 * 10**9)
+    _write(tmp_path, 'c', 'x', b'other', 2 * 10**9)
+
+    if expected is None:
+        with pytest.raises(ValueError):
+            mydfs.resync.Resync(mydfs.Mydfs(roots), policy=policy, rootCharacter=rootCharacter)
+
+        return
+
+    stats = mydfs.resync.Resync(mydfs.Mydfs(roots), policy=policy, rootCharacter=rootCharacter).run()
+
+    assert _read_all(tmp_path, 'x') == [expected] * 3
+    assert stats['diverged'] == 1
+    assert stats['copies'] == 2
+    assert mydfs.Mydfs(roots)('readdir', '/', None) == ['abc_x']
+
+
+def test_dry_run(tmp_path, roots):
+    _write(tmp_path, 'a', 'x', b'one', 10**9)
+    _write(tmp_path, 'b', 'x', b'two', 2 * 10**9)
+
+    stats = mydfs.resync.Resync(mydfs.Mydfs(roots), dryRun=True).run()
+
+    assert [(tmp_path / character / 'x').read_bytes() for character in 'ab'] == [b'one', b'two']
+    assert stats['diverged'] == 1
+    assert stats['copies'] == 0
+
+
+def test_skips_holes(tmp_path, roots):
+    path = tmp_path / 'a' / 'x'
+    with open(path, 'wb') as file:
+        file.write(b'head')
+        file.seek(64 * 2**20)
+        file.write(b'tail')
+
+    if os.stat(path).st_blocks * 512 >= 2**20:
+        pytest.skip('file system of tmp_path doesn\'t support holes')
+
+    os.utime(path, ns=(2 * 10**9, 2 * 10**9))
+    _write(tmp_path, 'b', 'x', b'old', 10**9)
+
+    stats = mydfs.resync.Resync(mydfs.Mydfs(roots)).run()
+
+    target = tmp_path / 'b' / 'x'
+    assert target.read_bytes() == path.read_bytes()
+    assert os.stat(target).st_blocks * 512 < 2**20
+    assert stats['copiedBytes'] < 2**20
+
+
+def test_resume_after_failure(tmp_path, roots):
+    _write(tmp_path, 'a', 'd/x', b'old', 10**9)
+    _write(tmp_path, 'b', 'd/x', b'new', 2 * 10**9)  # copied to a
+    _write(tmp_path, 'a', 'e/x', b'new', 2 * 10**9)
+    _write(tmp_path, 'b', 'e/x', b'old', 10**9)  # copied to b
+    (tmp_path / 'a' / mydfs.STATE_NAME).mkdir()
+    (tmp_path / 'a' / mydfs.STATE_NAME / 'resync').write_bytes(b'')  # copies to a fail
+    progressPath = str(tmp_path / 'progress')
+
+    stats = mydfs.resync.Resync(mydfs.Mydfs(roots), progressPath=progressPath).run()
+
+    assert stats['errors'] == 1
+    assert (tmp_path / 'b' / 'e' / 'x').read_bytes() == b'new'
+    with open(progressPath) as file:
+        assert [json.loads(line) for line in file] == ['/e']  # neither /d nor its parent
+
+    (tmp_path / 'a' / mydfs.STATE_NAME / 'resync').unlink()
+    _write(tmp_path, 'b', 'e/y', b'not visited', 10**9)
+    stats = mydfs.resync.Resync(mydfs.Mydfs(roots), progressPath=progressPath).run()
+
+    assert stats['errors'] == 0
+    assert stats['directoriesSkipped'] == 1
+    assert stats['copies'] == 1
+    assert (tmp_path / 'a' / 'd' / 'x').read_bytes() == b'new'
+    assert not os.path.exists(progressPath)  # complete
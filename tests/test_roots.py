@@ -0,0 +1,62 @@
+import mydfs
+import mydfs.striping
+import fuse
+import os
+import pytest
+
+A = mydfs.ROOTS_PATH + '/a'
+B = mydfs.ROOTS_PATH + '/b'
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+
+    r = mydfs.Mydfs(roots)
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+@pytest.mark.parametrize('op, old, new', [
+    ('rename', A + '/x', B + '/x'),
+    ('rename', '/x', B + '/x'),
+    ('link', B + '/y', A + '/x'),  # target, source
+    ('link', B + '/y', '/x'),
+])
+def test_across_roots_fails_with_exdev(tmp_path, mydfs_, op, old, new):
+    with pytest.raises(fuse.FuseOSError) as info:
+        mydfs_(op, old, new)
+
+    assert info.value.errno == fuse.EXDEV
+    assert (tmp_path / 'a' / 'x').read_bytes() == b'content'
+    assert os.listdir(tmp_path / 'b') == []
+
+
+def test_within_root(tmp_path, mydfs_):
+    mydfs_('rename', A + '/x', A + '/y')
+    mydfs_('link', A + '/z', A + '/y')
+
+    assert sorted(os.listdir(tmp_path / 'a')) == ['y', 'z']
+    assert sorted(mydfs_('readdir', A, None)) == ['y', 'z']
+    assert sorted(mydfs_('readdir', '/', None)) == ['a._y', 'a._z']
+
+
+def test_hides_state_and_members(tmp_path, mydfs_):
+    (tmp_path / 'b' / mydfs.STATE_NAME).mkdir()
+    (tmp_path / 'b' / 'y').write_bytes(b'')
+    memberPath = mydfs.striping.get_member_path('/s')
+    (tmp_path / 'b' / memberPath[1:]).write_bytes(b'')
+
+    assert mydfs_('readdir', B, None) == ['y']
+
+    for path in [B + mydfs.VIRTUAL_PATH, B + memberPath]:
+        with pytest.raises(fuse.FuseOSError) as info:
+            mydfs_('getattr', path, None)
+
+        assert info.value.errno == fuse.ENOENT
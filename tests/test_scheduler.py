@@ -0,0 +1,184 @@
+import mydfs
+import mydfs.scheduler
+import threading
+import time
+import pytest
+
+TIMEOUT = 10.
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    scheduler = mydfs.scheduler.Scheduler()
+    r = mydfs.Mydfs(roots, scheduler=scheduler)
+    r.init('/')
+    scheduler.configure(Concurrency=1, RotationalConcurrency=1, NonRotationalConcurrency=1)  # for any device type
+    yield r
+    r.destroy('/')
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _get_depth(queue):
+    with queue.Lock:
+        return sum(len(waiting) for waiting in queue.Waiting)
+
+
+def _start(function, *args):
+    r = threading.Thread(target=function, args=args, daemon=True)
+    r.start()
+    return r
+
+
+def test_queue_hands_over_in_order_of_priority():
+    queue = mydfs.scheduler._Queue(1)
+    order = []
+
+    def _run(name, priority):
+        queue.acquire(priority)
+        order.append(name)
+        queue.release()
+
+    assert queue.acquire(mydfs.scheduler.FOREGROUND) == 0
+    threads = []
+    for index, (name, priority) in enumerate([('background 1', mydfs.scheduler.BACKGROUND),
+                                              ('foreground 1', mydfs.scheduler.FOREGROUND),
+                                              ('background 2', mydfs.scheduler.BACKGROUND),
+                                              ('foreground 2', mydfs.scheduler.FOREGROUND)]):
+        threads.append(_start(_run, name, priority))
+        _wait_for(lambda: _get_depth(queue) == index + 1)
+
+    queue.release()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    assert order == ['foreground 1', 'foreground 2', 'background 1', 'background 2']
+    assert queue.Running == 0
+    assert queue.MaxDepth == 4
+    assert queue.Ops == [3, 2]
+    assert sum(queue.WaitTimes[mydfs.scheduler.BACKGROUND].Counts) == 2
+
+
+def test_queue_hands_over_directly():
+    queue = mydfs.scheduler._Queue(1)
+    acquired = threading.Event()
+    proceed = threading.Event()
+
+    def _run():
+        queue.acquire(mydfs.scheduler.BACKGROUND)
+        acquired.set()
+        proceed.wait(TIMEOUT)
+        queue.release()
+
+    queue.acquire(mydfs.scheduler.FOREGROUND)
+    thread = _start(_run)
+    _wait_for(lambda: _get_depth(queue) == 1)
+
+    queue.release()
+    assert acquired.wait(TIMEOUT)
+    assert queue.Running == 1  # slot wasn't freed in between
+
+    proceed.set()
+    thread.join(TIMEOUT)
+    assert queue.Running == 0
+
+
+def test_configure_grows_while_waiting(tmp_path, mydfs_):
+    scheduler = mydfs_.Scheduler
+    root = str(tmp_path / 'a')
+    queue = scheduler._Queues[root]
+    done = []
+
+    def _run():
+        with scheduler.slot(root):
+            done.append(True)
+
+    with scheduler.slot(root):
+        threads = [_start(_run) for _ in range(2)]
+        _wait_for(lambda: _get_depth(queue) == 2)
+
+        scheduler.configure(Concurrency=3, RotationalConcurrency=3, NonRotationalConcurrency=3)
+        for thread in threads:
+            thread.join(TIMEOUT)
+
+        assert len(done) == 2  # while first slot is held
+
+    assert queue.Running == 0
+    assert queue.Concurrency == 3
+
+
+def test_configure_shrinks_while_waiting(tmp_path, mydfs_):
+    scheduler = mydfs_.Scheduler
+    root = str(tmp_path / 'a')
+    scheduler.configure(Concurrency=2, RotationalConcurrency=2, NonRotationalConcurrency=2)
+    queue = scheduler._Queues[root]
+
+    queue.acquire(mydfs.scheduler.FOREGROUND)
+    queue.acquire(mydfs.scheduler.FOREGROUND)
+    acquired = threading.Event()
+
+    def _run():
+        with scheduler.slot(root):
+            acquired.set()
+
+    thread = _start(_run)
+    _wait_for(lambda: _get_depth(queue) == 1)
+
+    scheduler.configure(Concurrency=1, RotationalConcurrency=1, NonRotationalConcurrency=1)
+    queue.release()  # still at capacity
+    assert queue.Running == 1
+    assert _get_depth(queue) == 1
+    assert not acquired.is_set()
+
+    queue.release()
+    assert acquired.wait(TIMEOUT)
+    thread.join(TIMEOUT)
+    assert queue.Running == 0
+
+
+def test_configure_rejects_bad_values(mydfs_):
+    scheduler = mydfs_.Scheduler
+
+    for attributes in [{'Concurrency': 0}, {'RotationalConcurrency': None}, {'Slots': 1}]:
+        with pytest.raises(ValueError):
+            scheduler.configure(**attributes)
+
+    assert (scheduler.Concurrency, scheduler.RotationalConcurrency, scheduler.NonRotationalConcurrency) == (1, 1, 1)
+
+
+def test_slots_are_reentrant_per_thread(tmp_path, mydfs_):
+    scheduler = mydfs_.Scheduler
+    a, b = str(tmp_path / 'a'), str(tmp_path / 'b')
+    queue = scheduler._Queues[a]
+    acquired = threading.Event()
+
+    def _run():
+        with scheduler.slot(a):
+            acquired.set()
+
+    with scheduler.slot(a):
+        with scheduler.slots([a, b, a]):  # doesn't deadlock
+            assert queue.Running == 1
+            assert scheduler._Queues[b].Running == 1
+
+        assert queue.Running == 1
+
+        thread = _start(_run)
+        _wait_for(lambda: _get_depth(queue) == 1)  # other thread waits
+        assert not acquired.is_set()
+
+    assert acquired.wait(TIMEOUT)
+    thread.join(TIMEOUT)
+    assert queue.Running == 0
+    assert scheduler._Queues[b].Running == 0
+    assert mydfs.scheduler._Local.Held == {}
@@ -0,0 +1,79 @@
+import mydfs
+import mydfs.scrub
+import os
+import json
+import pytest
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+def _write(roots, name, contents):
+    for (_, root), content in zip(roots, contents):
+        path = os.path.join(root, name)
+        with open(path, 'wb') as file:
+            file.write(content)
+
+        os.utime(path, ns=(0, 0))  # same file id in all roots
+
+
+def _run(tmp_path, roots):
+    scrubber = mydfs.scrub.Scrubber(str(tmp_path / 'scrub.sqlite'), blockSize=4)
+    stats = scrubber.run(mydfs.Mydfs(roots))
+    return scrubber, stats
+
+
+def test_mismatch(tmp_path, roots):
+    _write(roots, 'x', [b'content', b'content', b'contenT'])
+    _write(roots, 'y', [b'same', b'same', b'same'])
+
+    scrubber, stats = _run(tmp_path, roots)
+
+    assert stats['files'] == 2
+    assert stats['mismatches'] == 1
+    assert scrubber.Mismatches == [('/x', {'offset': 4, 'differing': ['c']})]
+
+
+def test_rerun_reports_stored_mismatches(tmp_path, roots):
+    _write(roots, 'x', [b'content', b'content', b'contenT'])
+    _write(roots, 'y', [b'same', b'same', b'same'])
+    _run(tmp_path, roots)
+
+    scrubber, stats = _run(tmp_path, roots)
+
+    assert stats['files'] == 0
+    assert stats['bytes'] == 0  # not read again
+    assert stats['filesSkipped'] == 2
+    assert stats['mismatches'] == 1
+    assert scrubber.Mismatches == [('/x', {'offset': 4, 'differing': ['c']})]
+
+
+def test_rerun_after_repair(tmp_path, roots):
+    _write(roots, 'x', [b'content', b'content', b'contenT'])
+    _run(tmp_path, roots)
+
+    _write(roots[2:], 'x.tmp', [b'content'])
+    os.replace(os.path.join(roots[2][1], 'x.tmp'), os.path.join(roots[2][1], 'x'))  # new inode
+    scrubber, stats = _run(tmp_path, roots)
+
+    assert stats['files'] == 1
+    assert stats['mismatches'] == 0
+    assert scrubber.Mismatches == []
+
+
+def test_main_exit_status(tmp_path, roots, capsys):
+    _write(roots, 'x', [b'content', b'content', b'contenT'])
+    arguments = ['--state', str(tmp_path / 'scrub.sqlite')] + ['{}={}'.format(*root) for root in roots]
+
+    for _ in range(2):  # checked, then skipped
+        assert mydfs.scrub.main(arguments) == 1
+
+        lines = capsys.readouterr().out.splitlines()
+        assert json.loads(lines[0]) == {'path': '/x', 'offset': 0, 'differing': ['c']}
@@ -0,0 +1,63 @@
+import mydfs.sharedcache
+import os
+import time
+import uuid
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='requires /dev/shm')
+
+
+@pytest.fixture
+def cache():
+    name = 'mydfs-test-{}'.format(uuid.uuid4().hex)
+    r = mydfs.sharedcache.SharedCache(name, nSlots=64, ttl=3600.)
+    yield r
+    r.stop()
+    os.unlink(os.path.join('/dev/shm', name))
+
+
+def test_lstat_fills(tmp_path, cache):
+    path = str(tmp_path / 'x')
+    with pytest.raises(FileNotFoundError):
+        mydfs.sharedcache.lstat(cache, path)
+
+    assert cache.get(path) is False
+
+    (tmp_path / 'x').write_bytes(b'content')
+    cache.invalidate(path)
+    assert cache.get(path) is None
+    assert mydfs.sharedcache.lstat(cache, path).st_size == 7
+    assert cache.get(path).st_size == 7
+
+
+def test_put_after_invalidate_is_refused(tmp_path, cache):
+    path = str(tmp_path / 'x')
+    (tmp_path / 'x').write_bytes(b'content')
+
+    fillTime = time.monotonic_ns()  # lstat of one thread ...
+    stat_ = os.lstat(path)
+
+    (tmp_path / 'x').write_bytes(b'changed content')  # ... races with change and invalidation of another
+    cache.invalidate(path)
+
+    cache.put(path, stat_, fillTime)
+    assert cache.get(path) is None
+    assert cache.Stats['refused'] == 1
+    assert mydfs.sharedcache.lstat(cache, path).st_size == 15
+
+
+def test_entry_older_than_invalidation_is_expired(tmp_path, cache):
+    path = str(tmp_path / 'x')
+    (tmp_path / 'x').write_bytes(b'content')
+
+    fillTime = time.monotonic_ns()
+    os.lstat(path)
+    cache.invalidate(path)
+
+    # put which passed its check before the invalidation and writes after it
+    key = mydfs.sharedcache._get_key(path)
+    epoch, = mydfs.sharedcache._EPOCH.unpack_from(cache._Buffer, mydfs.sharedcache._EPOCH_OFFSET)
+    cache._write(key, mydfs.sharedcache._BODY.pack(epoch, key, fillTime, False, *([0] * 10)))
+
+    assert cache.get(path) is None
+    assert cache.Stats['expired'] == 1
@@ -0,0 +1,232 @@
+import mydfs
+import mydfs.striping
+import os
+import random
+import concurrent.futures
+import pytest
+
+ospath = os.path
+
+CHUNK_SIZE = 4096
+
+
+@pytest.fixture
+def executor():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as r:
+        yield r
+
+
+def _open(tmp_path, width, flags=os.O_RDWR | os.O_CREAT):
+    paths = [str(tmp_path / 'member{}'.format(index)) for index in range(width)]
+    fileHandles, stripe = mydfs.striping.open_stripe(paths, flags, 0o644, CHUNK_SIZE)
+    return paths, fileHandles, stripe
+
+
+def _close(fileHandles):
+    for fileHandle in fileHandles:
+        os.close(fileHandle)
+
+
+@pytest.mark.parametrize('width', [1, 2, 3, 5])
+def test_get_segments(width):
+    random_ = random.Random(width)
+    for _ in range(200):
+        offset = random_.randrange(10 * CHUNK_SIZE)
+        length = random_.randrange(4 * CHUNK_SIZE)
+
+        covered = []
+        for index, segments in mydfs.striping.get_segments(offset, length, CHUNK_SIZE, width).items():
+            for memberOffset, n, rangeOffset in segments:
+                position = offset + rangeOffset
+                chunk, chunkOffset = divmod(position, CHUNK_SIZE)
+                assert chunk % width == index
+                assert memberOffset == mydfs.striping.HEADER_SIZE + (chunk // width) * CHUNK_SIZE + chunkOffset
+                assert chunkOffset + n <= CHUNK_SIZE
+                covered.append((rangeOffset, n))
+
+        covered.sort()
+        position = 0
+        for rangeOffset, n in covered:
+            assert rangeOffset == position
+            position += n
+
+        assert position == length
+
+
+@pytest.mark.parametrize('width', [1, 2, 3, 5])
+def test_get_member_size_inverts_get_size(width):
+    for size in list(range(0, 3 * width * CHUNK_SIZE, 997)) + [width * CHUNK_SIZE, width * CHUNK_SIZE + 1]:
+        memberSizes = [
+            mydfs.striping.get_member_size(size, mydfs.striping.Layout(CHUNK_SIZE, width, index))
+            for index in range(width)
+        ]
+        assert all(mydfs.striping.HEADER_SIZE <= memberSize for memberSize in memberSizes)
+        assert mydfs.striping.get_size(memberSizes, CHUNK_SIZE, width) == size
+
+
+def test_read_write(tmp_path, executor):
+    paths, fileHandles, stripe = _open(tmp_path, 3)
+    try:
+        random_ = random.Random(0)
+        expected = bytearray()
+        for _ in range(100):
+            offset = random_.randrange(8 * CHUNK_SIZE)
+            data = random_.randbytes(random_.randrange(3 * CHUNK_SIZE))
+            assert stripe.write(data, offset, executor) == len(data)
+
+            if len(expected) < offset:
+                expected.extend(bytes(offset - len(expected)))
+            expected[offset:(offset + len(data))] = data
+
+            offset = random_.randrange(10 * CHUNK_SIZE)
+            size = random_.randrange(3 * CHUNK_SIZE)
+            assert stripe.read(size, offset, executor) == expected[offset:(offset + size)]
+
+        assert stripe.get_size() == len(expected)
+        assert mydfs.striping.get_stat_size(paths) == len(expected)
+
+    finally:
+        _close(fileHandles)
+
+
+@pytest.mark.parametrize('length', [0, 1, CHUNK_SIZE, 5 * CHUNK_SIZE + 7, 20 * CHUNK_SIZE])
+def test_truncate(tmp_path, executor, length):
+    paths, fileHandles, stripe = _open(tmp_path, 3)
+    try:
+        data = random.Random(length).randbytes(10 * CHUNK_SIZE + 3)
+        stripe.write(data, 0, executor)
+        stripe.truncate(length)
+
+        expected = data[:length] + bytes(max(0, length - len(data)))
+        assert stripe.get_size() == length
+        assert mydfs.striping.get_stat_size(paths) == length
+        assert stripe.read(len(expected) + CHUNK_SIZE, 0, executor) == expected
+
+        for path in paths:
+            layout = mydfs.striping.read_layout_from_path(path)
+            assert os.stat(path).st_size == mydfs.striping.get_member_size(length, layout)
+
+    finally:
+        _close(fileHandles)
+
+
+def test_reopen_orders_members_by_index(tmp_path, executor):
+    paths, fileHandles, stripe = _open(tmp_path, 3)
+    data = random.Random(1).randbytes(7 * CHUNK_SIZE)
+    stripe.write(data, 0, executor)
+    _close(fileHandles)
+
+    fileHandles, stripe = mydfs.striping.open_stripe(list(reversed(paths)), os.O_RDONLY, 0, CHUNK_SIZE)
+    try:
+        assert stripe.read(len(data), 0, executor) == data
+
+    finally:
+        _close(fileHandles)
+
+
+def test_cached_size_follows_other_handles(tmp_path, executor):
+    paths, fileHandles, stripe = _open(tmp_path, 3)
+    otherFileHandles, other = mydfs.striping.open_stripe(paths, os.O_RDWR, 0, CHUNK_SIZE)
+    try:
+        stripe.write(b'a' * 100, 0, executor)
+        assert stripe.read(1000, 0, executor) == b'a' * 100
+        assert other.read(1000, 0, executor) == b'a' * 100
+
+        other.write(b'b' * 5000, 100, executor)  # grows
+        assert stripe.read(10000, 0, executor) == b'a' * 100 + b'b' * 5000
+
+        mydfs.striping.truncate(paths, 50)  # shrinks by path
+        stripe.invalidate()
+        other.invalidate()
+        assert stripe.read(1000, 0, executor) == b'a' * 50
+        assert other.read(1000, 0, executor) == b'a' * 50
+
+    finally:
+        _close(otherFileHandles)
+        _close(fileHandles)
+
+
+def test_mydfs_truncate_invalidates_open_stripes(tmp_path):
+    roots = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    mydfs_ = mydfs.Mydfs(roots, stripeThreshold=1, stripeChunkSize=CHUNK_SIZE)
+    mydfs_.init('/')
+    try:
+        fileHandle = mydfs_('create', '/x', 0o644)
+        mydfs_('truncate', '/x', 1, fileHandle)
+        assert mydfs_('readdir', '/', None) == ['abc~x']
+        assert fileHandle in mydfs_._Stripes
+
+        otherFileHandle = mydfs_('open', '/abc~x', os.O_RDWR)
+        mydfs_('write', '/abc~x', b'x' * 20000, 0, otherFileHandle)
+        assert mydfs_('read', '/abc~x', 30000, 0, fileHandle) == b'x' * 20000
+
+        mydfs_('truncate', '/abc~x', 100)
+        assert mydfs_('read', '/abc~x', 1000, 0, fileHandle) == b'x' * 100  # within cached size
+        assert mydfs_('read', '/abc~x', 1000, 0, otherFileHandle) == b'x' * 100
+        assert mydfs_('getattr', '/abc~x')['st_size'] == 100
+
+        mydfs_('release', '/abc~x', otherFileHandle)
+        mydfs_('release', '/abc~x', fileHandle)
+
+    finally:
+        mydfs_.destroy('/')
+
+
+def test_mydfs_write_past_threshold_converts(tmp_path):
+    roots = []
+    for character in 'abc':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    mydfs_ = mydfs.Mydfs(roots, stripeThreshold=3 * CHUNK_SIZE, stripeChunkSize=CHUNK_SIZE)
+    mydfs_.init('/')
+    try:
+        fileHandle = mydfs_('create', '/x', 0o644)
+        data = random.Random(0).randbytes(5 * CHUNK_SIZE)
+        for offset in range(0, len(data), 1000):  # sequential writes
+            assert mydfs_('write', '/x', data[offset:(offset + 1000)], offset, fileHandle) == len(data[offset:][:1000])
+
+        assert mydfs_('readdir', '/', None) == ['abc~x']
+        assert not any(ospath.exists(tmp_path / character / 'x') for character in 'abc')
+        assert mydfs_('read', '/x', 2 * len(data), 0, fileHandle) == data
+        mydfs_('release', '/x', fileHandle)
+
+        assert mydfs_('getattr', '/abc~x')['st_size'] == len(data)
+
+    finally:
+        mydfs_.destroy('/')
+
+
+def test_mydfs_masked_name_after_conversion(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    mydfs_ = mydfs.Mydfs(roots, stripeThreshold=CHUNK_SIZE, stripeChunkSize=CHUNK_SIZE)
+    mydfs_.init('/')
+    try:
+        fileHandle = mydfs_('create', '/ab_x', 0o644)
+        mydfs_('release', '/ab_x', fileHandle)
+
+        mydfs_('truncate', '/ab_x', CHUNK_SIZE)
+        assert mydfs_('readdir', '/', None) == ['ab~x']
+
+        for path in ['/ab_x', '/a._x']:  # names known to the kernel before conversion
+            assert mydfs_('getattr', path)['st_size'] == CHUNK_SIZE
+
+        mydfs_('truncate', '/a._x', 10)
+        assert mydfs_('getattr', '/ab~x')['st_size'] == 10
+
+        mydfs_('unlink', '/ab~x')
+        fileHandle = mydfs_('create', '/a._x', 0o644)  # replicated again
+        mydfs_('release', '/a._x', fileHandle)
+        assert ospath.exists(tmp_path / 'a' / 'x')
+        assert mydfs_('readdir', '/', None) == ['a._x']
+
+    finally:
+        mydfs_.destroy('/')
@@ -0,0 +1,56 @@
+import mydfs
+import mydfs.tiering
+import os
+
+ospath = os.path
+
+
+def _mount(tmp_path, **kwargs):
+    roots = []
+    for character in 'af':
+        path = tmp_path / character
+        path.mkdir(exist_ok=True)
+        roots.append((character, str(path)))
+
+    tiering = mydfs.tiering.Tiering('f', promoteHeat=1., interval=3600., **kwargs)
+    r = mydfs.Mydfs(roots, tiering=tiering)
+    r.init('/')
+    return r
+
+
+def test_promoted_survive_remount(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+
+    mydfs_ = _mount(tmp_path, reserve=0.)
+    mydfs_.Tiering.touch('/x', 4.)
+    mydfs_.Tiering.run_once()
+    assert (tmp_path / 'f' / 'x').read_bytes() == b'content'
+    mydfs_.destroy('/')
+
+    mydfs_ = _mount(tmp_path, reserve=0., evictHeat=100.)
+    assert mydfs_.Tiering._Promoted == {'/x'}
+    mydfs_.Tiering.run_once()
+    assert not ospath.lexists(tmp_path / 'f' / 'x')
+    assert (tmp_path / 'a' / 'x').read_bytes() == b'content'
+    mydfs_.destroy('/')
+
+    mydfs_ = _mount(tmp_path, reserve=0.)
+    assert mydfs_.Tiering._Promoted == set()
+    mydfs_.destroy('/')
+
+
+def test_promoted_without_fast_replica_are_forgotten(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+
+    mydfs_ = _mount(tmp_path, reserve=0.)
+    mydfs_.Tiering.touch('/x', 4.)
+    mydfs_.Tiering.run_once()
+    mydfs_.destroy('/')
+
+    os.unlink(tmp_path / 'f' / 'x')
+
+    mydfs_ = _mount(tmp_path, reserve=0.)
+    assert mydfs_.Tiering._Promoted == set()
+    mydfs_.destroy('/')
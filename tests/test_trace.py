@@ -0,0 +1,70 @@
+import mydfs
+import mydfs.trace
+import errno
+import pytest
+
+
+def _get_roots(tmp_path, name):
+    r = []
+    for character in 'ab':
+        (tmp_path / name / character).mkdir(parents=True)
+        r.append((character, str(tmp_path / name / character)))
+
+    return r
+
+
+def test_record_read_replay(tmp_path):
+    tracePath = str(tmp_path / 'trace')
+    recorder = mydfs.trace.Recorder(tracePath, bufferSize=64)  # writes in several blocks
+
+    mydfs_ = mydfs.Mydfs(_get_roots(tmp_path, 'recorded'), recorder=recorder)
+    mydfs_.init('/')
+    try:
+        for name in ['x', 'y']:  # file handles are reused
+            fileHandle = mydfs_('create', '/ab_' + name, 0o644)
+            mydfs_('write', '/ab_' + name, b'content', 0, fileHandle)
+            mydfs_('release', '/ab_' + name, fileHandle)
+
+        with pytest.raises(OSError):
+            mydfs_('getattr', '/z', None)
+
+    finally:
+        mydfs_.destroy('/')
+
+    recorder.close()
+
+    records = list(mydfs.trace.read_trace(tracePath))
+    assert [record.Op for record in records] == ['create', 'write', 'release'] * 2 + ['getattr']
+
+    create, write = records[:2]
+    assert create.Arguments == ('/ab_x', 0o644)
+    assert create.Result == write.Arguments[3]
+    assert write.Arguments[:3] == ('/ab_x', bytes(7), 0)  # content isn't recorded
+    assert write.Result == mydfs.trace.NO_RESULT
+    assert records[-1].Errno == errno.ENOENT
+    assert all(record.Thread == 0 for record in records)
+
+    roots = _get_roots(tmp_path, 'replayed')
+    mydfs_ = mydfs.Mydfs(roots)
+    mydfs_.init('/')
+    try:
+        results = mydfs.trace.Replayer(mydfs_, records, paced=False).run()
+
+    finally:
+        mydfs_.destroy('/')
+
+    for name in ['x', 'y']:
+        assert [(tmp_path / 'replayed' / character / name).read_bytes() for character in 'ab'] == [bytes(7)] * 2
+
+    assert set(results) == {'create', 'write', 'release', 'getattr'}
+    assert results['write']['replayed']['n'] == 2
+    assert results['write']['replayed']['errors'] == 0
+    assert results['getattr']['replayed']['errors'] == 1
+    assert results['getattr']['recorded']['n'] == 0  # failed when recorded
+
+
+def test_read_trace_rejects_other_files(tmp_path):
+    (tmp_path / 'trace').write_bytes(b'not a trace')
+
+    with pytest.raises(ValueError):
+        list(mydfs.trace.read_trace(str(tmp_path / 'trace')))
@@ -0,0 +1,68 @@
+import mydfs
+import fuse
+import os
+import ctypes
+import json
+import pytest
+
+
+@pytest.fixture
+def mydfs_(tmp_path):
+    roots = []
+    for character in 'ab':
+        (tmp_path / character).mkdir()
+        roots.append((character, str(tmp_path / character)))
+
+    (tmp_path / 'a' / 'x').write_bytes(b'content')
+
+    r = mydfs.Mydfs(roots)
+    r.init('/')
+    yield r
+    r.destroy('/')
+
+
+def _open(mydfs_, path):
+    '''
+    Calls `mydfs.FUSE.open` as libfuse would, without mounting.
+    '''
+    fuse_ = object.__new__(mydfs.FUSE)
+    fuse_.operations = mydfs_
+    fuse_.raw_fi = False
+    fuse_.encoding = 'utf-8'
+
+    fi = fuse.fuse_file_info()
+    fi.flags = os.O_RDONLY
+    assert fuse_.open(path.encode(), ctypes.pointer(fi)) == 0
+    return fi
+
+
+def test_virtual_files_are_direct_io(mydfs_):
+    fi = _open(mydfs_, mydfs.VIRTUAL_PATH + '/stats')
+    assert fi.direct_io == 1
+    mydfs_('release', mydfs.VIRTUAL_PATH + '/stats', fi.fh)
+
+    fi = _open(mydfs_, '/x')
+    assert fi.direct_io == 0
+    mydfs_('release', '/x', fi.fh)
+
+
+def test_stats_are_complete_beyond_reported_size(mydfs_):
+    path = mydfs.VIRTUAL_PATH + '/stats'
+    size = mydfs_('getattr', path)['st_size']
+
+    for _ in range(100):  # grows stats
+        mydfs_('getattr', '/x')
+
+    fileHandle = mydfs_('open', path, os.O_RDONLY)
+    content = b''
+    while True:
+        data = mydfs_('read', path, 4096, len(content), fileHandle)
+        if len(data) == 0:
+            break
+
+        content += data
+
+    mydfs_('release', path, fileHandle)
+
+    assert size < len(content)
+    json.loads(content)
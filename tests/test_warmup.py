@@ -0,0 +1,85 @@
+import mydfs
+import mydfs.listing
+import mydfs.warmup
+import time
+import pytest
+
+TIMEOUT = 10.
+
+
+@pytest.fixture
+def roots(tmp_path):
+    r = []
+    for character in 'ab':
+        for index in range(10):
+            dirPath = tmp_path / character / 'd{}'.format(index)
+            dirPath.mkdir(parents=True)
+            for name in 'xyz':
+                (dirPath / (name + character)).write_bytes(b'')
+
+        r.append((character, str(tmp_path / character)))
+
+    return r
+
+
+def _run(roots, warmup, scanDelay=None):
+    mydfs_ = mydfs.Mydfs(roots, listingCache=mydfs.listing.ListingCache(ttl=3600.), warmup=warmup)
+
+    if scanDelay is not None:
+        scan = mydfs_._scan
+
+        def _scan(*args, **kwargs):
+            time.sleep(scanDelay)
+            return scan(*args, **kwargs)
+
+        mydfs_._scan = _scan
+
+    mydfs_.init('/')
+    try:
+        warmup._Thread.join(TIMEOUT)
+        assert not warmup._Thread.is_alive()
+
+    finally:
+        mydfs_.destroy('/')
+
+    return [p for p in mydfs_.ListingCache._Entries]
+
+
+def test_crawls_all(roots):
+    warmup = mydfs.warmup.Warmup(jobs=2)
+
+    paths = _run(roots, warmup)
+
+    assert sorted(paths) == ['/'] + ['/d{}'.format(index) for index in range(10)]
+    assert warmup.Stats['directories'] == 11
+    assert warmup.Stats['entries'] == 10 + 10 * 6
+    assert warmup.Stats['exhausted'] == 0
+
+
+def test_stops_at_entry_budget(roots):
+    warmup = mydfs.warmup.Warmup(maxEntries=15, jobs=1)
+
+    paths = _run(roots, warmup)
+
+    assert paths == ['/', '/d0']  # 10, then 16 entries
+    assert warmup.Stats['directories'] == 2
+    assert warmup.Stats['exhausted'] == 1
+
+
+def test_stops_at_time_budget(roots):
+    warmup = mydfs.warmup.Warmup(maxSeconds=0.3, jobs=1)
+
+    paths = _run(roots, warmup, scanDelay=0.1)
+
+    assert 1 <= len(paths) < 11
+    assert warmup.Stats['directories'] == len(paths)
+    assert warmup.Stats['exhausted'] == 1
+
+
+def test_crawls_hot_paths_first(roots):
+    warmup = mydfs.warmup.Warmup(paths=['d5/', '/d7'], maxEntries=12, jobs=1)
+
+    paths = _run(roots, warmup)
+
+    assert paths == ['/d5', '/d7']  # 6 and 12 entries
+    assert warmup.Stats['exhausted'] == 1